@@ -0,0 +1,143 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    语义回答缓存：对无历史的新问题，按问题向量的余弦相似度复用此前完整的事件流
+
+    条目记录写入时的知识库版本号，版本变化后不再命中；同时按 TTL 过期、按 LRU 淘汰。
+    """
+
+    def __init__(
+        self,
+        embedding_service,
+        version: Callable[[], Any] = None,
+        threshold: float = None,
+        ttl: float = None,
+        max_entries: int = None
+    ):
+        """
+        初始化语义回答缓存
+
+        Args:
+            embedding_service: EmbeddingService 实例，用于计算问题向量
+            version: 返回当前知识库版本号的函数
+            threshold: 命中所需的最低余弦相似度，默认读取 ANSWER_CACHE_THRESHOLD
+            ttl: 条目有效期（秒），默认读取 ANSWER_CACHE_TTL
+            max_entries: 最大条目数，为0时禁用缓存，默认读取 ANSWER_CACHE_SIZE
+        """
+        self.embedding_service = embedding_service
+        self.version = version
+        self.threshold = threshold if threshold is not None else float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+        self.max_entries = max(0, max_entries if max_entries is not None else int(os.getenv("ANSWER_CACHE_SIZE", "500")))
+        # 条目ID -> (问题, 单位化向量, 知识库版本, 写入时间, 事件列表, 最终回答)
+        self._entries: "OrderedDict[int, Tuple[str, np.ndarray, Any, float, List[Dict[str, Any]], str]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    async def embed(self, question: str) -> Optional[np.ndarray]:
+        """
+        计算问题的单位化向量
+
+        Args:
+            question: 问题文本
+
+        Returns:
+            单位化向量，计算失败时返回 None（不影响正常回答）
+        """
+        try:
+            vector = np.asarray(await self.embedding_service.aembed_query(question), dtype=np.float32)
+        except Exception as e:
+            print(f"计算问题向量失败，跳过回答缓存: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def lookup(self, embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """
+        查找相似问题的缓存回答
+
+        Args:
+            embedding: 单位化的问题向量
+
+        Returns:
+            命中时返回 {question, similarity, events, final_answer}，否则返回 None
+        """
+        version = self.version() if self.version else None
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_similarity = None, self.threshold
+            for entry_id, (_, vector, entry_version, stored_at, _, _) in list(self._entries.items()):
+                if entry_version != version or now - stored_at > self.ttl:
+                    del self._entries[entry_id]
+                    continue
+                similarity = float(np.dot(vector, embedding))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            question, _, _, _, events, final_answer = self._entries[best_id]
+            return {
+                "question": question,
+                "similarity": best_similarity,
+                "events": [dict(event) for event in events],
+                "final_answer": final_answer
+            }
+
+    def store(self, question: str, embedding: np.ndarray, events: List[Dict[str, Any]], final_answer: str):
+        """
+        写入缓存
+
+        Args:
+            question: 问题文本
+            embedding: 单位化的问题向量
+            events: 需要回放的事件列表
+            final_answer: 最终回答
+        """
+        if not self.enabled:
+            return
+        version = self.version() if self.version else None
+        with self._lock:
+            self._entries[self._next_id] = (question, embedding, version, time.monotonic(), events, final_answer)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            命中次数、命中率和条目数
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries)
+            }
@@ -1,15 +1,23 @@
 import os
+import uuid
+import asyncio
+import threading
 from typing import Annotated, TypedDict, Sequence
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, AIMessageChunk
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_openai import ChatOpenAI
 from langchain.agents import create_agent
 from langgraph.graph.message import add_messages
 from dotenv import load_dotenv
-from app.agent.midware import SkillMiddleware
+from app.agent.midware import SkillMiddleware, HistoryCompactionMiddleware, ToolExecutionMiddleware
+from app.agent.session_store import create_session_store
+from app.agent.answer_cache import SemanticAnswerCache
+from app.monitoring.metrics import LLMMetricsCallback
+from app.monitoring.tracing import RequestTrace, TraceCallback, TraceExporter
 
 import json
 
-from app.tools.tools import get_tools
+from app.tools.tools import get_tools, get_rag_manager
 
 load_dotenv()
 
@@ -19,8 +27,14 @@ class AgentState(TypedDict):
 
 
 class AgentEngine:
-    def __init__(self):
-        self.llm = ChatOpenAI(
+    def __init__(self, llm: BaseChatModel = None):
+        """
+        初始化 Agent 引擎
+
+        Args:
+            llm: 聊天模型，默认按 OPENAI_* 环境变量创建 ChatOpenAI（基准测试传入离线模型）
+        """
+        self.llm = llm or ChatOpenAI(
             base_url=os.getenv("OPENAI_BASE_URL"),
             api_key=os.getenv("OPENAI_API_KEY"),
             model=os.getenv("OPENAI_MODEL_NAME"),
@@ -28,40 +42,183 @@ class AgentEngine:
             streaming=True
         )
         self.tools = get_tools()
-        
+        self.tool_execution = ToolExecutionMiddleware()
+        rag_manager = get_rag_manager()
+
         self.agent = create_agent(
             system_prompt="你是一名非常有用的企业个人助手。",
             model=self.llm,
             tools=self.tools,
-            middleware=[SkillMiddleware()]
+            middleware=[SkillMiddleware(rag_manager.embedding_service), HistoryCompactionMiddleware(self.llm), self.tool_execution]
         )
+        self.session_store = create_session_store()
+        self.llm_metrics = LLMMetricsCallback()
+        self.trace_exporter = TraceExporter()
 
-    async def stream_chat(self, user_message: str, history: list[dict]):
+        self.answer_cache = SemanticAnswerCache(
+            rag_manager.embedding_service,
+            version=lambda: rag_manager.vector_store.generation
+        )
+        # 结果随时间变化的工具，调用过这些工具的回答不写入语义回答缓存
+        self.answer_cache_bypass_tools = {
+            name.strip() for name in os.getenv("ANSWER_CACHE_BYPASS_TOOLS", "search_order,search_orders").split(",") if name.strip()
+        }
+
+    async def stream_chat(self, user_message: str, history: list[dict], session_id: str = None, trace: bool = False):
         """
         新版 LangChain Agent 流式聊天
+
+        传入 session_id 且服务端存在该会话时，直接使用服务端保存的完整消息列表（含工具消息），
+        忽略 history；否则由 history 重建上下文并创建新会话（总是生成新的会话ID，不沿用客户端传入的ID）。
+        会话已过期或服务重启后找不到、且请求未携带 history 时，推送 session_expired 事件后结束，
+        由客户端带上完整 history 重新发送，避免在丢失上下文的情况下回答。
+
+        新对话的首个问题（未携带 session_id 和 history）先查语义回答缓存，命中时回放缓存的事件流，不再执行 Agent。
+
+        trace 为 True 时，每个模型调用、工具调用及其子步骤结束后推送 trace 事件，
+        结束前推送 trace_summary 耗时汇总；启用追踪导出时按采样规则写入 JSONL。
         """
-        messages = []
-        for msg in history:
-            if msg["role"] == "user":
-                messages.append(HumanMessage(content=msg["content"]))
-            elif msg["role"] == "assistant":
-                messages.append(AIMessage(content=msg["content"]))
+        request_trace = RequestTrace(emit_events=trace) if trace or self.trace_exporter.enabled else None
+        is_new_conversation = not session_id and not history
+
+        # 会话存储可能是 SQLite，读写放到线程中执行，避免阻塞事件循环
+        messages = await asyncio.to_thread(self.session_store.get, session_id) if session_id else None
+        resumed = messages is not None
+        if session_id and not resumed and not history:
+            yield {
+                "type": "session_expired",
+                "session_id": session_id
+            }
+            return
+        if not resumed:
+            session_id = uuid.uuid4().hex
+            messages = []
+            for msg in history:
+                if msg["role"] == "user":
+                    messages.append(HumanMessage(content=msg["content"]))
+                elif msg["role"] == "assistant":
+                    messages.append(AIMessage(content=msg["content"]))
         messages.append(HumanMessage(content=user_message))
 
+        yield {
+            "type": "session",
+            "session_id": session_id,
+            "resumed": resumed
+        }
+
         all_messages = list(messages)
 
+        # 1. 新对话的首个问题（请求既没有 session_id 也没有 history）查语义回答缓存
+        question_embedding = None
+        if is_new_conversation and self.answer_cache.enabled:
+            span = request_trace.start_span("answer_cache_lookup", "step") if request_trace else None
+            question_embedding = await self.answer_cache.embed(user_message)
+            cached = self.answer_cache.lookup(question_embedding) if question_embedding is not None else None
+            if span:
+                request_trace.end_span(span, hit=bool(cached))
+            if cached:
+                yield {
+                    "type": "answer_cache_hit",
+                    "content": cached["question"],
+                    "similarity": round(cached["similarity"], 4)
+                }
+                for event in cached["events"]:
+                    yield event
+                all_messages.append(AIMessage(content=cached["final_answer"]))
+                await asyncio.to_thread(self.session_store.save, session_id, all_messages)
+                for event in await self._finish_trace(request_trace):
+                    yield event
+                yield {"type": "done"}
+                return
+
+        replay_events = []
+        cacheable = question_embedding is not None
+        async for event in self._run_agent(messages, all_messages, request_trace):
+            if cacheable:
+                if event["type"] == "tool_call" and event["tool_name"] in self.answer_cache_bypass_tools:
+                    cacheable = False
+                elif event["type"] in ("thought", "tool_call", "tool_result"):
+                    replay_events.append(event)
+            yield event
+
+        # 3. 取最终回答
+        final_answer = ""
+        for msg in reversed(all_messages):
+            if isinstance(msg, AIMessage) and not msg.tool_calls:
+                final_answer = msg.content
+                break
+
+        if final_answer:
+            final_event = {
+                "type": "final_answer",
+                "content": final_answer
+            }
+            yield final_event
+            if cacheable:
+                self.answer_cache.store(user_message, question_embedding, replay_events + [final_event], final_answer)
+
+        await asyncio.to_thread(self.session_store.save, session_id, all_messages)
+
+        for event in await self._finish_trace(request_trace):
+            yield event
+        yield {"type": "done"}
+
+    async def _finish_trace(self, request_trace: RequestTrace = None) -> list[dict]:
+        """结束请求追踪：按采样规则导出，并返回尚未推送的 trace 事件和 trace_summary 事件"""
+        if request_trace is None:
+            return []
+        await self.trace_exporter.export(request_trace)
+        if not request_trace.emit_events:
+            return []
+        return request_trace.drain_events() + [{"type": "trace_summary", **request_trace.summary()}]
+
+    async def _run_agent(
+        self,
+        messages: list[BaseMessage],
+        all_messages: list[BaseMessage],
+        request_trace: RequestTrace = None
+    ):
+        """执行 Agent 并产出流式事件，新产生的消息追加到 all_messages"""
+        config = self.tool_execution.request_config()
+        callbacks = [self.llm_metrics]
+        if request_trace is not None:
+            # 工具内部通过运行配置取到本次请求的追踪，记录子步骤
+            config["configurable"]["trace"] = request_trace
+            callbacks.append(TraceCallback(request_trace))
+
         # 2. 新版 Agent 流式
         async for stream_mode, chunk in self.agent.astream(
             {"messages": messages},
-            stream_mode=["updates", "messages"],  # 同时拿步骤 + 打字机
+            config={**config, "callbacks": callbacks},
+            stream_mode=["updates", "messages", "custom"],  # 同时拿步骤 + 打字机 + 中间件事件
         ):
-            if stream_mode == "updates":
+            if request_trace is not None and request_trace.emit_events:
+                for event in request_trace.drain_events():
+                    yield event
+            if stream_mode == "custom":
+                # 中间件发出的事件（历史压缩、按完成顺序推送的工具结果）
+                yield chunk
+            elif stream_mode == "messages":
+                # 模型逐 token 输出（排除压缩摘要等内部模型调用）
+                message_chunk, metadata = chunk
+                if (
+                    metadata.get("langgraph_node") == "model"
+                    and "history_compaction" not in (metadata.get("tags") or [])
+                    and isinstance(message_chunk, AIMessageChunk)
+                    and isinstance(message_chunk.content, str)
+                    and message_chunk.content
+                ):
+                    yield {
+                        "type": "token",
+                        "content": message_chunk.content
+                    }
+            elif stream_mode == "updates":
                 for node_name, node_output in chunk.items():
                     if node_name == "model":  # 大模型节点
                         for msg in node_output.get("messages", []):
                             all_messages.append(msg)
                             if isinstance(msg, AIMessage):
-                                # 思考
+                                # 思考（完整内容，token 事件已逐步推送）
                                 if msg.content:
                                     yield {
                                         "type": "thought",
@@ -72,39 +229,28 @@ class AgentEngine:
                                     for tc in msg.tool_calls:
                                         yield {
                                             "type": "tool_call",
+                                            "tool_call_id": tc["id"],
                                             "tool_name": tc["name"],
                                             "tool_input": tc["args"]
                                         }
                     elif node_name == "tools": # 工具节点
-                        for msg in node_output.get("messages", []):
-                            all_messages.append(msg)
-                            if isinstance(msg, ToolMessage):
-                                # 工具调用结果
-                                if msg.content:
-                                    yield {
-                                        "type": "tool_result",
-                                        "tool_output": msg.content
-                                    }
-                                yield {
-                                    "type": "tool_result",
-                                    "tool_output": msg.content
-                                }
+                        # 工具结果已由 ToolExecutionMiddleware 在每个工具完成时推送
+                        all_messages.extend(node_output.get("messages", []))
 
-        # 3. 取最终回答
-        final_answer = ""
-        for msg in reversed(all_messages):
-            if isinstance(msg, AIMessage) and not msg.tool_calls:
-                final_answer = msg.content
-                break
 
-        if final_answer:
-            yield {
-                "type": "final_answer",
-                "content": final_answer
-            }
+def create_agent_engine():
+    return AgentEngine()
 
-        yield {"type": "done"}
 
+_agent_engine = None
+_agent_engine_lock = threading.Lock()
 
-def create_agent_engine():
-    return AgentEngine()
+
+def get_agent_engine() -> AgentEngine:
+    """获取 Agent 引擎实例（单例模式，首次调用时构建）"""
+    global _agent_engine
+    if _agent_engine is None:
+        with _agent_engine_lock:
+            if _agent_engine is None:
+                _agent_engine = create_agent_engine()
+    return _agent_engine
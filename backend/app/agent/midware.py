@@ -1,48 +1,395 @@
 from langchain.agents.middleware import ModelRequest, ModelResponse, AgentMiddleware
+from langchain.agents.middleware.types import ToolCallRequest
 from langchain.messages import SystemMessage
-from typing import Callable
-from ..agent.skills import SKILLS
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+from langgraph.config import get_stream_writer
+from langgraph.errors import GraphBubbleUp
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List
+import os
+import json
+import time
+import asyncio
+import hashlib
+from ..agent.skills import SkillRegistry, get_skill_registry
 from ..tools.tools import load_skill
+from ..tools.tool_cache import get_cache_policy, get_tool_result_cache
+from ..rag.context_packer import estimate_tokens
+from ..monitoring.metrics import TOOL_DURATION, TOOL_ERRORS
+
+_ROLE_NAMES = {"human": "用户", "ai": "助手", "tool": "工具结果"}
+
 
 class SkillMiddleware(AgentMiddleware):  
-    """向系统提示注入技能描述的中间件。"""
+    """按当前对话选择相关技能并注入提示的中间件。"""
 
     # 将 load_skill 工具注册为类变量
     tools = [load_skill]  
 
-    def __init__(self):
-        """从 SKILLS 初始化并生成技能提示。"""
-        # 从 SKILLS 列表构建技能提示
-        skills_list = []
-        for skill in SKILLS:
-            skills_list.append(
-                f"- **{skill['name']}**: {skill['description']}"
-            )
-        self.skills_prompt = "\n".join(skills_list)
+    def __init__(self, embedding_service=None, top_k: int = None, registry: SkillRegistry = None):
+        """
+        从技能注册表初始化
+
+        Args:
+            embedding_service: EmbeddingService 实例，用于按描述向量选择技能；为 None 时按名称顺序取前 top_k 个
+            top_k: 每次注入的技能数，默认读取 SKILL_TOP_K
+            registry: 技能注册表，默认使用全局实例
+        """
+        self.registry = registry or get_skill_registry()
+        self.embedding_service = embedding_service
+        self.top_k = max(1, top_k or int(os.getenv("SKILL_TOP_K", "3")))
 
-    def awrap_model_call(
+        # 固定的技能说明追加到系统提示，内容不随对话变化，保证系统提示前缀字节稳定以命中模型服务的提示缓存
+        self.skills_addendum = (
+            "\n当你需要处理特殊类型的请求时，请使用 load_skill 工具获取技能详细信息。"
+            "与当前对话相关的可用技能会附在最近一条用户消息的末尾。"
+        )
+
+    async def awrap_model_call(
         self,
         request: ModelRequest,
         handler: Callable[[ModelRequest], ModelResponse],
     ) -> ModelResponse:
-        """同步：将技能描述注入系统提示。"""
-            
-        # 构建技能附录
-        skills_addendum = ( 
-            f"""
-            当你需要处理特殊类型的请求时，请使用 load_skill 工具获取技能详细信息。
-            可用技能: 
-            {self.skills_prompt}
-            """
+        """异步：追加固定的技能说明，并在最近一条用户消息末尾注入与当前对话最相关的技能描述。"""
+        new_system_message = SystemMessage(content = request.system_message.content + self.skills_addendum)
+
+        # 以最近一条用户消息作为技能选择的查询
+        query = next((_message_text(msg) for msg in reversed(request.messages) if isinstance(msg, HumanMessage)), "")
+        if self.embedding_service is not None and query:
+            names = await self.registry.select(query, self.top_k, self.embedding_service)
+        else:
+            names = self.registry.names()[:self.top_k]
+
+        messages = list(request.messages)
+        last_human = next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), None)
+        if names and last_human is not None:
+            skills_prompt = "\n".join(f"- **{name}**: {self.registry.describe(name)}" for name in names)
+            # 动态内容附在最近一条用户消息上，不影响系统提示和更早的历史消息组成的前缀；
+            # 不追加额外的系统消息，部分 OpenAI 兼容服务（如 vLLM 的聊天模板）只接受位于开头的系统消息
+            messages[last_human] = _append_text(messages[last_human], f"\n\n可用技能:\n{skills_prompt}")
+
+        modified_request = request.override(system_message=new_system_message, messages=messages)
+        return await handler(modified_request)
+
+
+def _message_text(message: BaseMessage) -> str:
+    """提取消息的文本内容（兼容内容块列表）"""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in content
+    )
+
+
+def _append_text(message: BaseMessage, text: str) -> BaseMessage:
+    """返回在内容末尾追加文本后的消息副本（兼容内容块列表）"""
+    content = message.content
+    if isinstance(content, str):
+        content = content + text
+    else:
+        content = list(content) + [{"type": "text", "text": text}]
+    return message.model_copy(update={"content": content})
+
+
+def _message_tokens(message: BaseMessage) -> int:
+    """估算单条消息的 token 数，包括工具调用参数"""
+    tokens = estimate_tokens(_message_text(message)) + 4
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        tokens += estimate_tokens(tool_call["name"] + json.dumps(tool_call["args"], ensure_ascii=False))
+    return tokens
+
+
+class HistoryCompactionMiddleware(AgentMiddleware):
+    """
+    历史压缩中间件：对话估算 token 数超过阈值时压缩发送给模型的消息
+
+    1. 先截断较早轮次中过长的 ToolMessage（如 rag_search 返回的大段文档）
+    2. 仍超过阈值时，最近 keep_turns 轮原样保留，更早的轮次折叠为摘要追加到系统提示
+
+    摘要按被折叠消息的前缀哈希缓存：同一会话后续请求只需把新折叠的消息增量合并进已有摘要。
+    只改写本次模型请求，Agent 状态和会话存储中的完整消息不受影响。
+    每次压缩通过 stream writer 发出 compaction 事件（需以 stream_mode="custom" 接收）。
+    """
+
+    def __init__(
+        self,
+        model: BaseChatModel,
+        max_tokens: int = None,
+        keep_turns: int = None,
+        summary_max_tokens: int = None,
+        tool_result_max_tokens: int = None,
+        cache_size: int = 256
+    ):
+        """
+        初始化历史压缩中间件
+
+        Args:
+            model: 用于生成摘要的模型
+            max_tokens: 触发压缩的消息 token 阈值，默认读取 HISTORY_MAX_TOKENS
+            keep_turns: 原样保留的最近轮数（以用户消息划分轮次），默认读取 HISTORY_KEEP_TURNS
+            summary_max_tokens: 摘要的目标长度，默认读取 HISTORY_SUMMARY_MAX_TOKENS
+            tool_result_max_tokens: 较早轮次中工具结果的截断长度，默认读取 HISTORY_TOOL_RESULT_MAX_TOKENS
+            cache_size: 缓存的摘要条数
+        """
+        self.model = model
+        self.max_tokens = max_tokens if max_tokens is not None else int(os.getenv("HISTORY_MAX_TOKENS", "6000"))
+        self.keep_turns = max(1, keep_turns if keep_turns is not None else int(os.getenv("HISTORY_KEEP_TURNS", "4")))
+        self.summary_max_tokens = (
+            summary_max_tokens if summary_max_tokens is not None
+            else int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "500"))
+        )
+        self.tool_result_max_tokens = (
+            tool_result_max_tokens if tool_result_max_tokens is not None
+            else int(os.getenv("HISTORY_TOOL_RESULT_MAX_TOKENS", "200"))
         )
+        self.cache_size = cache_size
+        # 被折叠消息的前缀哈希 -> 摘要
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        """异步：在调用模型前按需压缩消息。"""
+        messages = list(request.messages)
+        tokens_before = sum(_message_tokens(msg) for msg in messages)
+        if tokens_before <= self.max_tokens:
+            return await handler(request)
+
+        turn_starts = [i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)]
+        keep_from = turn_starts[-self.keep_turns] if len(turn_starts) >= self.keep_turns else 0
+        current_turn = turn_starts[-1] if turn_starts else len(messages)
+
+        # 1. 截断当前轮之前的大工具结果
+        messages, shrunk = self._shrink_tool_results(messages, current_turn)
+
+        # 2. 仍超过阈值时折叠更早的轮次
+        summary, summary_cached, folded = None, False, 0
+        if keep_from > 0 and sum(_message_tokens(msg) for msg in messages) > self.max_tokens:
+            try:
+                summary, summary_cached = await self._summarize(messages[:keep_from])
+                folded = keep_from
+                messages = messages[keep_from:]
+            except Exception as e:
+                print(f"生成历史摘要失败，跳过折叠: {e}")
+
+        if not shrunk and not folded:
+            return await handler(request)
+
+        overrides = {"messages": messages}
+        if summary:
+            system_content = request.system_message.content if request.system_message else ""
+            overrides["system_message"] = SystemMessage(
+                content=f"{system_content}\n\n以下是此前对话的摘要：\n{summary}"
+            )
+        tokens_after = sum(_message_tokens(msg) for msg in messages) + (estimate_tokens(summary) if summary else 0)
+
+        get_stream_writer()({
+            "type": "compaction",
+            "content": f"历史消息已压缩：约 {tokens_before} → {tokens_after} tokens",
+            "folded_messages": folded,
+            "shrunk_tool_results": shrunk,
+            "summary_cached": summary_cached,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after
+        })
+        return await handler(request.override(**overrides))
+
+    def _shrink_tool_results(self, messages: List[BaseMessage], end: int):
+        """截断 end 之前超过长度限制的 ToolMessage，返回 (新消息列表, 截断条数)"""
+        shrunk = 0
+        result = []
+        for i, msg in enumerate(messages):
+            if i < end and isinstance(msg, ToolMessage):
+                text = _message_text(msg)
+                tokens = estimate_tokens(text)
+                if tokens > self.tool_result_max_tokens:
+                    keep_chars = max(1, int(len(text) * self.tool_result_max_tokens / tokens))
+                    msg = msg.model_copy(update={"content": text[:keep_chars] + f"\n...[已截断，原始约 {tokens} tokens]"})
+                    shrunk += 1
+            result.append(msg)
+        return result, shrunk
+
+    async def _summarize(self, messages: List[BaseMessage]):
+        """
+        生成被折叠消息的摘要，优先复用已缓存的最长前缀摘要并增量合并
+
+        Returns:
+            (摘要, 是否完全命中缓存)
+        """
+        prefix_hashes = []
+        digest = hashlib.sha256()
+        for msg in messages:
+            digest.update(f"{msg.type}\x00{_message_text(msg)}\x00".encode("utf-8"))
+            prefix_hashes.append(digest.hexdigest())
+
+        start, previous = 0, None
+        for i in range(len(prefix_hashes) - 1, -1, -1):
+            cached = self._summaries.get(prefix_hashes[i])
+            if cached is not None:
+                self._summaries.move_to_end(prefix_hashes[i])
+                start, previous = i + 1, cached
+                break
+
+        if start == len(messages):
+            return previous, True
+
+        transcript = "\n".join(
+            f"[{_ROLE_NAMES.get(msg.type, msg.type)}] {_message_text(msg)}"
+            for msg in messages[start:]
+            if _message_text(msg)
+        )
+        prompt = (
+            f"请将以下对话内容整理为不超过 {self.summary_max_tokens} 字的摘要，"
+            "保留用户的需求、已查询到的关键数据（如订单号、金额）和已得出的结论。"
+        )
+        if previous:
+            prompt += f"\n\n已有摘要：\n{previous}\n\n请将新增对话合并进已有摘要。"
+
+        response = await self.model.ainvoke(
+            [SystemMessage(content=prompt), HumanMessage(content=transcript)],
+            config={"tags": ["history_compaction"]}
+        )
+        summary = _message_text(response).strip()
+
+        self._summaries[prefix_hashes[-1]] = summary
+        self._summaries.move_to_end(prefix_hashes[-1])
+        while len(self._summaries) > self.cache_size:
+            self._summaries.popitem(last=False)
+        return summary, False
+
+
+class ToolExecutionMiddleware(AgentMiddleware):
+    """
+    工具并发执行中间件
+
+    同一轮模型输出的多个工具调用由工具节点并发执行，本中间件在此基础上：
+    1. 用每个请求独立的信号量限制同时执行的工具调用数
+    2. 为每个工具设置超时，超时返回错误结果而不阻塞整轮
+    3. 每个工具完成时立即通过 stream writer 发出带 tool_call_id 的 tool_result 事件，
+       事件顺序即完成顺序（需以 stream_mode="custom" 接收）
+    4. 工具通过 @cacheable 声明缓存策略时，先查跨请求共享的结果缓存，事件中的 cached 标记是否命中
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        default_timeout: float = None,
+        timeouts: Dict[str, float] = None,
+        cache=None
+    ):
+        """
+        初始化工具并发执行中间件
+
+        Args:
+            max_concurrency: 每个请求同时执行的工具调用上限，默认读取 TOOL_MAX_CONCURRENCY
+            default_timeout: 工具默认超时（秒），默认读取 TOOL_TIMEOUT
+            timeouts: 按工具名单独设置的超时，默认读取 TOOL_TIMEOUTS（如 "search_order=10,rag_search=20"）
+            cache: 工具结果缓存，默认使用全局共享实例
+        """
+        self.max_concurrency = max(1, max_concurrency or int(os.getenv("TOOL_MAX_CONCURRENCY", "4")))
+        self.default_timeout = default_timeout or float(os.getenv("TOOL_TIMEOUT", "30"))
+        if timeouts is None:
+            timeouts = {}
+            for item in os.getenv("TOOL_TIMEOUTS", "").split(","):
+                name, _, value = item.partition("=")
+                if name.strip() and value.strip():
+                    timeouts[name.strip()] = float(value)
+        self.timeouts = timeouts
+        self.cache = cache if cache is not None else get_tool_result_cache()
+
+    def request_config(self) -> Dict[str, Any]:
+        """
+        为一次请求创建独立的并发限制
+
+        Returns:
+            传给 agent.astream 的 config，工具调用时从 runtime.config 中取回信号量
+        """
+        return {"configurable": {"tool_semaphore": asyncio.Semaphore(self.max_concurrency)}}
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage]],
+    ):
+        """异步：查缓存、限流、超时和异常处理，并在完成时推送结果事件。"""
+        tool_call = request.tool_call
+        start = time.perf_counter()
+
+        policy = get_cache_policy(request.tool)
+        cache_key = policy.make_key(tool_call["name"], tool_call["args"]) if policy else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                result = ToolMessage(content=cached, tool_call_id=tool_call["id"], name=tool_call["name"])
+                # 命中缓存时不会执行工具，单独记录一个追踪 span
+                trace = (request.runtime.config.get("configurable") or {}).get("trace")
+                if trace is not None:
+                    trace.end_span(trace.start_span(tool_call["name"], "tool"), cached=True)
+                self._emit_result(request, result, start, cached=True)
+                return result
+
+        timeout = self.timeouts.get(tool_call["name"], self.default_timeout)
+        semaphore = (request.runtime.config.get("configurable") or {}).get("tool_semaphore")
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        timed_out = False
+        async with semaphore:
+            # 执行耗时从拿到并发名额后开始计算，排队等待时间单独上报
+            queued = time.perf_counter() - start
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(handler(request), timeout=timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                print(f"[工具超时] {tool_call['name']} 超过 {timeout} 秒")
+                result = ToolMessage(
+                    content=json.dumps({"error": f"工具 {tool_call['name']} 执行超时（{timeout} 秒）"}, ensure_ascii=False),
+                    tool_call_id=tool_call["id"],
+                    name=tool_call["name"],
+                    status="error"
+                )
+            except GraphBubbleUp:
+                # 中断等图控制流异常交给 LangGraph 处理
+                raise
+            except Exception as e:
+                # 单个工具失败不影响同一轮的其他工具，把错误作为工具结果返回给模型
+                print(f"[工具错误] {tool_call['name']}: {e}")
+                result = ToolMessage(
+                    content=json.dumps({"error": f"工具 {tool_call['name']} 执行失败: {e}"}, ensure_ascii=False),
+                    tool_call_id=tool_call["id"],
+                    name=tool_call["name"],
+                    status="error"
+                )
 
-        # 追加到系统消息内容块
-        # new_content = list(request.system_message.content_blocks) + [
-        #     {"type": "text", "text": skills_addendum}
-        # ]
-        # new_system_message = SystemMessage(content_blocks=new_content) # 实测这个写法效果不好
-        new_system_message = SystemMessage(content = request.system_message.content + skills_addendum)
-        # print(new_system_message)
+        if isinstance(result, ToolMessage):
+            if result.status == "error":
+                TOOL_ERRORS.inc(tool=tool_call["name"], reason="timeout" if timed_out else "error")
+            if (
+                cache_key is not None
+                and result.status != "error"
+                and isinstance(result.content, str)
+                and (policy.cache_if is None or policy.cache_if(result.content))
+            ):
+                self.cache.put(cache_key, result.content, policy.ttl)
+            self._emit_result(request, result, start, cached=False, queued=queued)
+        return result
 
-        modified_request = request.override(system_message=new_system_message)
-        return handler(modified_request)
\ No newline at end of file
+    @staticmethod
+    def _emit_result(request: ToolCallRequest, result: ToolMessage, start: float, cached: bool, queued: float = 0.0):
+        elapsed = time.perf_counter() - start
+        TOOL_DURATION.observe(elapsed, tool=request.tool_call["name"], cached="true" if cached else "false")
+        request.runtime.stream_writer({
+            "type": "tool_result",
+            "tool_call_id": result.tool_call_id,
+            "tool_name": request.tool_call["name"],
+            "tool_output": result.content,
+            "cached": cached,
+            "elapsed": round(elapsed, 3),
+            "queued": round(queued, 3)
+        })
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+
+class SessionStore(ABC):
+    """会话存储基类，按会话ID保存完整的消息列表（含工具调用和工具结果）；实现为同步接口，异步代码中应放到线程中调用"""
+
+    def __init__(self, ttl: float = 3600.0):
+        """
+        初始化会话存储
+
+        Args:
+            ttl: 会话空闲多久后过期（秒）
+        """
+        self.ttl = ttl
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[List[BaseMessage]]:
+        """
+        获取会话消息
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            消息列表，会话不存在或已过期时返回 None
+        """
+
+    @abstractmethod
+    def save(self, session_id: str, messages: List[BaseMessage]):
+        """
+        保存会话消息（整体覆盖）
+
+        Args:
+            session_id: 会话ID
+            messages: 完整消息列表
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """删除会话"""
+
+
+class InMemorySessionStore(SessionStore):
+    """进程内 LRU 会话存储，按空闲时间过期，超出容量时淘汰最久未使用的会话"""
+
+    def __init__(self, ttl: float = 3600.0, max_sessions: int = 1000):
+        """
+        初始化内存会话存储
+
+        Args:
+            ttl: 会话空闲多久后过期（秒）
+            max_sessions: 最多保留的会话数
+        """
+        super().__init__(ttl)
+        self.max_sessions = max(1, max_sessions)
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[List[BaseMessage]]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            updated_at, messages = entry
+            if time.monotonic() - updated_at > self.ttl:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return list(messages)
+
+    def save(self, session_id: str, messages: List[BaseMessage]):
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic(), list(messages))
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite 会话存储，进程重启后会话仍可继续"""
+
+    def __init__(self, db_path: str, ttl: float = 3600.0):
+        """
+        初始化 SQLite 会话存储
+
+        Args:
+            db_path: SQLite 文件路径
+            ttl: 会话空闲多久后过期（秒）
+        """
+        super().__init__(ttl)
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                messages TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at)")
+        self._conn.commit()
+
+    def get(self, session_id: str) -> Optional[List[BaseMessage]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT messages, updated_at FROM sessions WHERE id = ?",
+                (session_id,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return messages_from_dict(json.loads(row[0]))
+
+    def save(self, session_id: str, messages: List[BaseMessage]):
+        payload = json.dumps(messages_to_dict(messages), ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, messages, updated_at) VALUES (?, ?, ?)",
+                (session_id, payload, now)
+            )
+            # 顺带清理过期会话
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+            self._conn.commit()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.commit()
+
+
+def create_session_store() -> SessionStore:
+    """
+    根据环境变量创建会话存储
+
+    SESSION_STORE: memory（默认）或 sqlite
+    SESSION_TTL: 会话空闲过期时间（秒），默认 3600
+    SESSION_MAX: 内存存储的最大会话数，默认 1000
+    SESSION_DB_PATH: SQLite 文件路径，默认 data/sessions.sqlite3
+    """
+    backend = os.getenv("SESSION_STORE", "memory").lower()
+    ttl = float(os.getenv("SESSION_TTL", "3600"))
+
+    if backend == "sqlite":
+        db_path = os.getenv("SESSION_DB_PATH")
+        if not db_path:
+            current_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            db_path = os.path.join(current_dir, "data", "sessions.sqlite3")
+        return SQLiteSessionStore(db_path, ttl=ttl)
+
+    return InMemorySessionStore(ttl=ttl, max_sessions=int(os.getenv("SESSION_MAX", "1000")))
@@ -0,0 +1,163 @@
+import os
+import asyncio
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from .types import Skill
+
+
+_FRONTMATTER_DELIMITER = "---"
+
+
+def _read_header(path: str) -> Dict[str, str]:
+    """只读取技能文件开头的 frontmatter（key: value 形式），不加载正文"""
+    header = {}
+    with open(path, "r", encoding="utf-8") as f:
+        if f.readline().strip() != _FRONTMATTER_DELIMITER:
+            return header
+        for line in f:
+            line = line.strip()
+            if line == _FRONTMATTER_DELIMITER:
+                break
+            key, sep, value = line.partition(":")
+            if sep:
+                header[key.strip()] = value.strip()
+    return header
+
+
+def _read_body(path: str) -> str:
+    """读取技能文件 frontmatter 之后的正文"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if text.startswith(_FRONTMATTER_DELIMITER):
+        end = text.find(f"\n{_FRONTMATTER_DELIMITER}", len(_FRONTMATTER_DELIMITER))
+        if end != -1:
+            text = text[end + len(_FRONTMATTER_DELIMITER) + 1:]
+    return text.lstrip("\n")
+
+
+class SkillRegistry:
+    """
+    技能注册表：从技能目录加载 *.md 技能文件
+
+    启动时只读取每个文件的 frontmatter（name、description）建立名称索引，
+    正文在首次 load_skill 时才读取并缓存；按描述向量选出与当前对话最相关的技能。
+    """
+
+    def __init__(self, skills_dir: str = None):
+        """
+        初始化技能注册表
+
+        Args:
+            skills_dir: 技能文件目录，默认读取 SKILLS_DIR，未配置时使用 app/agent/skills/library
+        """
+        if skills_dir is None:
+            skills_dir = os.getenv("SKILLS_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "library")
+        self.skills_dir = skills_dir
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """重新扫描技能目录"""
+        entries: Dict[str, Dict[str, str]] = {}
+        if os.path.isdir(self.skills_dir):
+            for filename in sorted(os.listdir(self.skills_dir)):
+                if not filename.endswith(".md"):
+                    continue
+                path = os.path.join(self.skills_dir, filename)
+                try:
+                    header = _read_header(path)
+                except Exception as e:
+                    print(f"读取技能文件失败 {filename}: {e}")
+                    continue
+                name = header.get("name") or os.path.splitext(filename)[0]
+                if name in entries:
+                    print(f"技能名称重复，忽略 {filename}: {name}")
+                    continue
+                entries[name] = {"description": header.get("description", ""), "path": path}
+
+        with self._lock:
+            self._entries = entries
+            self._contents: Dict[str, str] = {}
+            self._names: List[str] = list(entries)
+            self._vectors: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def names(self) -> List[str]:
+        """获取所有技能名称"""
+        return list(self._names)
+
+    def describe(self, name: str) -> Optional[str]:
+        """获取技能描述，技能不存在时返回 None"""
+        entry = self._entries.get(name)
+        return entry["description"] if entry else None
+
+    def get(self, name: str) -> Optional[Skill]:
+        """
+        按名称获取技能（首次访问时读取正文）
+
+        Args:
+            name: 技能名称
+
+        Returns:
+            技能定义，不存在时返回 None
+        """
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        content = self._contents.get(name)
+        if content is None:
+            content = _read_body(entry["path"])
+            with self._lock:
+                self._contents[name] = content
+        return {"name": name, "description": entry["description"], "content": content}
+
+    async def select(self, query: str, k: int, embedding_service) -> List[str]:
+        """
+        按与查询的向量相似度选出最相关的技能
+
+        Args:
+            query: 当前对话的查询文本
+            k: 最多返回的技能数
+            embedding_service: EmbeddingService 实例
+
+        Returns:
+            技能名称列表，按相关性降序
+        """
+        if len(self._names) <= k:
+            return list(self._names)
+
+        try:
+            vectors = await self._description_vectors(embedding_service)
+            query_vector = np.asarray(await embedding_service.aembed_query(query), dtype=np.float32)
+        except Exception as e:
+            print(f"技能选择失败，使用默认技能: {e}")
+            return self._names[:k]
+
+        norm = np.linalg.norm(query_vector)
+        if norm == 0:
+            return self._names[:k]
+        scores = vectors @ (query_vector / norm)
+        top = np.argsort(-scores)[:k]
+        return [self._names[i] for i in top]
+
+    async def _description_vectors(self, embedding_service) -> np.ndarray:
+        if self._vectors is None:
+            texts = [f"{name}: {self._entries[name]['description']}" for name in self._names]
+            vectors = np.asarray(await asyncio.to_thread(embedding_service.embed_documents, texts), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self._vectors = vectors / np.where(norms == 0, 1, norms)
+        return self._vectors
+
+
+_skill_registry = None
+
+
+def get_skill_registry() -> SkillRegistry:
+    """获取技能注册表实例（单例模式）"""
+    global _skill_registry
+    if _skill_registry is None:
+        _skill_registry = SkillRegistry()
+    return _skill_registry
@@ -0,0 +1,233 @@
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Dict, Any, Optional
+from app.monitoring.metrics import register_stats
+
+
+class AdmissionRejected(Exception):
+    """请求未被接纳（队列已满、超出单客户端限制或排队超时）"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """一次请求的准入凭证，排队期间可迭代获取队列位置，结束时必须 release"""
+
+    def __init__(self, controller: "AdmissionController", client_id: Optional[str]):
+        self.controller = controller
+        self.client_id = client_id
+        self.enqueued_at = time.monotonic()
+        self.admitted_at: Optional[float] = None
+        self.released = False
+        self._admitted = asyncio.Event()
+
+    @property
+    def admitted(self) -> bool:
+        return self._admitted.is_set()
+
+    async def wait(self) -> AsyncIterator[int]:
+        """
+        等待准入
+
+        Yields:
+            排队期间队列位置（从1开始）发生变化时产出新位置
+
+        Raises:
+            AdmissionRejected: 排队超过 queue_timeout
+        """
+        deadline = self.enqueued_at + self.controller.queue_timeout
+        last_position = None
+        while not self.admitted:
+            position = self.controller.position(self)
+            if position and position != last_position:
+                last_position = position
+                yield position
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.release()
+                raise AdmissionRejected("排队超时，请稍后重试", self.controller.retry_after())
+
+            changed = asyncio.ensure_future(self.controller.changed_event().wait())
+            admitted = asyncio.ensure_future(self._admitted.wait())
+            try:
+                await asyncio.wait({changed, admitted}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                changed.cancel()
+                admitted.cancel()
+
+    def release(self):
+        """释放凭证（可重复调用）：已准入则归还并发名额，仍在排队则移出队列"""
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    聊天流准入控制：全局并发上限 + 有界 FIFO 等待队列 + 可选的单客户端限制
+
+    并发名额已满时请求进入等待队列，队列已满时立即拒绝并给出建议的重试间隔。
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = None,
+        max_queue: int = None,
+        per_client_limit: int = None,
+        queue_timeout: float = None
+    ):
+        """
+        初始化准入控制器
+
+        Args:
+            max_in_flight: 同时执行的 Agent 请求上限，默认读取 ADMISSION_MAX_IN_FLIGHT
+            max_queue: 等待队列长度上限，默认读取 ADMISSION_MAX_QUEUE
+            per_client_limit: 单个客户端同时执行和排队的请求上限，为0时不限制，默认读取 ADMISSION_PER_CLIENT_LIMIT
+            queue_timeout: 最长排队时间（秒），默认读取 ADMISSION_QUEUE_TIMEOUT
+        """
+        self.max_in_flight = max(1, max_in_flight or int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8")))
+        self.max_queue = max(0, max_queue if max_queue is not None else int(os.getenv("ADMISSION_MAX_QUEUE", "32")))
+        self.per_client_limit = max(0, per_client_limit if per_client_limit is not None else int(os.getenv("ADMISSION_PER_CLIENT_LIMIT", "0")))
+        self.queue_timeout = queue_timeout or float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "60"))
+
+        self.in_flight = 0
+        self._queue: "deque[AdmissionTicket]" = deque()
+        self._clients: Dict[str, int] = {}
+        self._changed: Optional[asyncio.Event] = None
+
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+        # 单个请求执行耗时的指数滑动平均，用于估算 Retry-After
+        self.avg_service_seconds = 0.0
+
+    def enqueue(self, client_id: Optional[str] = None) -> AdmissionTicket:
+        """
+        申请准入，有空闲名额时立即准入，否则进入等待队列
+
+        Args:
+            client_id: 客户端标识，用于单客户端限制
+
+        Returns:
+            准入凭证
+
+        Raises:
+            AdmissionRejected: 队列已满或超出单客户端限制
+        """
+        if client_id and self.per_client_limit and self._clients.get(client_id, 0) >= self.per_client_limit:
+            self.rejected_total += 1
+            raise AdmissionRejected("该客户端的并发请求过多", self.retry_after())
+
+        ticket = AdmissionTicket(self, client_id)
+        if self.in_flight < self.max_in_flight and not self._queue:
+            self._admit(ticket)
+        elif len(self._queue) < self.max_queue:
+            self._queue.append(ticket)
+        else:
+            self.rejected_total += 1
+            raise AdmissionRejected("服务繁忙，请稍后重试", self.retry_after())
+
+        if client_id:
+            self._clients[client_id] = self._clients.get(client_id, 0) + 1
+        return ticket
+
+    def position(self, ticket: AdmissionTicket) -> int:
+        """获取凭证在等待队列中的位置（从1开始），不在队列中时返回0"""
+        try:
+            return self._queue.index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def changed_event(self) -> asyncio.Event:
+        """获取在队列下次变化（有请求出队）时被触发的事件"""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        return self._changed
+
+    def retry_after(self) -> int:
+        """按当前排队长度和平均执行耗时估算建议的重试间隔（秒）"""
+        service = self.avg_service_seconds or 1.0
+        return max(1, math.ceil(service * (len(self._queue) + 1) / self.max_in_flight))
+
+    def _admit(self, ticket: AdmissionTicket):
+        self.in_flight += 1
+        self.admitted_total += 1
+        ticket.admitted_at = time.monotonic()
+        waited = ticket.admitted_at - ticket.enqueued_at
+        self.wait_seconds_total += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        ticket._admitted.set()
+
+    def _release(self, ticket: AdmissionTicket):
+        if ticket.admitted:
+            self.in_flight -= 1
+            elapsed = time.monotonic() - ticket.admitted_at
+            self.avg_service_seconds = (
+                elapsed if self.avg_service_seconds == 0 else 0.8 * self.avg_service_seconds + 0.2 * elapsed
+            )
+        else:
+            try:
+                self._queue.remove(ticket)
+            except ValueError:
+                pass
+
+        if ticket.client_id:
+            remaining = self._clients.get(ticket.client_id, 1) - 1
+            if remaining > 0:
+                self._clients[ticket.client_id] = remaining
+            else:
+                self._clients.pop(ticket.client_id, None)
+
+        while self._queue and self.in_flight < self.max_in_flight:
+            self._admit(self._queue.popleft())
+
+        # 唤醒排队者刷新位置
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取准入统计信息
+
+        Returns:
+            当前并发数、队列深度、拒绝数和排队等待时间统计
+        """
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": len(self._queue),
+            "max_queue": self.max_queue,
+            "admitted_total": self.admitted_total,
+            "rejected_total": self.rejected_total,
+            "avg_wait_seconds": round(self.wait_seconds_total / self.admitted_total, 3) if self.admitted_total else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+            "avg_service_seconds": round(self.avg_service_seconds, 3)
+        }
+
+
+_admission_controller = None
+
+register_stats(lambda: _admission_controller.stats() if _admission_controller is not None else None, [
+    ("chat_admission_in_flight", "gauge", "已准入、正在执行的聊天流数量", "in_flight"),
+    ("chat_admission_queue_depth", "gauge", "等待准入的请求数", "queue_depth"),
+    ("chat_admission_admitted_total", "counter", "已准入的请求数", "admitted_total"),
+    ("chat_admission_rejected_total", "counter", "被拒绝的请求数", "rejected_total"),
+    ("chat_admission_max_wait_seconds", "gauge", "最长排队等待时间（秒）", "max_wait_seconds"),
+])
+
+
+def get_admission_controller() -> AdmissionController:
+    """获取准入控制器实例（单例模式）"""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController()
+    return _admission_controller
@@ -1,41 +1,201 @@
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
-from app.models.schemas import ChatRequest
-from app.agent.engine import create_agent_engine
+import os
 import json
+import asyncio
+from typing import AsyncIterator, Dict, Any
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.background import BackgroundTask
+from app.models.schemas import ChatRequest
+from app.api.admission import AdmissionRejected, get_admission_controller
+from app.monitoring.metrics import ACTIVE_STREAMS, SSE_STREAM_FRAMES, SSE_STREAM_BYTES
 
 router = APIRouter()
-agent_engine = create_agent_engine()
+
+# token 事件合并窗口（毫秒）和单次写出的最大字节数
+SSE_COALESCE_WINDOW = float(os.getenv("SSE_COALESCE_WINDOW_MS", "30")) / 1000
+SSE_COALESCE_MAX_BYTES = int(os.getenv("SSE_COALESCE_MAX_BYTES", "4096"))
+
+
+def _format_frame(event: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def coalesce_sse(
+    events: AsyncIterator[Dict[str, Any]],
+    window: float = SSE_COALESCE_WINDOW,
+    max_bytes: int = SSE_COALESCE_MAX_BYTES
+) -> AsyncIterator[str]:
+    """
+    将事件流合并为 SSE 帧批量写出
+
+    连续的 token 事件合并为一个事件；缓冲区在首个事件到达后 window 秒、
+    累计超过 max_bytes 或遇到非 token 事件时写出，避免每个 token 一次写操作。
+
+    Args:
+        events: 事件字典的异步迭代器
+        window: 合并时间窗口（秒），为0时不合并
+        max_bytes: 单次写出的最大字节数
+
+    Yields:
+        一个或多个 "data: ...\\n\\n" 帧拼接成的字符串
+    """
+    if window <= 0:
+        async for event in events:
+            yield _format_frame(event)
+        return
+
+    loop = asyncio.get_running_loop()
+    iterator = events.__aiter__()
+    frames = []
+    size = 0
+    token_text = ""
+    deadline = None
+    next_event = None
+
+    def flush_token():
+        nonlocal token_text, size
+        if token_text:
+            frame = _format_frame({"type": "token", "content": token_text})
+            frames.append(frame)
+            size += len(frame.encode("utf-8"))
+            token_text = ""
+
+    def take_frames() -> str:
+        nonlocal frames, size, deadline
+        flush_token()
+        payload = "".join(frames)
+        frames, size, deadline = [], 0, None
+        return payload
+
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({next_event}, timeout=timeout)
+            if not done:
+                # 时间窗口到期
+                yield take_frames()
+                continue
+
+            task, next_event = next_event, None
+            try:
+                event = task.result()
+            except StopAsyncIteration:
+                break
+
+            if deadline is None:
+                deadline = loop.time() + window
+
+            if event.get("type") == "token":
+                token_text += event.get("content") or ""
+                if size + len(token_text.encode("utf-8")) >= max_bytes:
+                    yield take_frames()
+            else:
+                # 非 token 事件（工具调用、完成等）立即写出，保持顺序
+                flush_token()
+                frames.append(_format_frame(event))
+                yield take_frames()
+
+        if frames or token_text:
+            yield take_frames()
+    finally:
+        if next_event is not None:
+            next_event.cancel()
+
+
+async def _measure_stream(payloads: AsyncIterator[str]) -> AsyncIterator[str]:
+    """统计单个聊天流的帧数、字节数，并维护活跃流数量"""
+    frames = 0
+    size = 0
+    ACTIVE_STREAMS.inc()
+    try:
+        async for payload in payloads:
+            # 事件内容经 JSON 编码不含换行，每帧以一个空行结尾
+            frames += payload.count("\n\n")
+            size += len(payload.encode("utf-8"))
+            yield payload
+    finally:
+        ACTIVE_STREAMS.dec()
+        SSE_STREAM_FRAMES.observe(frames)
+        SSE_STREAM_BYTES.observe(size)
+
+
+def _get_agent_engine():
+    """获取 Agent 引擎，首次使用时才导入 LangChain 等依赖并构建"""
+    from app.agent.engine import get_agent_engine
+    return get_agent_engine()
+
+
+def _rejection_response(error: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": error.reason, "retry_after": error.retry_after},
+        headers={"Retry-After": str(error.retry_after)}
+    )
 
 
 @router.post("/stream")
-async def chat_stream(request: ChatRequest):
+async def chat_stream(request: ChatRequest, http_request: Request):
     """
     流式聊天接口，实时返回 Agent 的思考过程和工具调用
+
+    首个事件为 session，携带会话ID；后续请求带上 session_id 后只需发送新消息。
+    模型输出以 token 事件增量推送，短时间内的多个 token 会合并为一帧。
+    并发名额已满时先推送 queued 事件（队列位置），队列已满时直接返回 429。
+    请求带 trace=true 时额外推送 trace（每个步骤的耗时）和 trace_summary 事件。
     """
-    
-    async def generate():
+    client_id = http_request.headers.get("X-Client-Id") or (http_request.client.host if http_request.client else None)
+    try:
+        ticket = get_admission_controller().enqueue(client_id)
+    except AdmissionRejected as e:
+        return _rejection_response(e)
+
+    async def events():
         try:
+            async for position in ticket.wait():
+                yield {
+                    "type": "queued",
+                    "position": position
+                }
+
             history = [{"role": msg.role, "content": msg.content} for msg in request.history]
-            
-            async for chunk in agent_engine.stream_chat(request.message, history):
-                data = json.dumps(chunk, ensure_ascii=False)
-                yield f"data: {data}\n\n"
-            
+
+            # 预热未完成时由首个请求构建引擎，放到线程中避免阻塞事件循环
+            agent_engine = await asyncio.to_thread(_get_agent_engine)
+            async for chunk in agent_engine.stream_chat(request.message, history, request.session_id, request.trace):
+                yield chunk
+
+        except AdmissionRejected as e:
+            yield {
+                "type": "error",
+                "content": e.reason,
+                "retry_after": e.retry_after
+            }
         except Exception as e:
             print(f"[错误] {e}")
-            error_data = json.dumps({
+            yield {
                 "type": "error",
                 "content": str(e)
-            }, ensure_ascii=False)
-            yield f"data: {error_data}\n\n"
-    
+            }
+        finally:
+            ticket.release()
+
     return StreamingResponse(
-        generate(),
+        _measure_stream(coalesce_sse(events())),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no"
-        }
+        },
+        # 客户端在流开始前断开时生成器不会执行，由后台任务兜底释放名额
+        background=BackgroundTask(ticket.release)
     )
+
+
+@router.get("/admission")
+async def admission_stats():
+    """准入控制统计：当前并发数、队列深度、拒绝数和排队等待时间"""
+    return get_admission_controller().stats()
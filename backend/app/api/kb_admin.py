@@ -0,0 +1,131 @@
+import os
+import json
+import asyncio
+import secrets
+from typing import AsyncIterator
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse, JSONResponse
+from app.models.schemas import KnowledgeBaseJobRequest
+from app.warmup import get_warmup
+
+# 没有新进度时发送 SSE 注释保持连接的间隔（秒）
+KEEPALIVE_INTERVAL = 15.0
+
+
+def require_admin_token(x_admin_token: str = Header(default=None)):
+    """校验 X-Admin-Token；未配置 ADMIN_TOKEN 时管理接口全部禁用"""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="管理接口未启用，请配置 ADMIN_TOKEN")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=403, detail="管理令牌无效")
+
+
+router = APIRouter(dependencies=[Depends(require_admin_token)])
+
+
+def _get_job_manager():
+    # 延迟导入，避免应用启动时加载 RAG 相关依赖
+    from app.rag.kb_jobs import get_kb_job_manager
+    return get_kb_job_manager()
+
+
+def _get_job(job_id: str):
+    job = _get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return job
+
+
+@router.post("/jobs", status_code=202)
+async def start_job(request: KnowledgeBaseJobRequest):
+    """
+    启动知识库后台任务
+
+    rebuild 在影子集合中全量重建，完成后原子切换，期间检索继续使用旧集合；
+    sync 按清单增量同步。预热未完成或已有任务在执行时返回 409。
+    """
+    warmup = get_warmup()
+    if warmup.state in ("pending", "running"):
+        return JSONResponse(status_code=409, content={"detail": "知识库预热尚未完成", "warmup": warmup.status()})
+
+    from app.rag.kb_jobs import JobConflict
+    try:
+        job = await asyncio.to_thread(_get_job_manager().start, request.kind)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.status()
+
+
+@router.get("/jobs")
+async def list_jobs():
+    """最近的任务列表（新任务在前）"""
+    return {"jobs": _get_job_manager().list()}
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """任务状态和进度计数"""
+    return _get_job(job_id).status()
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    以 SSE 推送任务进度事件，从任务开始时的第一个事件重放，任务结束后关闭流
+
+    事件类型: running、files_found、shadow_created、file_parsed、chunks_embedded、
+    batch_committed、file_indexed、file_removed、swapped、completed / failed / cancelled
+    """
+    job = _get_job(job_id)
+
+    async def stream() -> AsyncIterator[str]:
+        cursor = 0
+        done = False
+        while not done:
+            events, cursor, done = await asyncio.to_thread(job.wait_events, cursor, KEEPALIVE_INTERVAL)
+            if not events and not done:
+                yield ": keep-alive\n\n"
+                continue
+            yield "".join(f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """请求取消任务，在下一个文件或批次提交前停止；重建任务会删除未完成的影子集合"""
+    _get_job(job_id)
+    return _get_job_manager().cancel(job_id).status()
+
+
+@router.post("/warmup/retry", status_code=202)
+async def retry_warmup():
+    """预热重试用尽（failed）后重新触发预热，其他状态返回 409"""
+    warmup = get_warmup()
+    if not warmup.retry():
+        return JSONResponse(status_code=409, content={"detail": f"预热状态为 {warmup.state}，无需重试", "warmup": warmup.status()})
+    return warmup.status()
+
+
+@router.get("/info")
+async def knowledge_base_info():
+    """当前集合、版本号、分块数量、缓存统计和正在执行的任务"""
+    warmup = get_warmup()
+    if warmup.state in ("pending", "running"):
+        return JSONResponse(status_code=409, content={"detail": "知识库预热尚未完成", "warmup": warmup.status()})
+
+    from app.tools.tools import get_rag_manager
+    info = await asyncio.to_thread(lambda: get_rag_manager().get_knowledge_base_info())
+    active = _get_job_manager().active_job()
+    return {"knowledge_base": info, "active_job": active.status() if active else None}
@@ -8,30 +8,28 @@ if str(backend_dir) not in sys.path:
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, JSONResponse
 from contextlib import asynccontextmanager
 from app.api.chat import router as chat_router
-from app.tools.tools import get_rag_manager
+from app.api.kb_admin import router as kb_admin_router
+from app.monitoring.metrics import REGISTRY
+from app.warmup import get_warmup
+from app.tools.order_client import close_order_client
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     应用生命周期管理
-    在启动时初始化RAG知识库
+    在启动时开始预热RAG知识库（默认在后台执行，不阻塞端口监听）
     """
     print("=" * 50)
     print("应用启动中...")
     print("=" * 50)
     
-    try:
-        print("初始化RAG知识库...")
-        rag_manager = get_rag_manager()
-        rag_manager.initialize_knowledge_base(force_rebuild=False)
-        
-        kb_info = rag_manager.get_knowledge_base_info()
-        print(f"知识库信息: {kb_info}")
-    except Exception as e:
-        print(f"初始化RAG知识库失败: {e}")
+    warmup = get_warmup()
+    print(f"知识库预热模式: {warmup.mode}")
+    warmup.start()
     
     print("=" * 50)
     print("应用启动完成")
@@ -40,6 +38,7 @@ async def lifespan(app: FastAPI):
     yield
     
     print("应用关闭中...")
+    await close_order_client()
 
 
 app = FastAPI(
@@ -58,6 +57,7 @@ app.add_middleware(
 )
 
 app.include_router(chat_router, prefix="/api/chat", tags=["chat"])
+app.include_router(kb_admin_router, prefix="/api/admin/kb", tags=["admin"])
 
 
 @app.get("/")
@@ -66,7 +66,10 @@ async def root():
         "message": "AI Assistant API",
         "version": "1.0.0",
         "endpoints": {
-            "chat_stream": "/api/chat/stream"
+            "chat_stream": "/api/chat/stream",
+            "kb_admin": "/api/admin/kb",
+            "ready": "/ready",
+            "metrics": "/metrics"
         }
     }
 
@@ -76,6 +79,19 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def ready():
+    """就绪检查：知识库预热完成、检索可用后返回 200，否则返回 503 及预热状态"""
+    status = get_warmup().status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 文本格式的运行指标"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
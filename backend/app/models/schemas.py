@@ -9,7 +9,10 @@ class Message(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
-    history: list[Message]
+    history: list[Message] = []
+    session_id: Optional[str] = None
+    # 是否在流中推送每个步骤的耗时追踪
+    trace: bool = False
 
 
 class ChatStreamChunk(BaseModel):
@@ -18,3 +21,9 @@ class ChatStreamChunk(BaseModel):
     tool_name: Optional[str] = None
     tool_input: Optional[Any] = None
     tool_output: Optional[Any] = None
+    session_id: Optional[str] = None
+
+
+class KnowledgeBaseJobRequest(BaseModel):
+    # rebuild：影子集合全量重建后切换；sync：增量同步
+    kind: str = "sync"
@@ -0,0 +1,310 @@
+import time
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+# 延迟类直方图的默认分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 数量类直方图的默认分桶
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[str, str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    """指标基类：按标签值元组保存数据，每次记录只做一次加锁的字典更新"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """各指标类型按 Prometheus 文本格式输出的样本行"""
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """固定分桶直方图，记录时只做一次二分查找和计数"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各分桶计数（不累计）, 总和, 总数]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """记录 with 代码块的耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """渲染时调用回调读取当前值的指标，用于导出各子系统已有的统计，回调返回 None 时不输出样本"""
+
+    def __init__(self, name: str, documentation: str, kind: str, callback: Callable[[], Optional[float]]):
+        super().__init__(name, documentation)
+        self.kind = kind
+        self.callback = callback
+
+    def _samples(self) -> List[str]:
+        value = self.callback()
+        return [] if value is None else [f"{self.name} {_format_value(value)}"]
+
+
+class MetricsRegistry:
+    """指标注册表，负责以 Prometheus 文本格式输出所有指标"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标重复注册: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        输出 Prometheus 文本格式（exposition format 0.0.4）
+
+        Returns:
+            指标文本
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+LLM_TIME_TO_FIRST_TOKEN = REGISTRY.register(Histogram(
+    "llm_time_to_first_token_seconds", "模型调用从开始到首个 token 的耗时", ["node"]
+))
+LLM_DURATION = REGISTRY.register(Histogram(
+    "llm_call_duration_seconds", "模型调用总耗时", ["node"]
+))
+LLM_ERRORS = REGISTRY.register(Counter(
+    "llm_call_errors_total", "模型调用失败次数", ["node"]
+))
+TOOL_DURATION = REGISTRY.register(Histogram(
+    "tool_call_duration_seconds", "工具调用耗时", ["tool", "cached"]
+))
+TOOL_ERRORS = REGISTRY.register(Counter(
+    "tool_call_errors_total", "工具调用失败次数", ["tool", "reason"]
+))
+EMBEDDING_DURATION = REGISTRY.register(Histogram(
+    "embedding_duration_seconds", "嵌入耗时（含缓存查询）", ["operation"]
+))
+EMBEDDING_BATCH_SIZE = REGISTRY.register(Histogram(
+    "embedding_batch_size", "每次嵌入的文本数", ["operation"], buckets=SIZE_BUCKETS
+))
+VECTOR_SEARCH_DURATION = REGISTRY.register(Histogram(
+    "vector_search_duration_seconds", "向量库检索耗时", ["backend", "operation"]
+))
+SSE_STREAM_FRAMES = REGISTRY.register(Histogram(
+    "sse_stream_frames", "每个聊天流写出的 SSE 帧数", buckets=SIZE_BUCKETS
+))
+SSE_STREAM_BYTES = REGISTRY.register(Histogram(
+    "sse_stream_bytes", "每个聊天流写出的字节数", buckets=BYTES_BUCKETS
+))
+ACTIVE_STREAMS = REGISTRY.register(Gauge(
+    "chat_active_streams", "正在进行的聊天流数量"
+))
+
+
+def register_stats(stats: Callable[[], Optional[Dict[str, Any]]], metrics: Sequence[Tuple[str, str, str, str]]):
+    """
+    把子系统 stats() 中的字段注册为指标，抓取时读取
+
+    Args:
+        stats: 返回统计字典的函数，子系统尚未创建时返回 None（不输出样本，也不会因抓取而创建子系统）
+        metrics: (指标名, 类型 counter/gauge, 说明, stats 中的字段名) 列表
+    """
+    for name, kind, documentation, field in metrics:
+        REGISTRY.register(CallbackMetric(
+            name, documentation, kind,
+            lambda field=field: (stats() or {}).get(field)
+        ))
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    记录模型调用耗时的回调，按 LangGraph 节点名区分（内部调用按标签区分，如 history_compaction）
+
+    在回调线程内直接执行（run_inline），每次调用只做字典读写。
+    """
+
+    run_inline = True
+
+    def __init__(self, max_age: float = 600.0, max_runs: int = 1024):
+        """
+        初始化回调
+
+        Args:
+            max_age: 未结束调用的记录最多保留的秒数
+            max_runs: 最多同时记录的调用数
+        """
+        self.max_age = max_age
+        self.max_runs = max(1, max_runs)
+        # run_id -> (节点名, 开始时间, 是否已收到首个 token)，按开始时间顺序插入
+        self._runs: Dict[UUID, list] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, tags: Optional[List[str]] = None,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs):
+        node = "history_compaction" if tags and "history_compaction" in tags else (metadata or {}).get("langgraph_node", "unknown")
+        now = time.perf_counter()
+        self._evict(now)
+        self._runs[run_id] = [node, now, False]
+
+    def _evict(self, now: float):
+        # 被取消的调用（客户端断开、准入取消）不会触发 end/error 回调，按开始时间从最早的记录开始清理
+        while self._runs:
+            run_id = next(iter(self._runs))
+            run = self._runs.get(run_id)
+            if run is not None and now - run[1] < self.max_age and len(self._runs) < self.max_runs:
+                break
+            self._runs.pop(run_id, None)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and not run[2]:
+            run[2] = True
+            LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - run[1], node=run[0])
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            LLM_DURATION.observe(time.perf_counter() - run[1], node=run[0])
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            LLM_ERRORS.inc(node=run[0])
@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class RequestTrace:
+    """
+    单次聊天请求的耗时追踪，记录模型调用、工具调用及其子步骤组成的 span 树
+
+    时间戳为相对请求开始的毫秒数。结束的 span 先放入待发送队列，由 AgentEngine 作为 trace 事件推送。
+    """
+
+    def __init__(self, request_id: str = None, emit_events: bool = False):
+        """
+        初始化请求追踪
+
+        Args:
+            request_id: 请求ID，默认随机生成
+            emit_events: 是否在 SSE 流中推送 trace 事件
+        """
+        self.request_id = request_id or uuid4().hex
+        self.emit_events = emit_events
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        # LangChain run_id -> span
+        self._runs: Dict[UUID, Dict[str, Any]] = {}
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _now_ms(self) -> float:
+        return round((time.perf_counter() - self._start) * 1000, 2)
+
+    def start_span(
+        self,
+        name: str,
+        kind: str,
+        parent_id: Optional[str] = None,
+        run_id: Optional[UUID] = None,
+        **attributes
+    ) -> Dict[str, Any]:
+        """
+        开始一个 span
+
+        Args:
+            name: 名称（如模型节点名、工具名、子步骤名）
+            kind: 类型：model / tool / step
+            parent_id: 父 span ID
+            run_id: 对应的 LangChain run_id，用于子步骤查找父 span
+            **attributes: 附加属性
+
+        Returns:
+            span 字典
+        """
+        span = {
+            "id": uuid4().hex[:16],
+            "parent_id": parent_id,
+            "name": name,
+            "kind": kind,
+            "start_ms": self._now_ms(),
+            "end_ms": None,
+            "attributes": attributes
+        }
+        with self._lock:
+            self.spans.append(span)
+            if run_id is not None:
+                self._runs[run_id] = span
+        return span
+
+    def end_span(self, span: Dict[str, Any], **attributes):
+        """
+        结束一个 span
+
+        Args:
+            span: start_span 返回的 span
+            **attributes: 附加属性（如错误信息）
+        """
+        span["end_ms"] = self._now_ms()
+        span["duration_ms"] = round(span["end_ms"] - span["start_ms"], 2)
+        span["attributes"].update(attributes)
+        if self.emit_events:
+            with self._lock:
+                self._pending.append(span)
+
+    def span_for_run(self, run_id: Optional[UUID]) -> Optional[Dict[str, Any]]:
+        """按 LangChain run_id 查找 span"""
+        return self._runs.get(run_id) if run_id is not None else None
+
+    def pop_run(self, run_id: UUID) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._runs.pop(run_id, None)
+
+    def drain_events(self) -> List[Dict[str, Any]]:
+        """
+        取出待推送的 trace 事件
+
+        Returns:
+            trace 事件列表
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return [
+            {
+                "type": "trace",
+                "span": {key: value for key, value in span.items() if key != "attributes"},
+                "attributes": span["attributes"]
+            }
+            for span in pending
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        生成耗时汇总
+
+        Returns:
+            总耗时、按类型汇总的耗时和次数、每个步骤的起止时间
+        """
+        by_kind: Dict[str, Dict[str, float]] = {}
+        steps = []
+        for span in self.spans:
+            if span["end_ms"] is None:
+                continue
+            stats = by_kind.setdefault(span["kind"], {"count": 0, "total_ms": 0.0})
+            stats["count"] += 1
+            stats["total_ms"] = round(stats["total_ms"] + span["duration_ms"], 2)
+            steps.append({
+                "name": span["name"],
+                "kind": span["kind"],
+                "start_ms": span["start_ms"],
+                "end_ms": span["end_ms"]
+            })
+        return {
+            "request_id": self.request_id,
+            "total_ms": self._now_ms(),
+            "by_kind": by_kind,
+            "steps": steps
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出完整的 span 树（按父子关系嵌套）"""
+        nodes = {span["id"]: dict(span, children=[]) for span in self.spans}
+        roots = []
+        for node in nodes.values():
+            parent = nodes.get(node["parent_id"])
+            (parent["children"] if parent else roots).append(node)
+        return {
+            "request_id": self.request_id,
+            "started_at": self.started_at,
+            "total_ms": self._now_ms(),
+            "spans": roots
+        }
+
+
+class TraceCallback(BaseCallbackHandler):
+    """把模型调用和工具调用记录为 RequestTrace 中的 span"""
+
+    run_inline = True
+
+    def __init__(self, trace: RequestTrace):
+        self.trace = trace
+
+    def _parent_id(self, parent_run_id: Optional[UUID]) -> Optional[str]:
+        parent = self.trace.span_for_run(parent_run_id)
+        return parent["id"] if parent else None
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                            tags: Optional[List[str]] = None, metadata: Optional[Dict[str, Any]] = None, **kwargs):
+        name = "history_compaction" if tags and "history_compaction" in tags else (metadata or {}).get("langgraph_node", "model")
+        self.trace.start_span(
+            name, "model", self._parent_id(parent_run_id), run_id,
+            input_messages=sum(len(batch) for batch in messages)
+        )
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        span = self.trace.pop_run(run_id)
+        if span is not None:
+            self.trace.end_span(span)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        span = self.trace.pop_run(run_id)
+        if span is not None:
+            self.trace.end_span(span, error=str(error))
+
+    def on_tool_start(self, serialized, input_str: str, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self.trace.start_span(name, "tool", self._parent_id(parent_run_id), run_id)
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs):
+        span = self.trace.pop_run(run_id)
+        if span is not None:
+            self.trace.end_span(span)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        span = self.trace.pop_run(run_id)
+        if span is not None:
+            self.trace.end_span(span, error=str(error))
+
+
+def _current_trace() -> Tuple[Optional[RequestTrace], Optional[UUID]]:
+    """从当前 LangGraph 运行配置中取出请求追踪和父 run_id（不在 Agent 运行中时返回 None）"""
+    try:
+        from langgraph.config import get_config
+        config = get_config()
+    except Exception:
+        return None, None
+    trace = (config.get("configurable") or {}).get("trace")
+    parent_run_id = getattr(config.get("callbacks"), "parent_run_id", None)
+    return trace, parent_run_id
+
+
+@asynccontextmanager
+async def trace_step(name: str, **attributes):
+    """
+    在工具内部记录子步骤（如 rag_search 中的嵌入和向量检索），当前请求未开启追踪时不做任何事
+
+    Args:
+        name: 子步骤名称
+        **attributes: 附加属性
+    """
+    trace, parent_run_id = _current_trace()
+    if trace is None:
+        yield
+        return
+
+    parent = trace.span_for_run(parent_run_id)
+    span = trace.start_span(name, "step", parent["id"] if parent else None, **attributes)
+    try:
+        yield
+    except BaseException as e:
+        trace.end_span(span, error=str(e))
+        raise
+    trace.end_span(span)
+
+
+class TraceExporter:
+    """按采样率或慢请求阈值，把完整 span 树追加写入本地 JSONL 文件"""
+
+    def __init__(self, path: str = None, sample_rate: float = None, slow_threshold_ms: float = None):
+        """
+        初始化追踪导出
+
+        Args:
+            path: JSONL 文件路径，默认读取 TRACE_EXPORT_PATH，未配置时使用 data/traces.jsonl
+            sample_rate: 随机采样比例（0~1），默认读取 TRACE_SAMPLE_RATE
+            slow_threshold_ms: 总耗时超过该值（毫秒）的请求总是导出，为0时不启用，默认读取 TRACE_SLOW_THRESHOLD_MS
+        """
+        if path is None:
+            path = os.getenv("TRACE_EXPORT_PATH")
+        if not path:
+            current_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            path = os.path.join(current_dir, "data", "traces.jsonl")
+        self.path = path
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+        self.slow_threshold_ms = (
+            slow_threshold_ms if slow_threshold_ms is not None
+            else float(os.getenv("TRACE_SLOW_THRESHOLD_MS", "0"))
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用导出（启用时每个请求都需要记录追踪）"""
+        return self.sample_rate > 0 or self.slow_threshold_ms > 0
+
+    async def export(self, trace: RequestTrace):
+        """
+        按采样规则导出追踪，文件写入放到线程中执行，不阻塞事件循环
+
+        Args:
+            trace: 已结束的请求追踪
+        """
+        total_ms = trace._now_ms()
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        slow = self.slow_threshold_ms > 0 and total_ms >= self.slow_threshold_ms
+        if not (sampled or slow):
+            return
+
+        record = trace.to_dict()
+        record["export_reason"] = "slow" if slow else "sampled"
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        await asyncio.to_thread(self._append, line)
+
+    def _append(self, line: str):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except Exception as e:
+            print(f"导出请求追踪失败: {e}")
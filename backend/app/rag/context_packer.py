@@ -0,0 +1,188 @@
+import os
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+
+_CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿豈-﫿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数：中文字符约 1 token/字，其余字符约 4 字符/token
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的 token 数
+    """
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _split_chunk_id(chunk_id: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+    """将 "<文件名>_<序号>" 形式的 chunk_id 拆分为 (前缀, 序号)"""
+    if not chunk_id or "_" not in chunk_id:
+        return None, None
+    prefix, _, index = chunk_id.rpartition("_")
+    return (prefix, int(index)) if index.isdigit() else (None, None)
+
+
+def _merge_overlap(left: str, right: str, max_overlap: int) -> str:
+    """拼接相邻分块，去掉 left 结尾与 right 开头重叠的部分"""
+    for size in range(min(max_overlap, len(left), len(right)), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n" + right
+
+
+def _shingles(text: str) -> set:
+    """字符二元组集合，用于近似重复判断"""
+    text = "".join(text.split())
+    return {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextPacker:
+    """
+    检索结果上下文打包器，位于 RAGManager.search 与 rag_search 工具输出之间:
+    1. 丢弃相似度低于阈值的结果
+    2. 合并同一来源中 chunk_id 相邻的分块，并去掉分块重叠部分
+    3. 用 MMR 按相关性和多样性排序，去除近似重复
+    4. 在 token 预算内填充
+    """
+
+    def __init__(
+        self,
+        token_budget: int = None,
+        min_similarity: float = None,
+        mmr_lambda: float = 0.7,
+        duplicate_threshold: float = 0.8,
+        max_overlap: int = 300
+    ):
+        """
+        初始化上下文打包器
+
+        Args:
+            token_budget: 输出的 token 预算，默认读取 RAG_CONTEXT_TOKEN_BUDGET
+            min_similarity: 最低余弦相似度（1 - distance），默认读取 RAG_MIN_SIMILARITY；
+                没有向量距离的结果（如仅由 BM25 召回）不受此限制
+            mmr_lambda: MMR 中相关性的权重，越小越偏向多样性
+            duplicate_threshold: 与已选内容的相似度（字符二元组 Jaccard）超过该值时视为重复并丢弃
+            max_overlap: 合并相邻分块时检查的最大重叠字符数，应不小于分块重叠大小
+        """
+        if token_budget is None:
+            token_budget = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "2000"))
+        if min_similarity is None:
+            min_similarity = float(os.getenv("RAG_MIN_SIMILARITY", "0.2"))
+
+        self.token_budget = token_budget
+        self.min_similarity = min_similarity
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.max_overlap = max_overlap
+
+    def pack(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        打包检索结果
+
+        Args:
+            results: RAGManager.search 返回的结果列表（按相关性降序）
+
+        Returns:
+            打包后的片段列表，每个片段包含 content, source, chunk_ids
+        """
+        candidates = self._filter(results)
+        blocks = self._merge_adjacent(candidates)
+        selected = self._select_mmr(blocks)
+        return self._fill_budget(selected)
+
+    def _filter(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        kept = []
+        for rank, result in enumerate(results):
+            distance = result.get("distance")
+            if distance is not None and 1.0 - distance < self.min_similarity:
+                continue
+            # 以原始排名作为相关性，兼容向量距离和 RRF 分数两种排序依据
+            kept.append(dict(result, relevance=1.0 / (rank + 1)))
+        return kept
+
+    def _merge_adjacent(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        groups: Dict[Tuple[str, str], List[Tuple[int, Dict[str, Any]]]] = {}
+        blocks = []
+
+        for result in results:
+            prefix, index = _split_chunk_id(result.get("chunk_id"))
+            if index is None:
+                blocks.append({
+                    "content": result["content"],
+                    "source": result["source"],
+                    "chunk_ids": [result.get("chunk_id")] if result.get("chunk_id") else [],
+                    "relevance": result["relevance"]
+                })
+            else:
+                groups.setdefault((result["source"], prefix), []).append((index, result))
+
+        for (source, _), members in groups.items():
+            members.sort(key=lambda item: item[0])
+            run = [members[0]]
+            for index, result in members[1:]:
+                if index == run[-1][0] + 1:
+                    run.append((index, result))
+                elif index != run[-1][0]:
+                    blocks.append(self._join_run(source, run))
+                    run = [(index, result)]
+            blocks.append(self._join_run(source, run))
+
+        return blocks
+
+    def _join_run(self, source: str, run: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+        content = run[0][1]["content"]
+        for _, result in run[1:]:
+            content = _merge_overlap(content, result["content"], self.max_overlap)
+        return {
+            "content": content,
+            "source": source,
+            "chunk_ids": [result["chunk_id"] for _, result in run],
+            "relevance": max(result["relevance"] for _, result in run)
+        }
+
+    def _select_mmr(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        remaining = [(block, _shingles(block["content"])) for block in blocks]
+        selected: List[Tuple[Dict[str, Any], set]] = []
+
+        while remaining:
+            best_index, best_score = None, None
+            for i, (block, shingles) in enumerate(remaining):
+                redundancy = max((_jaccard(shingles, chosen) for _, chosen in selected), default=0.0)
+                if redundancy >= self.duplicate_threshold:
+                    continue
+                score = self.mmr_lambda * block["relevance"] - (1 - self.mmr_lambda) * redundancy
+                if best_score is None or score > best_score:
+                    best_index, best_score = i, score
+            if best_index is None:
+                break
+            selected.append(remaining.pop(best_index))
+
+        return [block for block, _ in selected]
+
+    def _fill_budget(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        packed = []
+        used = 0
+        for block in blocks:
+            tokens = estimate_tokens(block["content"])
+            if used + tokens <= self.token_budget:
+                packed.append({key: block[key] for key in ("content", "source", "chunk_ids")})
+                used += tokens
+            elif not packed:
+                # 最相关的片段本身超出预算时截断保留，保证至少有一条结果
+                ratio = self.token_budget / max(tokens, 1)
+                content = block["content"][:max(1, int(len(block["content"]) * ratio))]
+                packed.append({"content": content, "source": block["source"], "chunk_ids": block["chunk_ids"]})
+                break
+        return packed
@@ -1,23 +1,60 @@
 import os
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import List, Tuple, Iterator, Deque
 from pypdf import PdfReader
 
 
+def _extract_pages(file_path: str, start: int = 0, end: int = None) -> List[str]:
+    """
+    提取PDF指定页范围的文本（进程池工作函数，需位于模块顶层以便序列化）
+    
+    Args:
+        file_path: PDF文件路径
+        start: 起始页（包含）
+        end: 结束页（不包含），默认为最后一页
+        
+    Returns:
+        各页非空文本列表
+    """
+    reader = PdfReader(file_path)
+    text_content = []
+    
+    for page in reader.pages[start:end]:
+        text = page.extract_text()
+        if text:
+            text_content.append(text)
+    
+    return text_content
+
+
 class DocumentLoader:
     """文档加载器，支持加载PDF文档"""
     
-    def __init__(self, resources_dir: str = None):
+    def __init__(
+        self,
+        resources_dir: str = None,
+        max_workers: int = None,
+        pages_per_task: int = 50
+    ):
         """
         初始化文档加载器
         
         Args:
             resources_dir: 资源目录路径，默认为项目根目录下的resources
+            max_workers: 解析PDF的进程数，默认读取环境变量 PDF_LOADER_WORKERS，为1时顺序加载
+            pages_per_task: 并行模式下大文件按页拆分的粒度，每个任务最多处理的页数
         """
         if resources_dir is None:
             current_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
             resources_dir = os.path.join(current_dir, "resources")
         
+        if max_workers is None:
+            max_workers = int(os.getenv("PDF_LOADER_WORKERS", "1"))
+        
         self.resources_dir = resources_dir
+        self.max_workers = max(1, max_workers)
+        self.pages_per_task = max(1, pages_per_task)
     
     def load_pdf(self, file_path: str) -> str:
         """
@@ -35,37 +72,140 @@ class DocumentLoader:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"文件不存在: {file_path}")
         
-        reader = PdfReader(file_path)
-        text_content = []
+        return "\n\n".join(_extract_pages(file_path))
+    
+    def list_pdfs(self) -> List[str]:
+        """
+        列出resources目录下所有PDF文件名
         
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                text_content.append(text)
+        Returns:
+            按文件名排序的PDF文件名列表
+        """
+        if not os.path.exists(self.resources_dir):
+            return []
         
-        return "\n\n".join(text_content)
+        return sorted(
+            filename for filename in os.listdir(self.resources_dir)
+            if filename.lower().endswith('.pdf')
+        )
     
     def load_all_pdfs(self) -> List[tuple]:
         """
         加载resources目录下所有PDF文件
         
         Returns:
-            包含(文件名, 文件内容)元组的列表
+            包含(文件名, 文件内容)元组的列表，按文件名排序
         """
-        documents = []
-        
         if not os.path.exists(self.resources_dir):
             print(f"资源目录不存在: {self.resources_dir}")
-            return documents
+            return []
         
-        for filename in os.listdir(self.resources_dir):
-            if filename.lower().endswith('.pdf'):
+        return self.load_pdfs(self.list_pdfs())
+    
+    def load_pdfs(self, filenames: List[str]) -> List[tuple]:
+        """
+        加载指定的PDF文件，max_workers 大于1时使用进程池并行解析
+        
+        Args:
+            filenames: resources目录下的PDF文件名列表
+            
+        Returns:
+            包含(文件名, 文件内容)元组的列表，顺序与 filenames 一致；加载失败的文件会被跳过
+        """
+        return list(self.iter_pdfs(filenames))
+    
+    def iter_pdfs(self, filenames: List[str]) -> Iterator[tuple]:
+        """
+        逐个产出PDF文件内容，供流式入库使用
+        
+        Args:
+            filenames: resources目录下的PDF文件名列表
+            
+        Yields:
+            (文件名, 文件内容)元组，顺序与 filenames 一致；加载失败的文件会被跳过
+        """
+        if self.max_workers <= 1:
+            for filename in filenames:
                 try:
                     file_path = os.path.join(self.resources_dir, filename)
                     content = self.load_pdf(file_path)
-                    documents.append((filename, content))
-                    print(f"成功加载PDF文件: {filename}")
                 except Exception as e:
                     print(f"加载PDF文件失败 {filename}: {e}")
+                    continue
+                print(f"成功加载PDF文件: {filename}")
+                yield filename, content
+            return
+        
+        yield from self._iter_pdfs_parallel(filenames)
+    
+    def _page_ranges(self, filename: str) -> List[Tuple[int, int]]:
+        """
+        按 pages_per_task 将文件拆分为页范围任务
         
-        return documents
+        Args:
+            filename: PDF文件名
+            
+        Returns:
+            (起始页, 结束页) 列表
+        """
+        file_path = os.path.join(self.resources_dir, filename)
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件不存在: {file_path}")
+        
+        page_count = len(PdfReader(file_path).pages)
+        ranges = [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+        return ranges or [(0, 0)]
+    
+    def _iter_pdfs_parallel(self, filenames: List[str]) -> Iterator[tuple]:
+        """
+        使用进程池并行解析PDF，大文件按页范围拆分为多个任务。
+        同时在途的文件数限制为 max_workers 的两倍，避免解析结果堆积在内存中。
+        
+        Args:
+            filenames: PDF文件名列表
+            
+        Yields:
+            (文件名, 文件内容)元组，顺序与 filenames 一致
+        """
+        pending_names = iter(filenames)
+        in_flight: Deque[Tuple[str, List[Future]]] = deque()
+        
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            def submit_next() -> bool:
+                for filename in pending_names:
+                    try:
+                        ranges = self._page_ranges(filename)
+                    except Exception as e:
+                        print(f"加载PDF文件失败 {filename}: {e}")
+                        continue
+                    file_path = os.path.join(self.resources_dir, filename)
+                    in_flight.append((filename, [
+                        executor.submit(_extract_pages, file_path, start, end)
+                        for start, end in ranges
+                    ]))
+                    return True
+                return False
+            
+            for _ in range(self.max_workers * 2):
+                if not submit_next():
+                    break
+            
+            while in_flight:
+                filename, futures = in_flight.popleft()
+                try:
+                    text_content = []
+                    for future in futures:
+                        text_content.extend(future.result())
+                    content = "\n\n".join(text_content)
+                except Exception as e:
+                    print(f"加载PDF文件失败 {filename}: {e}")
+                    content = None
+                
+                submit_next()
+                
+                if content is not None:
+                    print(f"成功加载PDF文件: {filename}")
+                    yield filename, content
@@ -0,0 +1,229 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+
+class EmbeddingCache:
+    """
+    两级嵌入向量缓存：内存 LRU + SQLite 磁盘存储
+
+    缓存键由模型名称、向量维度和文本内容的 SHA-256 组成，
+    更换模型或维度后旧缓存自然失效。两级缓存都按最近最少使用淘汰。
+    """
+
+    def __init__(
+        self,
+        model: str,
+        dimensions: int,
+        db_path: Optional[str] = None,
+        max_memory_entries: int = 2048,
+        max_disk_entries: int = 100000
+    ):
+        """
+        初始化嵌入缓存
+
+        Args:
+            model: 嵌入模型名称
+            dimensions: 向量维度
+            db_path: SQLite 文件路径，为 None 时只使用内存缓存
+            max_memory_entries: 内存 LRU 的最大条目数
+            max_disk_entries: 磁盘缓存的最大条目数，超出后淘汰最久未使用的条目
+        """
+        self.model = model
+        self.dimensions = dimensions
+        self.db_path = db_path
+        self.max_memory_entries = max(0, max_memory_entries)
+        self.max_disk_entries = max(0, max_disk_entries)
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_count = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+        if db_path:
+            self._init_disk(db_path)
+
+    def _init_disk(self, db_path: str):
+        """初始化 SQLite 磁盘缓存"""
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def make_key(self, text: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            text: 文本内容
+
+        Returns:
+            缓存键
+        """
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model}:{self.dimensions}:{digest}"
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        批量查询缓存
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与 texts 一一对应的向量列表，未命中的位置为 None
+        """
+        keys = [self.make_key(text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        disk_lookup: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results[i] = vector
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            if disk_lookup and self._conn is not None:
+                found = self._read_disk(list(disk_lookup))
+                for key, vector in found.items():
+                    for i in disk_lookup.pop(key):
+                        results[i] = vector
+                        self.disk_hits += 1
+                    self._put_memory(key, vector)
+
+            self.misses += sum(len(positions) for positions in disk_lookup.values())
+
+        return results
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """
+        批量写入缓存
+
+        Args:
+            texts: 文本列表
+            vectors: 对应的向量列表
+        """
+        if not texts:
+            return
+
+        items = {self.make_key(text): list(vector) for text, vector in zip(texts, vectors)}
+
+        with self._lock:
+            for key, vector in items.items():
+                self._put_memory(key, vector)
+
+            if self._conn is not None:
+                self._write_disk(items)
+
+    def _put_memory(self, key: str, vector: List[float]):
+        """写入内存 LRU，超出容量时淘汰最久未使用的条目（调用方需持有锁）"""
+        if self.max_memory_entries == 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.memory_evictions += 1
+
+    def _read_disk(self, keys: List[str], batch_size: int = 500) -> Dict[str, List[float]]:
+        """从 SQLite 读取向量并刷新最近使用时间（调用方需持有锁）"""
+        found: Dict[str, List[float]] = {}
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found]
+            )
+            self._conn.commit()
+        return found
+
+    def _write_disk(self, items: Dict[str, List[float]]):
+        """写入 SQLite，超出容量时按最近使用时间淘汰（调用方需持有锁）"""
+        if self.max_disk_entries == 0:
+            return
+
+        now = time.time()
+        before = self._conn.total_changes
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+            [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+        )
+        self._disk_count += self._conn.total_changes - before
+
+        overflow = self._disk_count - self.max_disk_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            self._disk_count -= overflow
+            self.disk_evictions += overflow
+        self._conn.commit()
+
+    def clear(self):
+        """清空内存和磁盘缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM embeddings")
+                self._conn.commit()
+                self._disk_count = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            命中、未命中、淘汰次数及当前条目数
+        """
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count,
+                "memory_evictions": self.memory_evictions,
+                "disk_evictions": self.disk_evictions
+            }
@@ -1,6 +1,9 @@
 import os
+import asyncio
 from typing import List
 from langchain_openai import OpenAIEmbeddings
+from .embedding_cache import EmbeddingCache
+from ..monitoring.metrics import EMBEDDING_DURATION, EMBEDDING_BATCH_SIZE
 
 
 class EmbeddingService:
@@ -10,7 +13,9 @@ class EmbeddingService:
         self,
         base_url: str = None,
         api_key: str = None,
-        model: str = None
+        model: str = None,
+        dimensions: int = 1536,
+        cache: EmbeddingCache = None
     ):
         """
         初始化嵌入模型服务
@@ -19,16 +24,38 @@ class EmbeddingService:
             base_url: OpenAI API的基础URL
             api_key: OpenAI API密钥
             model: 嵌入模型名称
+            dimensions: 向量维度
+            cache: 嵌入缓存，默认按环境变量 EMBEDDING_CACHE_* 创建，EMBEDDING_CACHE_ENABLED=false 时禁用
         """
         self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.model = model or os.getenv("EMBEDDING_MODEL_NAME")
+        self.dimensions = dimensions
         
         self.embeddings = OpenAIEmbeddings(
             openai_api_base=self.base_url,
             openai_api_key=self.api_key,
             model=self.model,
-            dimensions=1536
+            dimensions=self.dimensions
+        )
+        
+        if cache is None and os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true":
+            cache = self._create_default_cache()
+        self.cache = cache
+    
+    def _create_default_cache(self) -> EmbeddingCache:
+        """根据环境变量创建默认的两级嵌入缓存"""
+        db_path = os.getenv("EMBEDDING_CACHE_PATH")
+        if db_path is None:
+            current_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            db_path = os.path.join(current_dir, "data", "embedding_cache.sqlite3")
+        
+        return EmbeddingCache(
+            model=self.model,
+            dimensions=self.dimensions,
+            db_path=db_path or None,
+            max_memory_entries=int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "2048")),
+            max_disk_entries=int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", "100000"))
         )
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
@@ -41,7 +68,23 @@ class EmbeddingService:
         Returns:
             嵌入向量列表
         """
-        return self.embeddings.embed_documents(texts)
+        EMBEDDING_BATCH_SIZE.observe(len(texts), operation="embed_documents")
+        with EMBEDDING_DURATION.time(operation="embed_documents"):
+            return self._embed_documents(texts)
+    
+    def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.cache is None:
+            return self.embeddings.embed_documents(texts)
+        
+        vectors = self.cache.get_many(texts)
+        # 只对未命中的文本调用接口，批次内重复的文本只嵌入一次
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            embedded = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            self.cache.put_many(missing, [embedded[text] for text in missing])
+            vectors = [vector if vector is not None else embedded[text] for text, vector in zip(texts, vectors)]
+        
+        return vectors
     
     def embed_query(self, text: str) -> List[float]:
         """
@@ -53,4 +96,41 @@ class EmbeddingService:
         Returns:
             嵌入向量
         """
-        return self.embeddings.embed_query(text)
+        with EMBEDDING_DURATION.time(operation="embed_query"):
+            if self.cache is None:
+                return self.embeddings.embed_query(text)
+            
+            vector = self.cache.get_many([text])[0]
+            if vector is None:
+                vector = self.embeddings.embed_query(text)
+                self.cache.put_many([text], [vector])
+            return vector
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        异步将查询文本转换为嵌入向量，不阻塞事件循环（缓存的 SQLite 读写放到线程中执行）
+        
+        Args:
+            text: 查询文本
+            
+        Returns:
+            嵌入向量
+        """
+        with EMBEDDING_DURATION.time(operation="embed_query"):
+            if self.cache is None:
+                return await self.embeddings.aembed_query(text)
+            
+            vector = (await asyncio.to_thread(self.cache.get_many, [text]))[0]
+            if vector is None:
+                vector = await self.embeddings.aembed_query(text)
+                await asyncio.to_thread(self.cache.put_many, [text], [vector])
+            return vector
+    
+    def cache_stats(self) -> dict:
+        """
+        获取嵌入缓存统计信息
+        
+        Returns:
+            缓存统计字典，未启用缓存时为空字典
+        """
+        return self.cache.stats() if self.cache is not None else {}
@@ -0,0 +1,128 @@
+import os
+import json
+import hashlib
+from typing import Dict, Any, List, Optional
+
+
+class IndexManifest:
+    """索引清单，记录每个已入库文件的内容哈希、修改时间和分块ID，用于增量同步"""
+
+    VERSION = 1
+
+    def __init__(self, manifest_path: str):
+        """
+        初始化索引清单
+
+        Args:
+            manifest_path: 清单文件路径（JSON）
+        """
+        self.manifest_path = manifest_path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    @staticmethod
+    def compute_file_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+        """
+        计算文件内容的 SHA-256 哈希
+
+        Args:
+            file_path: 文件路径
+            block_size: 每次读取的字节数
+
+        Returns:
+            十六进制哈希字符串
+        """
+        hasher = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    def exists(self) -> bool:
+        """清单文件是否存在"""
+        return os.path.exists(self.manifest_path)
+
+    def load(self):
+        """从磁盘加载清单，文件不存在或损坏时视为空清单"""
+        self.files = {}
+        if not self.exists():
+            return
+
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self.files = data.get("files", {})
+        except Exception as e:
+            print(f"读取索引清单失败，将视为空清单: {e}")
+
+    def save(self):
+        """原子写入清单文件"""
+        directory = os.path.dirname(self.manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": self.VERSION, "files": self.files},
+                f,
+                ensure_ascii=False,
+                indent=2
+            )
+        os.replace(tmp_path, self.manifest_path)
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        """获取文件的清单记录"""
+        return self.files.get(filename)
+
+    def update(
+        self,
+        filename: str,
+        file_hash: str,
+        mtime: float,
+        size: int,
+        chunk_ids: List[str],
+        complete: bool = True
+    ):
+        """
+        更新文件的清单记录
+
+        Args:
+            filename: 文件名
+            file_hash: 文件内容哈希
+            mtime: 文件修改时间
+            size: 文件大小（字节）
+            chunk_ids: 该文件在向量库中的分块ID列表
+            complete: 该文件的所有分块是否都已提交
+        """
+        self.files[filename] = {
+            "hash": file_hash,
+            "mtime": mtime,
+            "size": size,
+            "chunk_ids": list(chunk_ids),
+            "complete": complete
+        }
+
+    def append_chunk_ids(self, filename: str, chunk_ids: List[str]):
+        """追加已提交的分块ID"""
+        self.files[filename]["chunk_ids"].extend(chunk_ids)
+
+    def mark_complete(self, filename: str):
+        """标记文件的所有分块均已提交"""
+        self.files[filename]["complete"] = True
+
+    def incomplete_files(self) -> List[str]:
+        """获取上次入库中断、尚未完成的文件列表"""
+        return [
+            filename for filename, entry in self.files.items()
+            if not entry.get("complete", True)
+        ]
+
+    def remove(self, filename: str):
+        """删除文件的清单记录"""
+        self.files.pop(filename, None)
+
+    def clear(self):
+        """清空清单记录"""
+        self.files = {}
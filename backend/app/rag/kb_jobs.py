@@ -0,0 +1,235 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+from .rag_manager import IngestCancelled
+
+
+JOB_KINDS = ("rebuild", "sync")
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+# 进度事件 -> 累加到的计数器
+_PROGRESS_COUNTERS = {
+    "file_parsed": "files_parsed",
+    "file_indexed": "files_indexed",
+    "file_removed": "files_removed",
+    "batch_committed": "batches_committed",
+}
+
+
+class JobConflict(Exception):
+    """已有知识库任务在执行"""
+
+
+class KnowledgeBaseJob:
+    """
+    知识库后台任务（全量重建或增量同步）
+
+    在后台线程中执行，进度事件按顺序保存，SSE 订阅者通过 wait_events 从任意位置开始读取。
+    """
+
+    def __init__(self, kind: str):
+        self.id = uuid4().hex[:12]
+        self.kind = kind
+        self.state = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.progress = {
+            "files_total": 0,
+            "files_parsed": 0,
+            "files_indexed": 0,
+            "files_removed": 0,
+            "chunks_embedded": 0,
+            "batches_committed": 0
+        }
+        self.cancel_event = threading.Event()
+        self._events: List[Dict[str, Any]] = []
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def report(self, event: str, data: Dict[str, Any]):
+        """
+        记录进度事件（作为 RAGManager 的进度回调）
+
+        Args:
+            event: 事件名
+            data: 事件数据
+        """
+        with self._condition:
+            if event == "files_found":
+                self.progress["files_total"] = data.get("files_total", 0)
+            elif event == "chunks_embedded":
+                self.progress["chunks_embedded"] += data.get("chunks", 0)
+            elif event in _PROGRESS_COUNTERS:
+                self.progress[_PROGRESS_COUNTERS[event]] += 1
+            self._events.append({"type": event, "job_id": self.id, **data, "progress": dict(self.progress)})
+            self._condition.notify_all()
+
+    def _set_state(self, state: str, **data):
+        with self._condition:
+            self.state = state
+        self.report(state, data)
+
+    def wait_events(self, cursor: int, timeout: float) -> Tuple[List[Dict[str, Any]], int, bool]:
+        """
+        等待 cursor 之后的新事件
+
+        Args:
+            cursor: 已读取的事件数
+            timeout: 没有新事件时最多等待的秒数
+
+        Returns:
+            (新事件列表, 新的 cursor, 任务是否已结束且事件已读完)
+        """
+        with self._condition:
+            if len(self._events) <= cursor and not self.finished:
+                self._condition.wait(timeout)
+            events = self._events[cursor:]
+            cursor += len(events)
+            return events, cursor, self.finished and cursor >= len(self._events)
+
+    def status(self) -> Dict[str, Any]:
+        """
+        获取任务状态
+
+        Returns:
+            任务ID、类型、状态、进度计数、耗时、结果和错误信息
+        """
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "progress": dict(self.progress),
+            "created_at": self.created_at,
+            "elapsed": elapsed,
+            "cancel_requested": self.cancel_event.is_set(),
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class KnowledgeBaseJobManager:
+    """知识库任务管理：同一时间只执行一个任务，保留最近的任务记录"""
+
+    def __init__(self, rag_manager_provider: Callable[[], Any], history: int = 20, sync_lock: threading.Lock = None):
+        """
+        初始化任务管理器
+
+        Args:
+            rag_manager_provider: 返回当前 RAGManager 的函数
+            history: 保留的已结束任务数
+            sync_lock: 与知识库预热共用的锁，任务执行期间持有，避免与预热（包括 off 模式的首次检索同步）同时写知识库
+        """
+        self.rag_manager_provider = rag_manager_provider
+        self.history = max(1, history)
+        self.sync_lock = sync_lock or threading.Lock()
+        self._jobs: "OrderedDict[str, KnowledgeBaseJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def active_job(self) -> Optional[KnowledgeBaseJob]:
+        """当前正在执行的任务"""
+        with self._lock:
+            return next((job for job in self._jobs.values() if not job.finished), None)
+
+    def start(self, kind: str) -> KnowledgeBaseJob:
+        """
+        启动后台任务
+
+        Args:
+            kind: rebuild（影子集合全量重建并切换）或 sync（增量同步）
+
+        Returns:
+            新任务
+
+        Raises:
+            ValueError: 任务类型不支持
+            JobConflict: 已有任务在执行
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"不支持的任务类型: {kind}，可选: {', '.join(JOB_KINDS)}")
+
+        with self._lock:
+            running = next((job for job in self._jobs.values() if not job.finished), None)
+            if running is not None:
+                raise JobConflict(f"已有任务在执行: {running.id}（{running.kind}）")
+            job = KnowledgeBaseJob(kind)
+            self._jobs[job.id] = job
+            finished = [job_id for job_id, item in self._jobs.items() if item.finished]
+            for job_id in finished[:max(0, len(finished) - self.history)]:
+                del self._jobs[job_id]
+
+        threading.Thread(target=self._run, args=(job,), name=f"kb-job-{job.id}", daemon=True).start()
+        return job
+
+    def _run(self, job: KnowledgeBaseJob):
+        # 预热正在写知识库时保持 queued，等其结束后再执行
+        with self.sync_lock:
+            self._execute(job)
+
+    def _execute(self, job: KnowledgeBaseJob):
+        job.started_at = time.time()
+        job._set_state("running", kind=job.kind)
+        try:
+            rag_manager = self.rag_manager_provider()
+            if job.kind == "rebuild":
+                job.result = rag_manager.rebuild_shadow(progress=job.report, cancel_event=job.cancel_event)
+            else:
+                job.result = rag_manager.sync_knowledge_base(progress=job.report, cancel_event=job.cancel_event)
+            job.finished_at = time.time()
+            job._set_state("completed", result=job.result)
+        except IngestCancelled:
+            print(f"知识库任务 {job.id} 已取消")
+            job.finished_at = time.time()
+            job._set_state("cancelled")
+        except Exception as e:
+            print(f"知识库任务 {job.id} 失败: {e}")
+            job.error = str(e)
+            job.finished_at = time.time()
+            job._set_state("failed", error=job.error)
+
+    def get(self, job_id: str) -> Optional[KnowledgeBaseJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """按创建时间倒序列出任务状态"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.status() for job in reversed(jobs)]
+
+    def cancel(self, job_id: str) -> Optional[KnowledgeBaseJob]:
+        """
+        请求取消任务，任务在下一个文件或批次前停止
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            对应的任务，不存在时返回 None
+        """
+        job = self._jobs.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel_event.set()
+        return job
+
+
+_job_manager = None
+
+
+def get_kb_job_manager() -> KnowledgeBaseJobManager:
+    """获取知识库任务管理器实例（单例模式）"""
+    global _job_manager
+    if _job_manager is None:
+        from ..tools.tools import get_rag_manager
+        from ..warmup import get_warmup
+        _job_manager = KnowledgeBaseJobManager(get_rag_manager, sync_lock=get_warmup().sync_lock)
+    return _job_manager
@@ -0,0 +1,258 @@
+import os
+import re
+import math
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from typing import List, Dict, Any, Iterable
+
+
+# 连续的字母数字（含下划线、连字符）作为整体词元，保留 t_orders、ABC-123 等标识符
+_WORD_PATTERN = re.compile(r"[0-9a-z_]+(?:[-.][0-9a-z_]+)*")
+_CJK_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    中文友好的分词：中文按单字和相邻双字切分，英文数字按完整词切分
+
+    Args:
+        text: 文本
+
+    Returns:
+        词元列表
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+
+    for word in _WORD_PATTERN.findall(text):
+        tokens.append(word)
+        # 复合标识符同时索引其组成部分，查询 "orders" 也能命中 "t_orders"
+        parts = [part for part in re.split(r"[-._]", word) if part]
+        if len(parts) > 1:
+            tokens.extend(parts)
+
+    for run in _CJK_PATTERN.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+
+    return tokens
+
+
+class LexicalIndex:
+    """
+    基于 SQLite 持久化的 BM25 倒排索引
+
+    与向量库使用相同的记录ID，随入库批次增量写入和删除。
+    文档长度常驻内存用于打分，倒排表按查询词从 SQLite 读取。
+    """
+
+    def __init__(self, db_path: str, k1: float = 1.5, b: float = 0.75):
+        """
+        初始化倒排索引
+
+        Args:
+            db_path: SQLite 文件路径
+            k1: BM25 词频饱和参数
+            b: BM25 文档长度归一化参数
+        """
+        self.db_path = db_path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS docs (
+                id TEXT PRIMARY KEY,
+                chunk_id TEXT,
+                source TEXT,
+                content TEXT NOT NULL,
+                length INTEGER NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id)")
+        self._conn.commit()
+
+        self._lengths: Dict[str, int] = dict(self._conn.execute("SELECT id, length FROM docs").fetchall())
+        self._total_length = sum(self._lengths.values())
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, ids: List[str], chunks: List[Dict[str, Any]]):
+        """
+        写入文档分块，已存在的ID会被覆盖
+
+        Args:
+            ids: 向量库中的记录ID列表
+            chunks: 对应的分块列表，包含 content, source, chunk_id
+        """
+        if not ids:
+            return
+
+        with self._lock:
+            self._delete_locked(ids)
+            doc_rows = []
+            posting_rows = []
+            for record_id, chunk in zip(ids, chunks):
+                counts = Counter(tokenize(chunk["content"]))
+                length = sum(counts.values())
+                doc_rows.append((record_id, chunk.get("chunk_id"), chunk.get("source"), chunk["content"], length))
+                posting_rows.extend((term, record_id, tf) for term, tf in counts.items())
+                self._lengths[record_id] = length
+                self._total_length += length
+
+            self._conn.executemany("INSERT INTO docs VALUES (?, ?, ?, ?, ?)", doc_rows)
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", posting_rows)
+            self._conn.commit()
+
+    def delete(self, ids: Iterable[str]):
+        """
+        删除文档分块
+
+        Args:
+            ids: 记录ID列表
+        """
+        with self._lock:
+            self._delete_locked(list(ids))
+            self._conn.commit()
+
+    def _delete_locked(self, ids: List[str], batch_size: int = 500):
+        existing = [record_id for record_id in ids if record_id in self._lengths]
+        for start in range(0, len(existing), batch_size):
+            batch = existing[start:start + batch_size]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", batch)
+        for record_id in existing:
+            self._total_length -= self._lengths.pop(record_id)
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.commit()
+            self._lengths = {}
+            self._total_length = 0
+
+    def drop(self):
+        """关闭连接并删除索引文件（集合被替换后调用）"""
+        with self._lock:
+            self._conn.close()
+            self._lengths = {}
+            self._total_length = 0
+            for suffix in ("", "-wal", "-shm"):
+                path = self.db_path + suffix
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def search(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+        """
+        BM25 检索
+
+        Args:
+            query: 查询文本
+            n_results: 返回结果数量
+
+        Returns:
+            结果列表，每个结果包含 id, chunk_id, content, source, score
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or n_results <= 0:
+            return []
+
+        with self._lock:
+            doc_count = len(self._lengths)
+            if doc_count == 0:
+                return []
+            avg_length = self._total_length / doc_count
+
+            placeholders = ",".join("?" * len(terms))
+            rows = self._conn.execute(
+                f"SELECT term, doc_id, tf FROM postings WHERE term IN ({placeholders})",
+                terms
+            ).fetchall()
+
+            postings: Dict[str, List[tuple]] = {}
+            for term, doc_id, tf in rows:
+                postings.setdefault(term, []).append((doc_id, tf))
+
+            scores: Dict[str, float] = {}
+            for term, docs in postings.items():
+                idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs:
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+            if not top:
+                return []
+
+            top_ids = [doc_id for doc_id, _ in top]
+            placeholders = ",".join("?" * len(top_ids))
+            docs = {
+                row[0]: row
+                for row in self._conn.execute(
+                    f"SELECT id, chunk_id, source, content FROM docs WHERE id IN ({placeholders})",
+                    top_ids
+                ).fetchall()
+            }
+
+        return [
+            {
+                "id": doc_id,
+                "chunk_id": docs[doc_id][1],
+                "source": docs[doc_id][2] or "unknown",
+                "content": docs[doc_id][3],
+                "score": score
+            }
+            for doc_id, score in top
+        ]
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Dict[str, Any]]],
+    n_results: int,
+    k: int = 60
+) -> List[Dict[str, Any]]:
+    """
+    倒数排名融合（RRF）：按 sum(1 / (k + rank)) 合并多路检索结果
+
+    Args:
+        result_lists: 多路检索结果，每个结果需包含 chunk_id（缺失时按来源和内容去重）
+        n_results: 返回结果数量
+        k: 平滑常数
+
+    Returns:
+        融合后的结果列表，保留各路结果中的字段，并附加 score
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    scores: Dict[Any, float] = {}
+
+    for results in result_lists:
+        for rank, result in enumerate(results, 1):
+            key = result.get("chunk_id") or (result.get("source"), result.get("content"))
+            merged = fused.setdefault(key, {})
+            for field, value in result.items():
+                merged.setdefault(field, value)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:n_results]
+    return [dict(fused[key], score=scores[key]) for key in ranked]
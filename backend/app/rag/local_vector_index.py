@@ -0,0 +1,399 @@
+import os
+import json
+import threading
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+
+class LocalVectorIndex:
+    """
+    基于内存映射 NumPy 矩阵的本地向量索引
+
+    数据按段（segment）存放在一个目录中，每段包含:
+    - <段号>.f32: 归一化后的 float32 向量矩阵（原始精度，用于重排序）
+    - <段号>.q: 量化后的向量矩阵（float16 或 int8，dtype 为 float32 时不单独存放）
+    - <段号>.scale: int8 量化时每行的缩放系数
+    - <段号>.rec / <段号>.off: 分块文本与元数据（JSON 记录）及每条记录的结束偏移
+    - state.json: 维度、量化类型、行数、当前段号和已删除行
+
+    打开索引只需读取 state.json 并映射文件，无需反序列化；写入以追加方式进行，
+    删除为逻辑删除，已删除行过多时重写为新段。
+    """
+
+    STATE_FILE = "state.json"
+
+    def __init__(
+        self,
+        directory: str,
+        dtype: str = "float32",
+        rescore_factor: int = 4,
+        compact_ratio: float = 0.25
+    ):
+        """
+        初始化本地向量索引
+
+        Args:
+            directory: 索引目录
+            dtype: 量化类型，float32 / float16 / int8（仅对新建索引生效）
+            rescore_factor: 量化时先取 top-k 的多少倍候选，再用 float32 精确重排序
+            compact_ratio: 已删除行占比超过该值时压缩重写
+        """
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"不支持的量化类型: {dtype}")
+
+        self.directory = directory
+        self.rescore_factor = max(1, rescore_factor)
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._id_to_row: Optional[Dict[str, int]] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_state(dtype)
+
+    # ---------- 状态与文件 ----------
+
+    def _path(self, suffix: str, segment: int = None) -> str:
+        segment = self.segment if segment is None else segment
+        return os.path.join(self.directory, f"{segment}.{suffix}")
+
+    def _load_state(self, default_dtype: str):
+        state_path = os.path.join(self.directory, self.STATE_FILE)
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        else:
+            state = {"dim": None, "dtype": default_dtype, "count": 0, "segment": 0, "deleted": []}
+
+        self.dim: Optional[int] = state["dim"]
+        self.dtype: str = state["dtype"]
+        self.count: int = state["count"]
+        self.segment: int = state["segment"]
+        self._deleted = set(state["deleted"])
+        self._truncate_to_count()
+        self._remap()
+
+    def _save_state(self):
+        state_path = os.path.join(self.directory, self.STATE_FILE)
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self.dim,
+                "dtype": self.dtype,
+                "count": self.count,
+                "segment": self.segment,
+                "deleted": sorted(self._deleted)
+            }, f)
+        os.replace(tmp_path, state_path)
+
+    def _file_specs(self) -> List[tuple]:
+        """返回 (后缀, 每行字节数) 列表，用于截断中断写入留下的多余数据"""
+        if self.dim is None:
+            return [("off", 8)]
+        specs = [("f32", self.dim * 4), ("off", 8)]
+        if self.dtype == "float16":
+            specs.append(("q", self.dim * 2))
+        elif self.dtype == "int8":
+            specs.extend([("q", self.dim), ("scale", 4)])
+        return specs
+
+    def _truncate_to_count(self):
+        """截断上次写入中断后超出 state.json 行数的数据"""
+        for suffix, row_bytes in self._file_specs():
+            path = self._path(suffix)
+            if os.path.exists(path) and os.path.getsize(path) > self.count * row_bytes:
+                with open(path, "r+b") as f:
+                    f.truncate(self.count * row_bytes)
+
+        rec_path = self._path("rec")
+        if os.path.exists(rec_path):
+            end = int(self._read_offsets()[-1]) if self.count else 0
+            if os.path.getsize(rec_path) > end:
+                with open(rec_path, "r+b") as f:
+                    f.truncate(end)
+
+    def _read_offsets(self) -> np.ndarray:
+        return np.fromfile(self._path("off"), dtype=np.int64, count=self.count)
+
+    def _remap(self):
+        """重新映射当前段的文件"""
+        self._vectors = None
+        self._quantized = None
+        self._scales = None
+        self._offsets = None
+        self._records = None
+        self._deleted_mask = np.zeros(self.count, dtype=bool)
+        if self._deleted:
+            self._deleted_mask[list(self._deleted)] = True
+
+        if self.count == 0:
+            return
+
+        shape = (self.count, self.dim)
+        self._vectors = np.memmap(self._path("f32"), dtype=np.float32, mode="r", shape=shape)
+        if self.dtype == "float16":
+            self._quantized = np.memmap(self._path("q"), dtype=np.float16, mode="r", shape=shape)
+        elif self.dtype == "int8":
+            self._quantized = np.memmap(self._path("q"), dtype=np.int8, mode="r", shape=shape)
+            self._scales = np.memmap(self._path("scale"), dtype=np.float32, mode="r", shape=(self.count,))
+        else:
+            self._quantized = self._vectors
+        self._offsets = np.memmap(self._path("off"), dtype=np.int64, mode="r", shape=(self.count,))
+        self._records = np.memmap(self._path("rec"), dtype=np.uint8, mode="r")
+
+    # ---------- 写入 ----------
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _ensure_id_map(self) -> Dict[str, int]:
+        """按需构建 id -> 行号 映射（只在写入和删除时需要）"""
+        if self._id_to_row is None:
+            self._id_to_row = {}
+            for row in range(self.count):
+                if row not in self._deleted:
+                    self._id_to_row[self._read_record(row)["id"]] = row
+        return self._id_to_row
+
+    def add(
+        self,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]]
+    ):
+        """
+        追加向量和记录，已存在的 id 会被覆盖
+
+        Args:
+            ids: 记录ID列表
+            documents: 文本列表
+            embeddings: 向量列表
+            metadatas: 元数据列表
+        """
+        if not ids:
+            return
+
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度不一致: 期望 {self.dim}，实际 {vectors.shape[1]}")
+
+            id_map = self._ensure_id_map()
+            for record_id in ids:
+                if record_id in id_map:
+                    self._deleted.add(id_map.pop(record_id))
+
+            records = [
+                json.dumps({"id": i, "document": d, "metadata": m}, ensure_ascii=False).encode("utf-8")
+                for i, d, m in zip(ids, documents, metadatas)
+            ]
+            base = int(self._offsets[-1]) if self.count else 0
+            offsets = base + np.cumsum([len(r) for r in records], dtype=np.int64)
+
+            with open(self._path("f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            if self.dtype == "float16":
+                with open(self._path("q"), "ab") as f:
+                    f.write(vectors.astype(np.float16).tobytes())
+            elif self.dtype == "int8":
+                scales = np.abs(vectors).max(axis=1) / 127.0
+                scales[scales == 0] = 1.0
+                quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+                with open(self._path("q"), "ab") as f:
+                    f.write(quantized.tobytes())
+                with open(self._path("scale"), "ab") as f:
+                    f.write(scales.astype(np.float32).tobytes())
+            with open(self._path("rec"), "ab") as f:
+                f.write(b"".join(records))
+            with open(self._path("off"), "ab") as f:
+                f.write(offsets.tobytes())
+
+            for offset, record_id in enumerate(ids):
+                id_map[record_id] = self.count + offset
+            self.count += len(ids)
+            self._save_state()
+            self._remap()
+            self._maybe_compact()
+
+    def delete(self, ids: List[str]):
+        """
+        逻辑删除记录
+
+        Args:
+            ids: 记录ID列表
+        """
+        with self._lock:
+            id_map = self._ensure_id_map()
+            for record_id in ids:
+                row = id_map.pop(record_id, None)
+                if row is not None:
+                    self._deleted.add(row)
+            self._save_state()
+            self._remap()
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self.count and len(self._deleted) / self.count > self.compact_ratio:
+            self.compact()
+
+    def compact(self):
+        """将未删除的行重写到新段，并清理旧段文件"""
+        with self._lock:
+            keep = np.flatnonzero(~self._deleted_mask)
+            old_segment = self.segment
+            new_segment = old_segment + 1
+
+            def write(suffix: str, data: np.ndarray):
+                with open(self._path(suffix, new_segment), "wb") as f:
+                    f.write(np.ascontiguousarray(data).tobytes())
+
+            records = [self._read_record_bytes(row) for row in keep]
+            if len(keep):
+                write("f32", self._vectors[keep])
+                if self.dtype in ("float16", "int8"):
+                    write("q", self._quantized[keep])
+                if self.dtype == "int8":
+                    write("scale", self._scales[keep])
+                write("off", np.cumsum([len(r) for r in records], dtype=np.int64))
+            else:
+                write("off", np.zeros(0, dtype=np.int64))
+            with open(self._path("rec", new_segment), "wb") as f:
+                f.write(b"".join(records))
+
+            self.segment = new_segment
+            self.count = len(keep)
+            self._deleted = set()
+            self._id_to_row = None
+            if self.count == 0:
+                self.dim = None
+            self._save_state()
+            self._remap()
+            self._remove_segment(old_segment)
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            old_segment = self.segment
+            self.segment += 1
+            self.count = 0
+            self.dim = None
+            self._deleted = set()
+            self._id_to_row = {}
+            self._save_state()
+            self._remap()
+            self._remove_segment(old_segment)
+
+    def _remove_segment(self, segment: int):
+        """删除旧段文件；文件仍被占用（如 Windows 上的映射）时留待下次清理"""
+        for suffix in ("f32", "q", "scale", "rec", "off"):
+            path = self._path(suffix, segment)
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                pass
+
+    # ---------- 读取 ----------
+
+    def __len__(self) -> int:
+        return self.count - len(self._deleted)
+
+    def _read_record_bytes(self, row: int, offsets: np.ndarray = None, records: np.ndarray = None) -> bytes:
+        offsets = self._offsets if offsets is None else offsets
+        records = self._records if records is None else records
+        start = int(offsets[row - 1]) if row > 0 else 0
+        end = int(offsets[row])
+        return bytes(records[start:end])
+
+    def _read_record(self, row: int, offsets: np.ndarray = None, records: np.ndarray = None) -> Dict[str, Any]:
+        return json.loads(self._read_record_bytes(row, offsets, records).decode("utf-8"))
+
+    def iter_records(self):
+        """
+        遍历所有未删除的记录
+
+        Yields:
+            包含 id, document, metadata 的记录字典
+        """
+        with self._lock:
+            count, deleted = self.count, set(self._deleted)
+            offsets, records = self._offsets, self._records
+        for row in range(count):
+            if row not in deleted:
+                yield self._read_record(row, offsets, records)
+
+    def search(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        block_size: int = 65536
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量余弦相似度 top-k 搜索
+
+        Args:
+            query_embeddings: 查询向量列表
+            n_results: 每个查询返回的结果数量
+            block_size: 分块计算相似度的行数，避免量化矩阵一次性转换占用大量内存
+
+        Returns:
+            每个查询的结果列表，结果包含 id, document, metadata, distance（1 - 余弦相似度）
+        """
+        with self._lock:
+            count = self.count
+            vectors, quantized, scales = self._vectors, self._quantized, self._scales
+            offsets, records = self._offsets, self._records
+            deleted_mask = self._deleted_mask
+            live = count - len(self._deleted)
+
+        if not query_embeddings:
+            return []
+        if live == 0 or n_results <= 0:
+            return [[] for _ in query_embeddings]
+
+        queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+        scores = np.empty((count, len(queries)), dtype=np.float32)
+        for start in range(0, count, block_size):
+            block = np.asarray(quantized[start:start + block_size], dtype=np.float32)
+            block_scores = block @ queries.T
+            if scales is not None:
+                block_scores *= np.asarray(scales[start:start + block_size])[:, None]
+            scores[start:start + block_size] = block_scores
+        scores[deleted_mask] = -np.inf
+
+        k = min(n_results, live)
+        rescore = quantized is not vectors
+        candidates_k = min(live, k * self.rescore_factor) if rescore else k
+
+        all_results = []
+        for q in range(len(queries)):
+            column = scores[:, q]
+            candidates = np.argpartition(-column, candidates_k - 1)[:candidates_k]
+            if rescore:
+                # 量化分数只用于粗筛，候选行用 float32 原始向量精确计算
+                candidates = np.sort(candidates)
+                exact = np.asarray(vectors[candidates], dtype=np.float32) @ queries[q]
+                order = np.argsort(-exact)[:k]
+                rows, sims = candidates[order], exact[order]
+            else:
+                order = np.argsort(-column[candidates])
+                rows, sims = candidates[order], column[candidates][order]
+
+            results = []
+            for row, sim in zip(rows, sims):
+                record = self._read_record(int(row), offsets, records)
+                results.append({
+                    "id": record["id"],
+                    "document": record["document"],
+                    "metadata": record["metadata"],
+                    "distance": float(1.0 - sim)
+                })
+            all_results.append(results)
+
+        return all_results
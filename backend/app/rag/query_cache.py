@@ -0,0 +1,143 @@
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """
+    规范化查询文本：全角转半角、转小写、合并空白
+
+    Args:
+        query: 原始查询文本
+
+    Returns:
+        规范化后的查询文本
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+class QueryResultCache:
+    """
+    检索结果缓存，按规范化查询、结果数量和检索模式缓存 RAGManager.search 的结果
+
+    每个条目记录写入时向量库的版本号（generation），向量库发生变更后版本号递增，
+    旧条目在读取时即视为失效；同时按 TTL 过期、按 LRU 淘汰。
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        """
+        初始化检索结果缓存
+
+        Args:
+            max_entries: 最大条目数，为0时禁用缓存
+            ttl: 条目有效期（秒）
+        """
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        # key -> (generation, 写入时间, 原始检索耗时, 结果)
+        self._entries: "OrderedDict[Tuple[str, int, str], Tuple[int, float, float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    def get(
+        self,
+        query: str,
+        n_results: int,
+        generation: int,
+        mode: str = "vector"
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        查询缓存
+
+        Args:
+            query: 查询文本
+            n_results: 结果数量
+            generation: 当前向量库版本号
+            mode: 检索模式
+
+        Returns:
+            缓存的结果副本，未命中时返回 None
+        """
+        if self.max_entries == 0:
+            return None
+
+        key = (normalize_query(query), n_results, mode)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entry_generation, stored_at, elapsed, results = entry
+            if entry_generation != generation or time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += elapsed
+            return [dict(result) for result in results]
+
+    def put(
+        self,
+        query: str,
+        n_results: int,
+        generation: int,
+        results: List[Dict[str, Any]],
+        elapsed: float,
+        mode: str = "vector"
+    ):
+        """
+        写入缓存
+
+        Args:
+            query: 查询文本
+            n_results: 结果数量
+            generation: 检索时的向量库版本号
+            results: 检索结果
+            elapsed: 本次检索耗时（秒），用于统计缓存节省的时间
+            mode: 检索模式
+        """
+        if self.max_entries == 0:
+            return
+
+        key = (normalize_query(query), n_results, mode)
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic(), elapsed, [dict(result) for result in results])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            命中率、节省的检索耗时等统计
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "saved_seconds": round(self.saved_seconds, 3)
+            }
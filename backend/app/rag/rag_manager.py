@@ -1,8 +1,27 @@
-from typing import List, Dict, Any
+import os
+import json
+import time
+import asyncio
+import threading
+from typing import List, Dict, Any, Callable, Optional
 from .document_loader import DocumentLoader
 from .text_splitter import TextSplitter
 from .embedding_service import EmbeddingService
-from .vector_store import VectorStore
+from .vector_store import VectorStore, VECTOR_STORE_TYPE
+from .index_manifest import IndexManifest
+from .query_cache import QueryResultCache
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion
+from ..monitoring.tracing import trace_step
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+BASE_COLLECTION = "knowledge_base"
+
+# 入库进度回调：(事件名, 事件数据)
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+
+class IngestCancelled(Exception):
+    """入库任务被取消"""
 
 
 class RAGManager:
@@ -14,7 +33,12 @@ class RAGManager:
         persist_directory: str = None,
         embedding_model: str = None,
         chunk_size: int = 800,
-        chunk_overlap: int = 150
+        chunk_overlap: int = 150,
+        manifest_path: str = None,
+        loader_workers: int = None,
+        embed_batch_size: int = 64,
+        collection_name: str = None,
+        embedding_service: EmbeddingService = None
     ):
         """
         初始化RAG管理器
@@ -25,20 +49,108 @@ class RAGManager:
             embedding_model: 嵌入模型名称
             chunk_size: 分块大小
             chunk_overlap: 分块重叠大小
+            manifest_path: 索引清单路径，默认为 data/<集合名>_manifest.json
+            loader_workers: 解析PDF的进程数，默认读取环境变量 PDF_LOADER_WORKERS
+            embed_batch_size: 入库时每批嵌入并提交的分块数量
+            collection_name: 集合名称，默认使用上次重建切换后记录的当前集合
+            embedding_service: 复用已有的嵌入服务（影子集合重建时共享）
         """
-        self.document_loader = DocumentLoader(resources_dir)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.document_loader = DocumentLoader(resources_dir, max_workers=loader_workers)
         self.text_splitter = TextSplitter(chunk_size, chunk_overlap)
-        self.embedding_service = EmbeddingService(model=embedding_model)
+        self.embedding_service = embedding_service or EmbeddingService(model=embedding_model)
+        
+        data_dir = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+            "data"
+        )
+        # 当前集合指针：影子集合重建完成后记录新集合名，重启后继续使用
+        self._active_collection_path = os.path.join(persist_directory or data_dir, f"{BASE_COLLECTION}_active.json")
+        if collection_name is None:
+            collection_name = self._read_active_collection()
+        
         # 将 embedding_service 的 embeddings 实例传递给 VectorStore，确保使用相同的配置
-        self.vector_store = VectorStore(persist_directory, embeddings=self.embedding_service.embeddings)
+        self.vector_store = VectorStore(
+            persist_directory,
+            collection_name=collection_name,
+            embeddings=self.embedding_service.embeddings
+        )
+        
+        if manifest_path is None:
+            manifest_path = os.path.join(data_dir, f"{self.vector_store.collection_name}_manifest.json")
+        self.manifest = IndexManifest(manifest_path)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.query_cache = QueryResultCache(
+            max_entries=int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("RAG_QUERY_CACHE_TTL", "300"))
+        )
+        
+        # BM25 倒排索引与向量数据放在同一目录，随入库批次同步更新
+        lexical_dir = self.vector_store.persist_directory or data_dir
+        self.lexical_index = LexicalIndex(
+            os.path.join(lexical_dir, f"{self.vector_store.collection_name}_bm25.sqlite3")
+        )
+        self.search_mode = os.getenv("RAG_SEARCH_MODE", "hybrid").lower()
+        if self.search_mode not in SEARCH_MODES:
+            raise ValueError(f"不支持的检索模式: {self.search_mode}")
+        # 混合检索时每一路先取 n_results 的多少倍候选再融合
+        self.hybrid_candidate_factor = int(os.getenv("RAG_HYBRID_CANDIDATE_FACTOR", "4"))
+        # 切换集合后旧集合保留的秒数，等待正在进行的检索结束
+        self.retire_delay = float(os.getenv("KB_RETIRE_DELAY", "30"))
+    
+    def _read_active_collection(self) -> str:
+        try:
+            with open(self._active_collection_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("collection_name") or BASE_COLLECTION
+        except FileNotFoundError:
+            return BASE_COLLECTION
+        except Exception as e:
+            print(f"读取当前集合记录失败，使用默认集合: {e}")
+            return BASE_COLLECTION
+    
+    def _write_active_collection(self, collection_name: str):
+        directory = os.path.dirname(self._active_collection_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self._active_collection_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"collection_name": collection_name, "switched_at": time.time()}, f)
+        os.replace(tmp_path, self._active_collection_path)
     
-    def initialize_knowledge_base(self, force_rebuild: bool = False):
+    @staticmethod
+    def _report(progress: Optional[ProgressCallback], event: str, **data):
+        if progress is not None:
+            progress(event, data)
+    
+    @staticmethod
+    def _check_cancelled(cancel_event: Optional[threading.Event]):
+        if cancel_event is not None and cancel_event.is_set():
+            raise IngestCancelled("入库任务已取消")
+    
+    def initialize_knowledge_base(
+        self,
+        force_rebuild: bool = False,
+        incremental: bool = False,
+        progress: ProgressCallback = None,
+        cancel_event: threading.Event = None
+    ):
         """
         初始化知识库，加载文档并构建向量索引
         
         Args:
             force_rebuild: 是否强制重建向量库
+            incremental: 是否使用增量同步（仅处理新增、修改和删除的文件）
+            progress: 入库进度回调
+            cancel_event: 置位后在下一个文件或批次前抛出 IngestCancelled
         """
+        if not force_rebuild:
+            self._ensure_lexical_index()
+        
+        if not force_rebuild and (incremental or self.manifest.incomplete_files()):
+            self.sync_knowledge_base(progress, cancel_event)
+            return
+        
         collection_count = self.vector_store.get_collection_count()
         
         if collection_count > 0 and not force_rebuild:
@@ -48,40 +160,416 @@ class RAGManager:
         if force_rebuild:
             print("强制重建向量库...")
             self.vector_store.clear_collection()
+            self.lexical_index.clear()
+            self.manifest.clear()
+            self.manifest.save()
         
         print("开始初始化知识库...")
         
-        documents = self.document_loader.load_all_pdfs()
+        filenames = self.document_loader.list_pdfs()
         
-        if not documents:
+        if not filenames:
             print("未找到任何PDF文档")
             return
         
-        chunks = self.text_splitter.split_documents(documents)
-        print(f"文档分块完成，共 {len(chunks)} 个分块")
+        self._report(progress, "files_found", files_total=len(filenames))
+        committed = self._ingest([self._build_job(filename) for filename in filenames], progress, cancel_event)
+        print(f"知识库初始化完成，共 {sum(committed.values())} 个分块")
+    
+    def rebuild_shadow(
+        self,
+        progress: ProgressCallback = None,
+        cancel_event: threading.Event = None
+    ) -> Dict[str, Any]:
+        """
+        在影子集合中全量重建知识库，完成后切换为当前集合；重建期间检索继续使用旧集合。
+        旧集合在 retire_delay 秒后删除。Supabase 的表需要手动创建，改为原地重建。
         
-        texts = [chunk["content"] for chunk in chunks]
-        print("开始生成嵌入向量...")
+        Args:
+            progress: 入库进度回调
+            cancel_event: 置位后停止重建并删除影子集合
+            
+        Returns:
+            重建结果，包含新旧集合名称和分块数量
+        """
+        previous_name = self.vector_store.collection_name
+        if VECTOR_STORE_TYPE == "supabase":
+            print("Supabase 不支持自动创建影子集合，执行原地重建")
+            self.initialize_knowledge_base(force_rebuild=True, progress=progress, cancel_event=cancel_event)
+            self.query_cache.clear()
+            return {
+                "collection_name": previous_name,
+                "previous_collection": previous_name,
+                "in_place": True,
+                "document_count": self.vector_store.get_collection_count()
+            }
         
-        embeddings = self.embedding_service.embed_documents(texts)
-        print("嵌入向量生成完成")
+        shadow_name = f"{BASE_COLLECTION}_{time.strftime('%Y%m%d%H%M%S')}"
+        shadow = RAGManager(
+            resources_dir=self.document_loader.resources_dir,
+            persist_directory=self.vector_store.persist_directory,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            manifest_path=os.path.join(os.path.dirname(self.manifest.manifest_path), f"{shadow_name}_manifest.json"),
+            loader_workers=self.document_loader.max_workers,
+            embed_batch_size=self.embed_batch_size,
+            collection_name=shadow_name,
+            embedding_service=self.embedding_service
+        )
+        self._report(progress, "shadow_created", collection_name=shadow_name)
+        print(f"开始在影子集合 {shadow_name} 中重建知识库...")
+        try:
+            shadow.initialize_knowledge_base(force_rebuild=True, progress=progress, cancel_event=cancel_event)
+            self._check_cancelled(cancel_event)
+        except BaseException:
+            shadow._drop_index(shadow.vector_store, shadow.lexical_index, shadow.manifest)
+            raise
         
-        self.vector_store.add_documents(chunks, embeddings)
-        print("知识库初始化完成")
+        document_count = shadow.vector_store.get_collection_count()
+        self._swap(shadow)
+        self._report(progress, "swapped", collection_name=shadow_name, previous_collection=previous_name)
+        print(f"已切换到新集合 {shadow_name}，共 {document_count} 个分块")
+        return {
+            "collection_name": shadow_name,
+            "previous_collection": previous_name,
+            "in_place": False,
+            "document_count": document_count
+        }
+    
+    def _swap(self, shadow: "RAGManager"):
+        """用影子集合替换当前集合，旧集合延迟删除"""
+        previous = (self.vector_store, self.lexical_index, self.manifest)
+        # 版本号在旧集合基础上继续递增，依赖它的查询缓存、工具缓存和回答缓存随切换失效
+        shadow.vector_store.generation += self.vector_store.generation + 1
+        # 分块ID在新旧集合中一致，切换瞬间的查询即使混用两路结果也不会出错
+        self.vector_store = shadow.vector_store
+        self.lexical_index = shadow.lexical_index
+        self.manifest = shadow.manifest
+        self.query_cache.clear()
+        self._write_active_collection(shadow.vector_store.collection_name)
+        
+        timer = threading.Timer(self.retire_delay, self._drop_index, args=previous)
+        timer.daemon = True
+        timer.start()
+    
+    @staticmethod
+    def _drop_index(vector_store: VectorStore, lexical_index: LexicalIndex, manifest: IndexManifest):
+        """删除不再使用的集合及其词法索引和清单"""
+        name = vector_store.collection_name
+        try:
+            vector_store.drop_collection()
+            lexical_index.drop()
+            if manifest.exists():
+                os.remove(manifest.manifest_path)
+            print(f"已删除旧集合 {name}")
+        except Exception as e:
+            print(f"删除旧集合 {name} 失败: {e}")
+    
+    def sync_knowledge_base(
+        self,
+        progress: ProgressCallback = None,
+        cancel_event: threading.Event = None
+    ) -> Dict[str, Any]:
+        """
+        增量同步知识库：根据索引清单只嵌入新增或修改的文件，删除已移除文件的分块，
+        并从上次中断处继续未完成的文件
+        
+        Args:
+            progress: 入库进度回调
+            cancel_event: 置位后在下一个文件或批次前抛出 IngestCancelled，已提交的批次保留，下次同步继续
+        
+        Returns:
+            同步结果统计，包含 added, updated, resumed, removed, unchanged
+        """
+        stats = {"added": [], "updated": [], "resumed": [], "removed": [], "unchanged": 0}
+        
+        if not self.manifest.files and self.vector_store.get_collection_count() > 0:
+            # 旧版本构建的向量库没有清单，无法定位各文件的分块，只能全量重建一次
+            print("向量库缺少索引清单，执行一次全量重建以生成清单...")
+            self.initialize_knowledge_base(force_rebuild=True)
+            stats["added"] = list(self.manifest.files)
+            return stats
+        
+        print("开始增量同步知识库...")
+        current_files = self.document_loader.list_pdfs()
+        
+        for filename in sorted(set(self.manifest.files) - set(current_files)):
+            entry = self.manifest.get(filename)
+            self._delete_file_chunks(filename, entry.get("chunk_ids", []))
+            self.manifest.remove(filename)
+            self.manifest.save()
+            stats["removed"].append(filename)
+            self._report(progress, "file_removed", filename=filename)
+            print(f"已移除文件的分块: {filename}")
+        
+        pending = []
+        for filename in current_files:
+            file_path = os.path.join(self.document_loader.resources_dir, filename)
+            stat = os.stat(file_path)
+            entry = self.manifest.get(filename)
+            complete = entry is not None and entry.get("complete", True)
+            
+            # mtime 和大小都未变化时直接跳过，避免重复计算哈希
+            if complete and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                stats["unchanged"] += 1
+                continue
+            
+            file_hash = IndexManifest.compute_file_hash(file_path)
+            if entry and entry["hash"] == file_hash:
+                if complete:
+                    self.manifest.update(filename, file_hash, stat.st_mtime, stat.st_size, entry["chunk_ids"])
+                    self.manifest.save()
+                    stats["unchanged"] += 1
+                else:
+                    # 内容未变但上次入库中断：保留已提交的分块，从下一个分块继续
+                    pending.append(self._build_job(
+                        filename, file_hash, stat,
+                        kind="resumed", kept_ids=entry["chunk_ids"]
+                    ))
+                continue
+            
+            pending.append(self._build_job(
+                filename, file_hash, stat,
+                kind="updated" if entry else "added",
+                stale_ids=entry["chunk_ids"] if entry else []
+            ))
+        
+        self._report(progress, "files_found", files_total=len(pending), unchanged=stats["unchanged"])
+        committed = self._ingest(pending, progress, cancel_event)
+        
+        for job in pending:
+            if job["filename"] in committed:
+                stats[job["kind"]].append(job["filename"])
+        
+        print(
+            f"增量同步完成: 新增 {len(stats['added'])}，更新 {len(stats['updated'])}，"
+            f"续传 {len(stats['resumed'])}，删除 {len(stats['removed'])}，未变化 {stats['unchanged']}"
+        )
+        return stats
     
-    def search(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+    def _build_job(
+        self,
+        filename: str,
+        file_hash: str = None,
+        stat: os.stat_result = None,
+        kind: str = "added",
+        kept_ids: List[str] = None,
+        stale_ids: List[str] = None
+    ) -> Dict[str, Any]:
+        """
+        构建单个文件的入库任务
+        
+        Args:
+            filename: 文件名
+            file_hash: 文件内容哈希，未提供时现场计算
+            stat: 文件状态，未提供时现场读取
+            kind: 任务类型（added/updated/resumed），用于同步统计
+            kept_ids: 上次中断前已提交、需要保留的分块ID
+            stale_ids: 文件内容变化后需要删除的旧分块ID
+            
+        Returns:
+            入库任务字典
+        """
+        file_path = os.path.join(self.document_loader.resources_dir, filename)
+        if stat is None:
+            stat = os.stat(file_path)
+        if file_hash is None:
+            file_hash = IndexManifest.compute_file_hash(file_path)
+        
+        return {
+            "filename": filename,
+            "hash": file_hash,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "kind": kind,
+            "kept_ids": list(kept_ids or []),
+            "stale_ids": list(stale_ids or [])
+        }
+    
+    def _ingest(
+        self,
+        jobs: List[Dict[str, Any]],
+        progress: ProgressCallback = None,
+        cancel_event: threading.Event = None
+    ) -> Dict[str, int]:
+        """
+        流式入库：逐个加载文档、逐块分割，按 embed_batch_size 批量嵌入并立即提交到向量库。
+        内存占用只与单个文档和批次大小相关；每批提交后都会保存索引清单，
+        进程中断后下次同步会跳过已提交的分块继续入库。
+        
+        Args:
+            jobs: _build_job 构建的入库任务列表
+            progress: 入库进度回调（file_parsed / chunks_embedded / batch_committed / file_indexed）
+            cancel_event: 置位后在下一个文件或批次前抛出 IngestCancelled
+            
+        Returns:
+            文件名到该文件已提交分块总数的映射（加载失败的文件不包含在内）
+        """
+        jobs_by_name = {job["filename"]: job for job in jobs}
+        committed: Dict[str, int] = {}
+        batch: List[Dict[str, Any]] = []
+        # 分块已全部进入批次、等待本批提交后即可标记完成的文件
+        awaiting: List[str] = []
+        batch_count = 0
+        
+        def commit_batch():
+            nonlocal batch_count
+            if batch:
+                self._check_cancelled(cancel_event)
+                embeddings = self.embedding_service.embed_documents([chunk["content"] for chunk in batch])
+                self._report(progress, "chunks_embedded", chunks=len(batch))
+                ids = self.vector_store.add_documents(batch, embeddings)
+                self.lexical_index.add(ids, batch)
+                for chunk, record_id in zip(batch, ids):
+                    self.manifest.append_chunk_ids(chunk["source"], [record_id])
+                    committed[chunk["source"]] += 1
+                batch_count += 1
+                self._report(progress, "batch_committed", batch=batch_count, chunks=len(batch))
+                print(f"已提交第 {batch_count} 批，共 {len(batch)} 个分块")
+            for filename in awaiting:
+                self.manifest.mark_complete(filename)
+                self._report(progress, "file_indexed", filename=filename, chunks=committed[filename])
+            self.manifest.save()
+            batch.clear()
+            awaiting.clear()
+        
+        for filename, content in self.document_loader.iter_pdfs(list(jobs_by_name)):
+            self._check_cancelled(cancel_event)
+            job = jobs_by_name[filename]
+            self._report(progress, "file_parsed", filename=filename, chars=len(content))
+            
+            # 文件加载成功后再删除旧分块，加载失败时旧索引保持可用
+            if job["stale_ids"]:
+                self._delete_file_chunks(filename, job["stale_ids"])
+            self.manifest.update(
+                filename, job["hash"], job["mtime"], job["size"],
+                job["kept_ids"], complete=False
+            )
+            self.manifest.save()
+            
+            resume_from = len(job["kept_ids"])
+            committed[filename] = resume_from
+            for idx, chunk in enumerate(self.text_splitter.iter_chunks([(filename, content)])):
+                if idx < resume_from:
+                    continue
+                batch.append(chunk)
+                if len(batch) >= self.embed_batch_size:
+                    commit_batch()
+            
+            awaiting.append(filename)
+            if not batch:
+                commit_batch()
+        
+        commit_batch()
+        return committed
+    
+    def _delete_file_chunks(self, filename: str, ids: List[str]):
+        """删除文件的全部分块：向量库按来源一次删除（清单未记录的残留分块也会删除），词法索引按ID删除"""
+        self.vector_store.delete_by_source([filename])
+        self.lexical_index.delete(ids)
+    
+    def _ensure_lexical_index(self):
+        """词法索引为空而向量库已有数据时（如升级前构建的向量库），从向量库回填"""
+        if len(self.lexical_index) > 0 or self.vector_store.get_collection_count() == 0:
+            return
+        
+        print("词法索引为空，从向量库回填...")
+        total = 0
+        for batch in self.vector_store.iter_documents():
+            self.lexical_index.add([chunk["id"] for chunk in batch], batch)
+            total += len(batch)
+        self.query_cache.clear()
+        print(f"词法索引回填完成，共 {total} 个分块")
+    
+    def _resolve_mode(self, mode: str = None) -> str:
+        mode = (mode or self.search_mode).lower()
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"不支持的检索模式: {mode}，可选: {', '.join(SEARCH_MODES)}")
+        return mode
+    
+    def _fuse(
+        self,
+        mode: str,
+        n_results: int,
+        vector_results: List[Dict[str, Any]],
+        lexical_results: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        if mode == "vector":
+            return vector_results
+        if mode == "lexical":
+            return lexical_results
+        return reciprocal_rank_fusion([vector_results, lexical_results], n_results)
+    
+    def search(self, query: str, n_results: int = 5, mode: str = None) -> List[Dict[str, Any]]:
         """
         搜索知识库
         
         Args:
             query: 查询文本
             n_results: 返回结果数量
+            mode: 检索模式，vector（向量）/ lexical（BM25）/ hybrid（RRF 融合），默认读取 RAG_SEARCH_MODE
+            
+        Returns:
+            搜索结果列表
+        """
+        mode = self._resolve_mode(mode)
+        generation = self.vector_store.generation
+        cached = self.query_cache.get(query, n_results, generation, mode)
+        if cached is not None:
+            return cached
+        
+        start = time.perf_counter()
+        candidates = n_results * self.hybrid_candidate_factor if mode == "hybrid" else n_results
+        vector_results, lexical_results = [], []
+        if mode != "lexical":
+            query_embedding = self.embedding_service.embed_query(query)
+            vector_results = self.vector_store.search(query_embedding, candidates)
+        if mode != "vector":
+            lexical_results = self.lexical_index.search(query, candidates)
+        results = self._fuse(mode, n_results, vector_results, lexical_results)
+        
+        self.query_cache.put(query, n_results, generation, results, time.perf_counter() - start, mode)
+        return results
+    
+    async def asearch(self, query: str, n_results: int = 5, mode: str = None) -> List[Dict[str, Any]]:
+        """
+        异步搜索知识库，不阻塞事件循环
+        
+        Args:
+            query: 查询文本
+            n_results: 返回结果数量
+            mode: 检索模式，同 search
             
         Returns:
             搜索结果列表
         """
-        query_embedding = self.embedding_service.embed_query(query)
-        results = self.vector_store.search(query_embedding, n_results)
+        mode = self._resolve_mode(mode)
+        generation = self.vector_store.generation
+        cached = self.query_cache.get(query, n_results, generation, mode)
+        if cached is not None:
+            return cached
+        
+        start = time.perf_counter()
+        candidates = n_results * self.hybrid_candidate_factor if mode == "hybrid" else n_results
+        
+        async def vector_search():
+            if mode == "lexical":
+                return []
+            async with trace_step("embed_query"):
+                query_embedding = await self.embedding_service.aembed_query(query)
+            async with trace_step("vector_search", n_results=candidates):
+                return await self.vector_store.asearch(query_embedding, candidates)
+        
+        async def lexical_search():
+            if mode == "vector":
+                return []
+            async with trace_step("lexical_search", n_results=candidates):
+                return await asyncio.to_thread(self.lexical_index.search, query, candidates)
+        
+        vector_results, lexical_results = await asyncio.gather(vector_search(), lexical_search())
+        results = self._fuse(mode, n_results, vector_results, lexical_results)
+        
+        self.query_cache.put(query, n_results, generation, results, time.perf_counter() - start, mode)
         return results
     
     def get_knowledge_base_info(self) -> Dict[str, Any]:
@@ -94,5 +582,11 @@ class RAGManager:
         return {
             "document_count": self.vector_store.get_collection_count(),
             "persist_directory": self.vector_store.persist_directory,
-            "collection_name": self.vector_store.collection_name
+            "collection_name": self.vector_store.collection_name,
+            "generation": self.vector_store.generation,
+            "indexed_files": len(self.manifest.files),
+            "embedding_cache": self.embedding_service.cache_stats(),
+            "query_cache": self.query_cache.stats(),
+            "lexical_documents": len(self.lexical_index),
+            "search_mode": self.search_mode
         }
@@ -0,0 +1,266 @@
+import json
+import uuid
+import hashlib
+from typing import Any, Dict, Iterator, List
+
+# 分块ID命名空间：同一来源、同一位置、同一内容的分块总是得到相同的 UUID
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c2b7e-4d0a-5c59-9a3e-2f8d1b6c7e40")
+
+
+def deterministic_id(source: str, chunk_id: str, content: str) -> str:
+    """
+    由分块来源、位置和内容生成确定性的 UUID，重复入库时覆盖原记录而不是新增
+
+    Args:
+        source: 来源文件名
+        chunk_id: 分块ID（"<文件名>_<序号>"）
+        content: 分块文本
+
+    Returns:
+        UUID 字符串
+    """
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{source}\n{chunk_id}\n{digest}"))
+
+
+def iter_bounded_batches(rows: List[Dict[str, Any]], max_rows: int, max_bytes: int) -> Iterator[List[Dict[str, Any]]]:
+    """
+    按行数和估算的请求体大小切分批次，单行超过 max_bytes 时单独成批
+
+    Args:
+        rows: 待写入的行
+        max_rows: 每批最多行数
+        max_bytes: 每批请求体最大字节数（按 JSON 编码长度估算）
+
+    Yields:
+        行列表
+    """
+    batch: List[Dict[str, Any]] = []
+    size = 0
+    for row in rows:
+        row_size = len(json.dumps(row, ensure_ascii=False).encode("utf-8"))
+        if batch and (len(batch) >= max_rows or size + row_size > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(row)
+        size += row_size
+    if batch:
+        yield batch
+
+
+def _postgrest_in_list(values: List[str]) -> str:
+    """
+    构造 PostgREST in 过滤的值列表，每个值加双引号并转义反斜杠和双引号
+
+    postgrest-py 的 in_ 只在值含有逗号、冒号或括号时加引号，不转义值中的双引号，
+    文件名含有这些字符时会生成错误的过滤条件。
+
+    Args:
+        values: 过滤值
+
+    Returns:
+        形如 ("a","b") 的字符串
+    """
+    quoted = ('"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"' for value in values)
+    return "(" + ",".join(quoted) + ")"
+
+
+def _vector_literal(embedding: List[float]) -> str:
+    return "[" + ",".join(repr(float(value)) for value in embedding) + "]"
+
+
+class PostgrestBulkStore:
+    """通过 Supabase REST 接口（PostgREST）执行的集合级批量操作"""
+
+    def __init__(self, client, table: str, max_rows: int = 500, max_bytes: int = 4 * 1024 * 1024):
+        """
+        初始化批量操作
+
+        Args:
+            client: supabase Client
+            table: 表名
+            max_rows: 每个写入请求最多行数
+            max_bytes: 每个写入请求最大字节数
+        """
+        self._client = client
+        self.table = table
+        self.max_rows = max(1, max_rows)
+        self.max_bytes = max_bytes
+
+    def count(self) -> int:
+        """服务端计数：总数从 Content-Range 头读取，最多下载一行（postgrest-py 的 HEAD 请求不解析计数）"""
+        response = self._client.table(self.table).select("id", count="exact").limit(1).execute()
+        return response.count or 0
+
+    def upsert(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        按 id 批量写入或覆盖（INSERT ... ON CONFLICT (id) DO UPDATE）
+
+        Args:
+            rows: 包含 id, content, metadata, embedding 的行
+
+        Returns:
+            提交的批次数
+        """
+        requests = 0
+        for batch in iter_bounded_batches(rows, self.max_rows, self.max_bytes):
+            self._client.table(self.table).upsert(batch, on_conflict="id", returning="minimal").execute()
+            requests += 1
+        return requests
+
+    def delete_ids(self, ids: List[str], batch_size: int = 200):
+        """按 id 集合删除，每批一个请求（id 放在 URL 中，批次不宜过大）"""
+        for start in range(0, len(ids), batch_size):
+            self._client.table(self.table).delete(returning="minimal").in_("id", ids[start:start + batch_size]).execute()
+
+    def delete_by_sources(self, sources: List[str]):
+        """按 metadata->>source 一次删除来源文件的全部分块"""
+        if sources:
+            self._client.table(self.table).delete(returning="minimal").filter(
+                "metadata->>source", "in", _postgrest_in_list(sources)
+            ).execute()
+
+    def delete_all(self):
+        """删除全部记录（PostgREST 要求 DELETE 带过滤条件）"""
+        self._client.table(self.table).delete(returning="minimal").not_.is_("id", None).execute()
+
+    def match(self, embedding: List[float], n_results: int) -> List[Dict[str, Any]]:
+        """调用 <表名>_match 函数做相似度检索，返回 content, metadata, similarity"""
+        response = self._client.rpc(
+            f"{self.table}_match",
+            {"query_embedding": embedding, "match_count": n_results}
+        ).execute()
+        return response.data or []
+
+    def iter_rows(self, batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """按 id 键集分页遍历全部记录（不使用 offset，深分页时不会变慢）"""
+        last_id = None
+        while True:
+            query = self._client.table(self.table).select("id, content, metadata").order("id").limit(batch_size)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            rows = query.execute().data or []
+            if rows:
+                yield rows
+                last_id = rows[-1]["id"]
+            if len(rows) < batch_size:
+                break
+
+
+class PostgresBulkStore:
+    """
+    直连 Postgres（pgvector）的集合级批量操作
+
+    配置 SUPABASE_DB_URL 后使用，可连接 Supabase 的数据库，也可连接本地安装了 pgvector 的 Postgres 做测试。
+    依赖 psycopg（pip install "psycopg[binary]"）。
+    """
+
+    def __init__(self, dsn: str, table: str, max_rows: int = 500, max_bytes: int = 4 * 1024 * 1024):
+        """
+        初始化批量操作
+
+        Args:
+            dsn: Postgres 连接串
+            table: 表名
+            max_rows: 每个事务最多写入行数
+            max_bytes: 每个事务最多写入的估算字节数
+        """
+        try:
+            import psycopg
+        except ImportError as e:
+            raise ImportError('直连 Postgres 需要安装 psycopg: pip install "psycopg[binary]"') from e
+        from psycopg import sql
+
+        self._sql = sql
+        self._conn = psycopg.connect(dsn, autocommit=True)
+        self.table = table
+        self._table = sql.Identifier(table)
+        self.max_rows = max(1, max_rows)
+        self.max_bytes = max_bytes
+
+    def ensure_schema(self, ddl: str):
+        """执行建表、建索引和检索函数的 SQL（均为 IF NOT EXISTS / OR REPLACE，可重复执行）"""
+        with self._conn.cursor() as cur:
+            cur.execute(ddl)
+
+    def count(self) -> int:
+        with self._conn.cursor() as cur:
+            cur.execute(self._sql.SQL("SELECT count(*) FROM {}").format(self._table))
+            return cur.fetchone()[0]
+
+    def upsert(self, rows: List[Dict[str, Any]]) -> int:
+        """按 id 批量写入或覆盖，每批一个事务"""
+        from psycopg.types.json import Jsonb
+
+        statement = self._sql.SQL(
+            "INSERT INTO {} (id, content, metadata, embedding) VALUES (%s, %s, %s, %s::vector) "
+            "ON CONFLICT (id) DO UPDATE SET content = EXCLUDED.content, "
+            "metadata = EXCLUDED.metadata, embedding = EXCLUDED.embedding"
+        ).format(self._table)
+        batches = 0
+        for batch in iter_bounded_batches(rows, self.max_rows, self.max_bytes):
+            with self._conn.transaction(), self._conn.cursor() as cur:
+                cur.executemany(statement, [
+                    (row["id"], row["content"], Jsonb(row["metadata"]), _vector_literal(row["embedding"]))
+                    for row in batch
+                ])
+            batches += 1
+        return batches
+
+    def delete_ids(self, ids: List[str], batch_size: int = 5000):
+        statement = self._sql.SQL("DELETE FROM {} WHERE id = ANY(%s::uuid[])").format(self._table)
+        with self._conn.cursor() as cur:
+            for start in range(0, len(ids), batch_size):
+                cur.execute(statement, (ids[start:start + batch_size],))
+
+    def delete_by_sources(self, sources: List[str]):
+        if sources:
+            with self._conn.cursor() as cur:
+                cur.execute(
+                    self._sql.SQL("DELETE FROM {} WHERE metadata->>'source' = ANY(%s)").format(self._table),
+                    (list(sources),)
+                )
+
+    def delete_all(self):
+        with self._conn.cursor() as cur:
+            cur.execute(self._sql.SQL("TRUNCATE {}").format(self._table))
+
+    def match(self, embedding: List[float], n_results: int) -> List[Dict[str, Any]]:
+        with self._conn.cursor() as cur:
+            cur.execute(
+                self._sql.SQL(
+                    "SELECT id::text, content, metadata, 1 - (embedding <=> %s::vector) AS similarity "
+                    "FROM {} ORDER BY embedding <=> %s::vector LIMIT %s"
+                ).format(self._table),
+                (_vector_literal(embedding), _vector_literal(embedding), n_results)
+            )
+            return [
+                {"id": row[0], "content": row[1], "metadata": row[2], "similarity": row[3]}
+                for row in cur.fetchall()
+            ]
+
+    def iter_rows(self, batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        last_id = None
+        with self._conn.cursor() as cur:
+            while True:
+                if last_id is None:
+                    cur.execute(
+                        self._sql.SQL("SELECT id::text, content, metadata FROM {} ORDER BY id LIMIT %s").format(self._table),
+                        (batch_size,)
+                    )
+                else:
+                    cur.execute(
+                        self._sql.SQL(
+                            "SELECT id::text, content, metadata FROM {} WHERE id > %s::uuid ORDER BY id LIMIT %s"
+                        ).format(self._table),
+                        (last_id, batch_size)
+                    )
+                rows = [{"id": row[0], "content": row[1], "metadata": row[2]} for row in cur.fetchall()]
+                if rows:
+                    yield rows
+                    last_id = rows[-1]["id"]
+                if len(rows) < batch_size:
+                    break
+
+    def close(self):
+        self._conn.close()
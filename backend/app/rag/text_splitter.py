@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Iterable, Iterator
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 
@@ -67,15 +67,22 @@ class TextSplitter:
             - source: 来源文件名
             - chunk_id: 分块ID
         """
-        all_chunks = []
+        return list(self.iter_chunks(documents))
+    
+    def iter_chunks(self, documents: Iterable[tuple]) -> Iterator[dict]:
+        """
+        逐个产出文档分块，内存中只保留当前文档的分块
         
+        Args:
+            documents: 产出(文件名, 文件内容)元组的可迭代对象
+            
+        Yields:
+            分块信息字典，格式同 split_documents
+        """
         for filename, content in documents:
-            chunks = self.split_text(content)
-            for idx, chunk in enumerate(chunks):
-                all_chunks.append({
+            for idx, chunk in enumerate(self.split_text(content)):
+                yield {
                     "content": chunk,
                     "source": filename,
                     "chunk_id": f"{filename}_{idx}"
-                })
-        
-        return all_chunks
+                }
@@ -1,19 +1,17 @@
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
+from ..monitoring.metrics import VECTOR_SEARCH_DURATION
 
 load_dotenv()
 
 VECTOR_STORE_TYPE = os.getenv("VECTOR_STORE_TYPE", "chroma").lower()
 
-if VECTOR_STORE_TYPE == "supabase":
-    from supabase import create_client, Client
-    from langchain_community.vectorstores import SupabaseVectorStore
-    from langchain_openai import OpenAIEmbeddings
-
 
 class VectorStore:
-    """向量存储服务，支持 ChromaDB 和 Supabase"""
+    """向量存储服务，支持 ChromaDB、Supabase 和本地内存映射索引"""
     
     def __init__(
         self,
@@ -25,18 +23,27 @@ class VectorStore:
         初始化向量存储
         
         Args:
-            persist_directory: 向量库持久化目录（仅 ChromaDB 使用）
+            persist_directory: 向量库持久化目录（ChromaDB 和本地索引使用）
             collection_name: 集合名称
-            embeddings: 嵌入模型实例（仅 Supabase 使用，推荐传入 EmbeddingService.embeddings）
+            embeddings: 嵌入模型实例（各后端均直接写入调用方计算好的向量，保留该参数以兼容现有调用）
         """
         self.collection_name = collection_name
         self.persist_directory = persist_directory
         self._embeddings = embeddings
-        self._vector_store = None
+        self._bulk = None
         self._client = None
+        # 集合版本号，每次写入或删除后递增，供上层缓存判断是否失效
+        self.generation = 0
+        # 同步后端的查询放到有界线程池中执行，避免阻塞事件循环
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("VECTOR_SEARCH_WORKERS", "4")),
+            thread_name_prefix="vector-search"
+        )
         
         if VECTOR_STORE_TYPE == "supabase":
             self._init_supabase()
+        elif VECTOR_STORE_TYPE == "local":
+            self._init_local(persist_directory, collection_name)
         else:
             self._init_chroma(persist_directory, collection_name)
     
@@ -65,35 +72,57 @@ class VectorStore:
             metadata={"hnsw:space": "cosine"}
         )
     
+    def _init_local(self, persist_directory: str, collection_name: str):
+        """初始化本地内存映射向量索引"""
+        from .local_vector_index import LocalVectorIndex
+        
+        if persist_directory is None:
+            current_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            persist_directory = os.path.join(current_dir, "data", "local")
+        
+        self.persist_directory = persist_directory
+        
+        self._index = LocalVectorIndex(
+            os.path.join(persist_directory, collection_name),
+            dtype=os.getenv("LOCAL_VECTOR_DTYPE", "float32").lower(),
+            rescore_factor=int(os.getenv("LOCAL_VECTOR_RESCORE_FACTOR", "4"))
+        )
+    
     def _init_supabase(self):
-        """初始化 Supabase 向量存储"""
+        """
+        初始化 Supabase 向量存储
+        
+        写入、删除、计数和检索都通过批量操作层执行：默认走 Supabase REST 接口；
+        配置 SUPABASE_DB_URL 时直连 Postgres，也可指向本地安装了 pgvector 的 Postgres 做测试。
+        """
+        from .supabase_bulk import PostgrestBulkStore, PostgresBulkStore
+        
+        # 每个写入请求的行数和估算字节数上限，避免请求体超过网关限制
+        max_rows = int(os.getenv("SUPABASE_UPSERT_BATCH_ROWS", "500"))
+        max_bytes = int(os.getenv("SUPABASE_UPSERT_MAX_BYTES", str(4 * 1024 * 1024)))
+        
+        database_url = os.getenv("SUPABASE_DB_URL")
+        if database_url:
+            self._bulk = PostgresBulkStore(database_url, self.collection_name, max_rows=max_rows, max_bytes=max_bytes)
+            # 直连时有建表权限，自动创建表、索引和检索函数
+            self._bulk.ensure_schema(self._get_manual_sql())
+            print(f"已直连 Postgres 向量数据库，表 {self.collection_name}")
+            return
+        
+        from supabase import create_client
+        
         supabase_url = os.getenv("SUPABASE_URL")
         supabase_anon_key = os.getenv("SUPABASE_ANON_KEY")
         
         if not supabase_url or not supabase_anon_key:
-            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set for Supabase vector store")
+            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY (or SUPABASE_DB_URL) must be set for Supabase vector store")
         
-        self._client: Client = create_client(supabase_url, supabase_anon_key)
+        self._client = create_client(supabase_url, supabase_anon_key)
         
         # 自动创建表和函数（如果不存在）
         self._ensure_supabase_schema()
         
-        # 使用传入的 embeddings 实例，如果没有则创建默认的
-        if self._embeddings is None:
-            from langchain_openai import OpenAIEmbeddings
-            self._embeddings = OpenAIEmbeddings(
-                openai_api_base=os.getenv("OPENAI_BASE_URL"),
-                openai_api_key=os.getenv("OPENAI_API_KEY"),
-                model=os.getenv("EMBEDDING_MODEL_NAME"),
-                dimensions=4096
-            )
-        
-        self._vector_store = SupabaseVectorStore(
-            client=self._client,
-            embedding=self._embeddings,
-            table_name=self.collection_name,
-            query_name=f"{self.collection_name}_match"
-        )
+        self._bulk = PostgrestBulkStore(self._client, self.collection_name, max_rows=max_rows, max_bytes=max_bytes)
         
         print(f"已连接到 Supabase 向量数据库: {supabase_url}")
     
@@ -156,6 +185,10 @@ CREATE INDEX IF NOT EXISTS idx_{self.collection_name}_embedding
 ON public.{self.collection_name} 
 USING ivfflat (embedding vector_cosine_ops);
 
+-- 按来源文件删除分块时使用
+CREATE INDEX IF NOT EXISTS idx_{self.collection_name}_source
+ON public.{self.collection_name} ((metadata->>'source'));
+
 -- 创建相似度搜索函数
 CREATE OR REPLACE FUNCTION public.{function_name}(
     query_embedding VECTOR(1536),
@@ -186,39 +219,112 @@ $$;"""
         self,
         chunks: List[Dict[str, Any]],
         embeddings: List[List[float]]
-    ):
+    ) -> List[str]:
         """
         添加文档分块到向量库
         
         Args:
             chunks: 文档分块列表，每个分块包含content, source, chunk_id
             embeddings: 对应的嵌入向量列表
+            
+        Returns:
+            写入向量库的记录ID列表（与 chunks 一一对应）
         """
         if VECTOR_STORE_TYPE == "supabase":
-            import uuid
-            texts = [chunk["content"] for chunk in chunks]
-            metadatas = [{"source": chunk["source"], "chunk_id": chunk["chunk_id"]} for chunk in chunks]
-            # Supabase 需要 UUID 格式的 id，生成新的 UUID
-            ids = [str(uuid.uuid4()) for _ in chunks]
+            from .supabase_bulk import deterministic_id
+            # Supabase 需要 UUID 格式的 id，由来源、分块ID和内容生成，重复入库时覆盖而不是新增
+            ids = [deterministic_id(chunk["source"], chunk["chunk_id"], chunk["content"]) for chunk in chunks]
+            rows = [
+                {
+                    "id": record_id,
+                    "content": chunk["content"],
+                    "metadata": {"source": chunk["source"], "chunk_id": chunk["chunk_id"]},
+                    "embedding": embedding
+                }
+                for record_id, chunk, embedding in zip(ids, chunks, embeddings)
+            ]
             
-            self._vector_store.add_texts(
-                texts=texts,
-                metadatas=metadatas,
-                ids=ids
+            requests = self._bulk.upsert(rows)
+            print(f"成功写入 {len(chunks)} 个文档分块到 Supabase 向量库（分 {requests} 批提交）")
+            self.generation += 1
+            return ids
+        elif VECTOR_STORE_TYPE == "local":
+            ids = [chunk["chunk_id"] for chunk in chunks]
+            
+            self._index.add(
+                ids=ids,
+                documents=[chunk["content"] for chunk in chunks],
+                embeddings=embeddings,
+                metadatas=[{"source": chunk["source"], "chunk_id": chunk["chunk_id"]} for chunk in chunks]
             )
-            print(f"成功添加 {len(chunks)} 个文档分块到 Supabase 向量库")
+            print(f"成功添加 {len(chunks)} 个文档分块到本地向量库")
+            self.generation += 1
+            return ids
         else:
             ids = [chunk["chunk_id"] for chunk in chunks]
             documents = [chunk["content"] for chunk in chunks]
             metadatas = [{"source": chunk["source"]} for chunk in chunks]
             
-            self._collection.add(
+            # 断点续传时崩溃前已写入的批次会以相同 ID 重新提交，upsert 覆盖旧记录（add 会忽略已存在的 ID）
+            self._collection.upsert(
                 ids=ids,
                 documents=documents,
                 embeddings=embeddings,
                 metadatas=metadatas
             )
             print(f"成功添加 {len(chunks)} 个文档分块到 Chroma 向量库")
+            self.generation += 1
+            return ids
+    
+    def delete_documents(self, ids: List[str], batch_size: int = 200):
+        """
+        按记录ID删除文档分块
+        
+        Args:
+            ids: 待删除的记录ID列表（add_documents 的返回值）
+            batch_size: 每批删除的ID数量，避免请求过大
+        """
+        if not ids:
+            return
+        
+        if VECTOR_STORE_TYPE == "supabase":
+            self._bulk.delete_ids(ids, batch_size)
+        else:
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                if VECTOR_STORE_TYPE == "local":
+                    self._index.delete(batch)
+                else:
+                    self._collection.delete(ids=batch)
+        
+        self.generation += 1
+        print(f"已从向量库删除 {len(ids)} 个文档分块")
+    
+    def delete_by_source(self, sources: List[str]):
+        """
+        按来源文件删除全部分块（包括清单中未记录的残留分块）
+        
+        Args:
+            sources: 来源文件名列表
+        """
+        if not sources:
+            return
+        
+        if VECTOR_STORE_TYPE == "supabase":
+            self._bulk.delete_by_sources(sources)
+        elif VECTOR_STORE_TYPE == "local":
+            wanted = set(sources)
+            ids = [
+                record["id"] for record in self._index.iter_records()
+                if record["metadata"].get("source") in wanted
+            ]
+            if ids:
+                self._index.delete(ids)
+        else:
+            self._collection.delete(where={"source": {"$in": list(sources)}})
+        
+        self.generation += 1
+        print(f"已从向量库删除 {len(sources)} 个文件的分块")
     
     def search(
         self,
@@ -233,22 +339,24 @@ $$;"""
             n_results: 返回的结果数量
             
         Returns:
-            搜索结果列表，每个结果包含content, source, distance
+            搜索结果列表，每个结果包含content, source, chunk_id, distance
         """
+        with VECTOR_SEARCH_DURATION.time(backend=VECTOR_STORE_TYPE, operation="search"):
+            return self._search(query_embedding, n_results)
+    
+    def _search(self, query_embedding: List[float], n_results: int) -> List[Dict[str, Any]]:
         if VECTOR_STORE_TYPE == "supabase":
-            results = self._vector_store.similarity_search_by_vector(
-                embedding=query_embedding,
-                k=n_results
-            )
-            
-            search_results = []
-            for doc in results:
-                search_results.append({
-                    "content": doc.page_content,
-                    "source": doc.metadata.get("source", "unknown"),
-                    "distance": 0.0
-                })
-            return search_results
+            return [
+                {
+                    "content": row["content"],
+                    "source": (row.get("metadata") or {}).get("source", "unknown"),
+                    "chunk_id": (row.get("metadata") or {}).get("chunk_id"),
+                    "distance": 1 - row["similarity"]
+                }
+                for row in self._bulk.match(query_embedding, n_results)
+            ]
+        elif VECTOR_STORE_TYPE == "local":
+            return self._search_batch([query_embedding], n_results)[0]
         else:
             results = self._collection.query(
                 query_embeddings=[query_embedding],
@@ -262,11 +370,147 @@ $$;"""
                     search_results.append({
                         "content": results["documents"][0][i],
                         "source": results["metadatas"][0][i]["source"],
+                        "chunk_id": results["ids"][0][i],
                         "distance": results["distances"][0][i]
                     })
             
             return search_results
     
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 3
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量搜索，一次处理多个查询向量
+        
+        Args:
+            query_embeddings: 查询的嵌入向量列表
+            n_results: 每个查询返回的结果数量
+            
+        Returns:
+            与 query_embeddings 一一对应的搜索结果列表
+        """
+        with VECTOR_SEARCH_DURATION.time(backend=VECTOR_STORE_TYPE, operation="search_batch"):
+            return self._search_batch(query_embeddings, n_results)
+    
+    def _search_batch(self, query_embeddings: List[List[float]], n_results: int) -> List[List[Dict[str, Any]]]:
+        if VECTOR_STORE_TYPE == "local":
+            return [
+                [
+                    {
+                        "content": hit["document"],
+                        "source": hit["metadata"].get("source", "unknown"),
+                        "chunk_id": hit["metadata"].get("chunk_id", hit["id"]),
+                        "distance": hit["distance"]
+                    }
+                    for hit in hits
+                ]
+                for hits in self._index.search(query_embeddings, n_results)
+            ]
+        elif VECTOR_STORE_TYPE == "supabase":
+            return [self._search(query_embedding, n_results) for query_embedding in query_embeddings]
+        else:
+            if not query_embeddings:
+                return []
+            
+            results = self._collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results
+            )
+            
+            return [
+                [
+                    {
+                        "content": document,
+                        "source": metadata["source"],
+                        "chunk_id": chunk_id,
+                        "distance": distance
+                    }
+                    for chunk_id, document, metadata, distance in zip(ids, documents, metadatas, distances)
+                ]
+                for ids, documents, metadatas, distances in zip(
+                    results["ids"], results["documents"], results["metadatas"], results["distances"]
+                )
+            ]
+    
+    async def asearch(
+        self,
+        query_embedding: List[float],
+        n_results: int = 3
+    ) -> List[Dict[str, Any]]:
+        """
+        异步搜索最相关的文档，在有界线程池中执行同步后端查询
+        
+        Args:
+            query_embedding: 查询的嵌入向量
+            n_results: 返回的结果数量
+            
+        Returns:
+            搜索结果列表，格式同 search
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.search, query_embedding, n_results)
+    
+    def iter_documents(self, batch_size: int = 500):
+        """
+        分批遍历向量库中的所有文档分块（用于重建词法索引等派生数据）
+        
+        Args:
+            batch_size: 每批数量
+            
+        Yields:
+            分块字典列表，每个分块包含 id, chunk_id, source, content
+        """
+        if VECTOR_STORE_TYPE == "supabase":
+            for rows in self._bulk.iter_rows(batch_size):
+                yield [
+                    {
+                        "id": row["id"],
+                        "chunk_id": (row.get("metadata") or {}).get("chunk_id"),
+                        "source": (row.get("metadata") or {}).get("source", "unknown"),
+                        "content": row["content"]
+                    }
+                    for row in rows
+                ]
+        elif VECTOR_STORE_TYPE == "local":
+            batch = []
+            for record in self._index.iter_records():
+                batch.append({
+                    "id": record["id"],
+                    "chunk_id": record["metadata"].get("chunk_id", record["id"]),
+                    "source": record["metadata"].get("source", "unknown"),
+                    "content": record["document"]
+                })
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        else:
+            offset = 0
+            while True:
+                results = self._collection.get(
+                    include=["documents", "metadatas"],
+                    limit=batch_size,
+                    offset=offset
+                )
+                if results["ids"]:
+                    yield [
+                        {
+                            "id": record_id,
+                            "chunk_id": record_id,
+                            "source": metadata["source"],
+                            "content": document
+                        }
+                        for record_id, document, metadata in zip(
+                            results["ids"], results["documents"], results["metadatas"]
+                        )
+                    ]
+                if len(results["ids"]) < batch_size:
+                    break
+                offset += batch_size
+    
     def get_collection_count(self) -> int:
         """
         获取集合中的文档数量
@@ -275,31 +519,20 @@ $$;"""
             文档数量
         """
         if VECTOR_STORE_TYPE == "supabase":
-            response = self._client.table(self.collection_name).select("id", count="exact").execute()
-            return len(response.data) if response.data else 0
+            return self._bulk.count()
+        elif VECTOR_STORE_TYPE == "local":
+            return len(self._index)
         else:
             return self._collection.count()
     
     def clear_collection(self):
         """清空集合中的所有文档"""
         if VECTOR_STORE_TYPE == "supabase":
-            # 使用 RPC 调用删除所有记录（绕过 UUID 类型检查）
-            try:
-                # 方法1: 使用 not.is 过滤器
-                self._client.table(self.collection_name).delete().not_.is_("id", None).execute()
-            except Exception:
-                # 方法2: 如果上面的方法失败，使用原始 SQL
-                try:
-                    self._client.rpc("exec_sql", {
-                        "sql": f"DELETE FROM public.{self.collection_name};"
-                    }).execute()
-                except Exception:
-                    # 方法3: 逐个删除所有记录
-                    response = self._client.table(self.collection_name).select("id").execute()
-                    if response.data:
-                        for record in response.data:
-                            self._client.table(self.collection_name).delete().eq("id", record["id"]).execute()
+            self._bulk.delete_all()
             print("已清空 Supabase 向量库")
+        elif VECTOR_STORE_TYPE == "local":
+            self._index.clear()
+            print("已清空本地向量库")
         else:
             self._client.delete_collection(self.collection_name)
             self._collection = self._client.create_collection(
@@ -307,3 +540,17 @@ $$;"""
                 metadata={"hnsw:space": "cosine"}
             )
             print("已清空 Chroma 向量库")
+        
+        self.generation += 1
+    
+    def drop_collection(self):
+        """删除整个集合并释放检索线程池（集合被替换后调用，Supabase 表需手动删除）"""
+        if VECTOR_STORE_TYPE == "supabase":
+            raise NotImplementedError("Supabase 表需要在 Dashboard 中手动删除")
+        elif VECTOR_STORE_TYPE == "local":
+            import shutil
+            self._index.clear()
+            shutil.rmtree(self._index.directory, ignore_errors=True)
+        else:
+            self._client.delete_collection(self.collection_name)
+        self._executor.shutdown(wait=False)
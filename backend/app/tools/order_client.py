@@ -0,0 +1,203 @@
+import os
+import random
+import asyncio
+from abc import ABC, abstractmethod
+from urllib.parse import quote
+from typing import Dict, Any, List, Optional
+
+
+MOCK_ORDERS: Dict[str, Dict[str, Any]] = {
+    "123456": {
+        "order_id": "123456",
+        "amount": 1000.00,
+        "status": "已支付",
+        "items": ["商品A", "商品B"],
+        "create_time": "2024-01-01 10:00:00"
+    },
+    "789012": {
+        "order_id": "789012",
+        "amount": 2500.00,
+        "status": "待支付",
+        "items": ["商品C", "商品D", "商品E"],
+        "create_time": "2024-01-02 14:30:00"
+    }
+}
+
+
+def not_found_order(order_id: str) -> Dict[str, Any]:
+    """构造未找到订单时的返回结构"""
+    return {
+        "order_id": order_id,
+        "amount": 0.00,
+        "status": "未找到",
+        "items": [],
+        "create_time": ""
+    }
+
+
+class OrderClient(ABC):
+    """订单查询客户端基类，所有实现均为异步并限制并发数"""
+
+    def __init__(self, max_concurrency: int = 10):
+        """
+        初始化订单查询客户端
+
+        Args:
+            max_concurrency: 同时进行的最大查询数
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """延迟创建信号量，确保绑定到运行中的事件循环"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def get_order(self, order_id: str) -> Dict[str, Any]:
+        """
+        查询单个订单
+
+        Args:
+            order_id: 订单号
+
+        Returns:
+            订单信息字典，未找到时 status 为"未找到"
+        """
+        async with self.semaphore:
+            return await self._fetch(order_id)
+
+    async def get_orders(self, order_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量查询订单，重复的订单号只查询一次
+
+        Args:
+            order_ids: 订单号列表
+
+        Returns:
+            订单号到订单信息的映射
+        """
+        unique_ids = list(dict.fromkeys(order_ids))
+        results = await asyncio.gather(*(self.get_order(order_id) for order_id in unique_ids))
+        return dict(zip(unique_ids, results))
+
+    @abstractmethod
+    async def _fetch(self, order_id: str) -> Dict[str, Any]:
+        """执行实际查询，由子类实现"""
+
+    async def close(self):
+        """释放连接等资源"""
+
+
+class LocalOrderClient(OrderClient):
+    """进程内订单数据源，用于本地开发和离线测试，可模拟服务延迟"""
+
+    def __init__(
+        self,
+        orders: Dict[str, Dict[str, Any]] = None,
+        latency_range: tuple = (0.0, 0.0),
+        max_concurrency: int = 10
+    ):
+        """
+        初始化本地订单数据源
+
+        Args:
+            orders: 订单数据，默认使用内置的模拟订单
+            latency_range: 模拟延迟范围（秒），如 (1, 5)
+            max_concurrency: 同时进行的最大查询数
+        """
+        super().__init__(max_concurrency)
+        self.orders = dict(MOCK_ORDERS if orders is None else orders)
+        self.latency_range = latency_range
+
+    async def _fetch(self, order_id: str) -> Dict[str, Any]:
+        low, high = self.latency_range
+        if high > 0:
+            await asyncio.sleep(random.uniform(low, high))
+        order = self.orders.get(order_id)
+        return dict(order) if order else not_found_order(order_id)
+
+
+class HttpOrderClient(OrderClient):
+    """基于 HTTP 的订单服务客户端，复用连接池"""
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        max_concurrency: int = 10
+    ):
+        """
+        初始化订单服务客户端
+
+        Args:
+            base_url: 订单服务地址，查询接口为 GET {base_url}/orders/{order_id}
+            timeout: 单次请求超时（秒）
+            max_connections: 连接池最大连接数
+            max_concurrency: 同时进行的最大查询数
+        """
+        import httpx
+
+        super().__init__(max_concurrency)
+        self.base_url = base_url.rstrip("/")
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+
+    async def _fetch(self, order_id: str) -> Dict[str, Any]:
+        # 订单号来自模型输出，编码后再拼入路径，避免 "../" 等字符改变请求路径
+        response = await self._client.get(f"/orders/{quote(order_id, safe='')}")
+        if response.status_code == 404:
+            return not_found_order(order_id)
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self):
+        await self._client.aclose()
+
+
+_order_client: Optional[OrderClient] = None
+
+
+def _parse_latency(value: str) -> tuple:
+    """解析形如 "1,5" 的延迟范围配置"""
+    parts = [float(part) for part in value.split(",") if part.strip()]
+    if not parts:
+        return (0.0, 0.0)
+    return (parts[0], parts[-1])
+
+
+def get_order_client() -> OrderClient:
+    """
+    获取订单查询客户端实例（单例模式）
+
+    配置了 ORDER_SERVICE_URL 时使用 HTTP 客户端，否则使用本地模拟数据源，
+    其模拟延迟由 ORDER_MOCK_LATENCY 控制（默认 "1,5" 秒）。
+    """
+    global _order_client
+    if _order_client is None:
+        max_concurrency = int(os.getenv("ORDER_SERVICE_MAX_CONCURRENCY", "10"))
+        base_url = os.getenv("ORDER_SERVICE_URL")
+        if base_url:
+            _order_client = HttpOrderClient(base_url, max_concurrency=max_concurrency)
+        else:
+            _order_client = LocalOrderClient(
+                latency_range=_parse_latency(os.getenv("ORDER_MOCK_LATENCY", "1,5")),
+                max_concurrency=max_concurrency
+            )
+    return _order_client
+
+
+async def close_order_client():
+    """关闭订单查询客户端（应用关闭时调用），未创建时不做任何事"""
+    global _order_client
+    if _order_client is not None:
+        client, _order_client = _order_client, None
+        await client.close()
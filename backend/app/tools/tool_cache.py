@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from langchain_core.tools import BaseTool
+from ..monitoring.metrics import register_stats
+
+
+class ToolCachePolicy:
+    """工具结果的缓存策略，通过 cacheable 装饰器挂在工具的 metadata 上"""
+
+    def __init__(
+        self,
+        ttl: float,
+        normalizers: Dict[str, Callable[[Any], Any]] = None,
+        version: Callable[[], Any] = None,
+        cache_if: Callable[[str], bool] = None
+    ):
+        """
+        初始化缓存策略
+
+        Args:
+            ttl: 结果有效期（秒）
+            normalizers: 按参数名指定的规范化函数，规范化后相同的参数共享缓存
+            version: 返回数据版本的函数，版本变化后旧结果不再命中（如知识库版本号）；返回 None 时（如数据源尚未初始化）不使用缓存
+            cache_if: 判断结果是否可缓存的函数，默认缓存所有非错误结果
+        """
+        self.ttl = ttl
+        self.normalizers = normalizers or {}
+        self.version = version
+        self.cache_if = cache_if
+
+    def make_key(self, tool_name: str, args: Dict[str, Any]) -> Optional[str]:
+        """
+        生成缓存键
+
+        Args:
+            tool_name: 工具名
+            args: 工具参数
+
+        Returns:
+            缓存键，数据版本不可用时返回 None（本次调用不读写缓存）
+        """
+        version = self.version() if self.version else None
+        if self.version and version is None:
+            return None
+        normalized = {
+            name: self.normalizers[name](value) if name in self.normalizers else value
+            for name, value in args.items()
+        }
+        return json.dumps([tool_name, version, normalized], ensure_ascii=False, sort_keys=True, default=str)
+
+
+def cacheable(
+    ttl: float,
+    normalizers: Dict[str, Callable[[Any], Any]] = None,
+    version: Callable[[], Any] = None,
+    cache_if: Callable[[str], bool] = None
+):
+    """
+    声明工具结果可缓存，用在 @tool 之上
+
+    Args:
+        ttl: 结果有效期（秒），不大于0时不缓存
+        normalizers: 按参数名指定的规范化函数
+        version: 返回数据版本的函数
+        cache_if: 判断结果是否可缓存的函数
+
+    Returns:
+        装饰器
+    """
+    def decorator(tool: BaseTool) -> BaseTool:
+        if ttl > 0:
+            tool.metadata = dict(tool.metadata or {}, cache_policy=ToolCachePolicy(ttl, normalizers, version, cache_if))
+        return tool
+    return decorator
+
+
+def get_cache_policy(tool: Optional[BaseTool]) -> Optional[ToolCachePolicy]:
+    """获取工具声明的缓存策略，未声明时返回 None"""
+    if tool is None or not tool.metadata:
+        return None
+    return tool.metadata.get("cache_policy")
+
+
+class ToolResultCache:
+    """
+    跨请求共享的工具结果缓存
+
+    按条目数和结果总字节数双重限制内存，超出时淘汰最久未使用的条目；条目按各工具的 TTL 过期。
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024):
+        """
+        初始化工具结果缓存
+
+        Args:
+            max_entries: 最大条目数，为0时禁用缓存
+            max_bytes: 缓存结果的最大总字节数
+        """
+        self.max_entries = max(0, max_entries)
+        self.max_bytes = max_bytes
+        # key -> (过期时间, 字节数, 结果)
+        self._entries: "OrderedDict[str, Tuple[float, int, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查询缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的结果，未命中或已过期时返回 None
+        """
+        if self.max_entries == 0:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, content = entry
+            if time.monotonic() > expires_at:
+                del self._entries[key]
+                self._bytes -= size
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return content
+
+    def put(self, key: str, content: str, ttl: float):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            content: 工具结果
+            ttl: 有效期（秒）
+        """
+        if self.max_entries == 0:
+            return
+
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (time.monotonic() + ttl, size, content)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            命中率、条目数、占用字节数等统计
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self.evictions
+            }
+
+
+_tool_result_cache = None
+
+register_stats(lambda: _tool_result_cache.stats() if _tool_result_cache is not None else None, [
+    ("tool_cache_hits_total", "counter", "工具结果缓存命中次数", "hits"),
+    ("tool_cache_misses_total", "counter", "工具结果缓存未命中次数", "misses"),
+    ("tool_cache_evictions_total", "counter", "工具结果缓存淘汰条目数", "evictions"),
+    ("tool_cache_entries", "gauge", "工具结果缓存条目数", "entries"),
+    ("tool_cache_bytes", "gauge", "工具结果缓存占用字节数", "bytes"),
+])
+
+
+def get_tool_result_cache() -> ToolResultCache:
+    """获取工具结果缓存实例（单例模式）"""
+    global _tool_result_cache
+    if _tool_result_cache is None:
+        _tool_result_cache = ToolResultCache(
+            max_entries=int(os.getenv("TOOL_CACHE_SIZE", "1024")),
+            max_bytes=int(os.getenv("TOOL_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+        )
+    return _tool_result_cache
@@ -1,23 +1,53 @@
+import os
+import asyncio
+import threading
 from typing import Dict, Any, List
 from langchain_core.tools import tool
 from ..rag.rag_manager import RAGManager
-from ..agent.skills import SKILLS
+from ..rag.context_packer import ContextPacker
+from ..rag.query_cache import normalize_query
+from .tool_cache import cacheable
+from ..monitoring.metrics import register_stats
+from .order_client import get_order_client
+from ..agent.skills import get_skill_registry
+from ..warmup import get_warmup
 
 
 
 _rag_manager = None
+_rag_manager_lock = threading.Lock()
+_context_packer = None
+
+RAG_SEARCH_CANDIDATES = int(os.getenv("RAG_SEARCH_CANDIDATES", "8"))
 
 
 def get_rag_manager():
     """获取RAG管理器实例（单例模式）"""
     global _rag_manager
     if _rag_manager is None:
-        _rag_manager = RAGManager()
+        # 后台预热线程和首个请求可能同时调用，只构建一次
+        with _rag_manager_lock:
+            if _rag_manager is None:
+                _rag_manager = RAGManager()
     return _rag_manager
 
 
+register_stats(lambda: _rag_manager.query_cache.stats() if _rag_manager is not None else None, [
+    ("rag_query_cache_hits_total", "counter", "检索结果缓存命中次数", "hits"),
+    ("rag_query_cache_misses_total", "counter", "检索结果缓存未命中次数", "misses"),
+    ("rag_query_cache_invalidations_total", "counter", "知识库变更导致检索结果缓存失效的次数", "invalidations"),
+    ("rag_query_cache_evictions_total", "counter", "检索结果缓存淘汰条目数", "evictions"),
+    ("rag_query_cache_entries", "gauge", "检索结果缓存条目数", "entries"),
+    ("rag_query_cache_saved_seconds_total", "counter", "命中检索结果缓存节省的检索耗时（秒）", "saved_seconds"),
+])
+
+
+@cacheable(
+    ttl=float(os.getenv("TOOL_CACHE_ORDER_TTL", "60")),
+    normalizers={"order_id": lambda order_id: str(order_id).strip()}
+)
 @tool
-def search_order(order_id: str) -> Dict[str, Any]:
+async def search_order(order_id: str) -> Dict[str, Any]:
     """
     根据订单号搜索订单信息
     
@@ -28,36 +58,28 @@ def search_order(order_id: str) -> Dict[str, Any]:
         订单信息字典
     """
     print(f"[工具调用] 搜索订单: {order_id}")
+    
+    return await get_order_client().get_order(order_id)
+
 
-    # 模拟1-5秒延迟延迟
-    import time
-    import random
-    time.sleep(random.uniform(1, 5))
-    
-    mock_orders = {
-        "123456": {
-            "order_id": "123456",
-            "amount": 1000.00,
-            "status": "已支付",
-            "items": ["商品A", "商品B"],
-            "create_time": "2024-01-01 10:00:00"
-        },
-        "789012": {
-            "order_id": "789012",
-            "amount": 2500.00,
-            "status": "待支付",
-            "items": ["商品C", "商品D", "商品E"],
-            "create_time": "2024-01-02 14:30:00"
-        }
-    }
-    
-    return mock_orders.get(order_id, {
-        "order_id": order_id,
-        "amount": 0.00,
-        "status": "未找到",
-        "items": [],
-        "create_time": ""
-    })
+@cacheable(
+    ttl=float(os.getenv("TOOL_CACHE_ORDER_TTL", "60")),
+    normalizers={"order_ids": lambda order_ids: sorted({str(order_id).strip() for order_id in order_ids})}
+)
+@tool
+async def search_orders(order_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    一次查询多个订单的信息，需要查询两个及以上订单时使用
+    
+    Args:
+        order_ids: 订单号列表
+        
+    Returns:
+        订单号到订单信息的映射
+    """
+    print(f"[工具调用] 批量搜索订单: {order_ids}")
+    
+    return await get_order_client().get_orders([str(order_id).strip() for order_id in order_ids])
 
 
 @tool
@@ -81,8 +103,39 @@ def calculator(expression: str) -> float:
         return 0.0
 
 
+def get_context_packer():
+    """获取上下文打包器实例（单例模式）"""
+    global _context_packer
+    if _context_packer is None:
+        _context_packer = ContextPacker()
+    return _context_packer
+
+
+def _format_rag_results(results: List[Dict[str, Any]]) -> str:
+    """将检索结果打包并格式化为工具输出文本"""
+    packed = get_context_packer().pack(results)
+    if not packed:
+        return "未在知识库中找到相关内容"
+    
+    formatted_results = []
+    for i, result in enumerate(packed, 1):
+        formatted_results.append(
+            f"[相关内容 {i}] 来源: {result['source']}\n"
+            f"{result['content']}"
+        )
+    
+    return "\n\n".join(formatted_results)
+
+
+@cacheable(
+    ttl=float(os.getenv("TOOL_CACHE_RAG_TTL", "300")),
+    normalizers={"query": normalize_query},
+    # 知识库变更后版本号递增，旧结果不再命中；只读取已创建的管理器，未创建时不缓存，避免在事件循环上构建 RAGManager
+    version=lambda: _rag_manager.vector_store.generation if _rag_manager is not None else None,
+    cache_if=lambda content: not content.startswith("检索失败")
+)
 @tool
-def rag_search(query: str) -> str:
+async def rag_search(query: str) -> str:
     """
     检索企业内部知识库
     
@@ -94,37 +147,33 @@ def rag_search(query: str) -> str:
     """
     print(f"[工具调用] RAG检索: {query}")
     
-    import time
+    # KB_WARMUP=off 时启动阶段没有同步知识库，首次检索前同步，同步进行中则等待其结束
+    await asyncio.to_thread(get_warmup().ensure_synced)
+    
     max_retries = 3
     last_error = None
     
     for attempt in range(max_retries):
         try:
             rag_manager = get_rag_manager()
-            results = rag_manager.search(query, n_results=5)  # 增加结果数量，提高召回率
-            
-            if not results:
-                return "未在知识库中找到相关内容"
-            
-            formatted_results = []
-            for i, result in enumerate(results, 1):
-                formatted_results.append(
-                    f"[相关内容 {i}] 来源: {result['source']}\n"
-                    f"{result['content']}"
-                )
-            
-            return "\n\n".join(formatted_results)
+            # 多取候选，由上下文打包器按相关性、去重和 token 预算筛选
+            results = await rag_manager.asearch(query, n_results=RAG_SEARCH_CANDIDATES)
+            return _format_rag_results(results)
         except Exception as e:
             last_error = e
             print(f"[RAG检索错误] 尝试 {attempt + 1}/{max_retries}: {e}")
             if attempt < max_retries - 1:
                 wait_time = 2 ** attempt  # 指数退避: 1s, 2s
                 print(f"[RAG检索] 等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
+                await asyncio.sleep(wait_time)
     
     return f"检索失败: {str(last_error)}"
 
 
+@cacheable(
+    ttl=float(os.getenv("TOOL_CACHE_SKILL_TTL", "3600")),
+    normalizers={"skill_name": lambda name: str(name).strip()}
+)
 @tool
 def load_skill(skill_name: str) -> str:
     """
@@ -139,12 +188,13 @@ def load_skill(skill_name: str) -> str:
     """
     print(f"[工具调用] 加载技能: {skill_name}")
     
-    for skill in SKILLS:
-        if skill["name"] == skill_name:
-            return f"Loaded skill: {skill_name}\n\n{skill['content']}"
+    registry = get_skill_registry()
+    skill = registry.get(skill_name)
+    if skill is not None:
+        return f"Loaded skill: {skill_name}\n\n{skill['content']}"
 
     # Skill not found
-    available = ", ".join(s["name"] for s in SKILLS)
+    available = ", ".join(registry.names())
     return f"Skill '{skill_name}' not found. Available skills: {available}"
 
 
@@ -155,4 +205,4 @@ def get_tools():
     Returns:
         工具列表
     """
-    return [search_order, calculator, rag_search]
+    return [search_order, search_orders, calculator, rag_search]
@@ -0,0 +1,190 @@
+import os
+import time
+import threading
+from typing import Any, Dict, Optional
+
+
+WARMUP_MODES = ("background", "blocking", "off")
+
+
+class KnowledgeBaseWarmup:
+    """
+    知识库预热：构建 RAG 管理器、同步知识库并构建 Agent 引擎
+
+    默认在后台线程中执行，服务启动后立即开始接收请求；/ready 在预热完成前返回 503，
+    负载均衡据此在检索可用后再转发流量。失败后按指数退避重试，重试用尽后状态为 failed，
+    可通过 retry 重新触发。
+    """
+
+    def __init__(self, mode: str = None, max_attempts: int = None, retry_delay: float = None):
+        """
+        初始化知识库预热
+
+        Args:
+            mode: background（后台执行）/ blocking（启动时同步执行，完成后才开始接收请求）/
+                off（启动时不预热，首次检索时再同步知识库），默认读取 KB_WARMUP
+            max_attempts: 最多尝试次数，默认读取 KB_WARMUP_MAX_ATTEMPTS
+            retry_delay: 首次重试前等待的秒数，之后每次翻倍，默认读取 KB_WARMUP_RETRY_DELAY
+        """
+        self.mode = (mode or os.getenv("KB_WARMUP", "background")).lower()
+        if self.mode not in WARMUP_MODES:
+            raise ValueError(f"不支持的预热模式: {self.mode}，可选: {', '.join(WARMUP_MODES)}")
+        self.max_attempts = max(1, max_attempts if max_attempts is not None else int(os.getenv("KB_WARMUP_MAX_ATTEMPTS", "3")))
+        self.retry_delay = retry_delay if retry_delay is not None else float(os.getenv("KB_WARMUP_RETRY_DELAY", "5"))
+        self.state = "skipped" if self.mode == "off" else "pending"
+        self.step: Optional[str] = None
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.knowledge_base: Dict[str, Any] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # 预热和知识库管理任务都持有该锁，同一时间只有一个在写知识库
+        self.sync_lock = threading.Lock()
+        # 没有预热在执行时置位，off 模式下检索据此等待同步结束
+        self._idle = threading.Event()
+        if self.mode != "off":
+            self._idle.set()
+
+    @property
+    def ready(self) -> bool:
+        # off 模式下尚未同步（skipped）也视为就绪，首次检索时再同步
+        return self.state in ("ready", "skipped")
+
+    def start(self):
+        """按模式启动预热（重复调用无效）"""
+        with self._lock:
+            if self.mode == "off" or self.state != "pending":
+                return
+            self.state = "running"
+            self.started_at = time.time()
+            self._idle.clear()
+
+        if self.mode == "blocking":
+            self._run()
+            return
+
+        self._thread = threading.Thread(target=self._run, name="kb-warmup", daemon=True)
+        self._thread.start()
+
+    def retry(self) -> bool:
+        """
+        重试次数用尽（failed）后重新在后台执行预热
+
+        Returns:
+            是否已重新触发，当前不是 failed 状态时返回 False
+        """
+        with self._lock:
+            if self.state != "failed":
+                return False
+            self.state = "running"
+            self.error = None
+            self.attempts = 0
+            self.started_at = time.time()
+            self.finished_at = None
+            self._idle.clear()
+
+        self._thread = threading.Thread(target=self._run, name="kb-warmup", daemon=True)
+        self._thread.start()
+        return True
+
+    def ensure_synced(self):
+        """
+        off 模式下首次检索前同步知识库：第一个调用者执行同步，其他调用者等待同步（或重试）结束
+
+        其他模式由启动时的预热负责，直接返回。
+        """
+        if self.mode != "off":
+            return
+        with self._lock:
+            first = self.state == "skipped"
+            if first:
+                self.state = "running"
+                self.started_at = time.time()
+        if not first:
+            self._idle.wait()
+            return
+        print("首次检索，同步知识库...")
+        self._run()
+
+    def _run(self):
+        try:
+            with self.sync_lock:
+                self._run_attempts()
+        finally:
+            self._idle.set()
+
+    def _run_attempts(self):
+        while True:
+            self.attempts += 1
+            try:
+                self._warm_up()
+                self.error = None
+                self.state = "ready"
+                break
+            except Exception as e:
+                print(f"初始化RAG知识库失败（第 {self.attempts}/{self.max_attempts} 次）: {e}")
+                self.error = str(e)
+                if self.attempts >= self.max_attempts:
+                    self.state = "failed"
+                    break
+                delay = self.retry_delay * 2 ** (self.attempts - 1)
+                print(f"{delay:.1f} 秒后重试知识库预热...")
+                self.step = "retry_wait"
+                time.sleep(delay)
+
+        self.step = None
+        self.finished_at = time.time()
+        if self.started_at is not None:
+            print(f"知识库预热结束（{self.state}），耗时 {self.finished_at - self.started_at:.1f} 秒")
+
+    def _warm_up(self):
+        # 在预热线程中导入，避免 LangChain、向量库等依赖拖慢应用启动
+        from app.tools.tools import get_rag_manager
+        from app.agent.engine import get_agent_engine
+
+        self.step = "rag_manager"
+        rag_manager = get_rag_manager()
+
+        self.step = "knowledge_base"
+        print("初始化RAG知识库...")
+        rag_manager.initialize_knowledge_base(force_rebuild=False, incremental=True)
+        self.knowledge_base = rag_manager.get_knowledge_base_info()
+        print(f"知识库信息: {self.knowledge_base}")
+
+        self.step = "agent_engine"
+        get_agent_engine()
+
+    def status(self) -> Dict[str, Any]:
+        """
+        获取预热状态
+
+        Returns:
+            预热模式、状态（pending/running/ready/failed/skipped）、当前步骤、尝试次数、耗时、错误和知识库信息
+        """
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "ready": self.ready,
+            "mode": self.mode,
+            "state": self.state,
+            "step": self.step,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "elapsed": elapsed,
+            "error": self.error,
+            "knowledge_base": self.knowledge_base
+        }
+
+
+_warmup = None
+
+
+def get_warmup() -> KnowledgeBaseWarmup:
+    """获取知识库预热实例（单例模式）"""
+    global _warmup
+    if _warmup is None:
+        _warmup = KnowledgeBaseWarmup()
+    return _warmup
@@ -0,0 +1,74 @@
+"""
+对比两次基准测试结果
+
+在 backend 目录下运行:
+    python -m benchmarks.compare base.json head.json
+"""
+import sys
+import json
+from typing import Any, Dict, Iterator, Tuple
+
+
+# 数值越小越好的指标后缀，其余吞吐类指标越大越好
+_LOWER_IS_BETTER = ("_ms", "seconds")
+# 描述测试规模和参数的字段，不参与对比
+_PARAMETER_KEYS = {
+    "count", "corpus_size", "requests", "concurrency", "files", "chars", "chunks", "texts",
+    "batch_size", "events_per_request", "first_token_latency", "token_latency", "answer_chars"
+}
+
+
+def _flatten(report: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
+    for section in ("ingestion", "stream_chat"):
+        yield from _flatten_dict(section, report.get(section, {}))
+    for row in report.get("search", []):
+        prefix = f"search.{row['corpus_size']}.{row['mode']}"
+        yield from _flatten_dict(prefix, row)
+
+
+def _flatten_dict(prefix: str, data: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
+    for key, value in data.items():
+        if isinstance(value, dict):
+            yield from _flatten_dict(f"{prefix}.{key}", value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}.{key}", float(value)
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any]) -> str:
+    """
+    生成两次结果的对比表
+
+    Args:
+        base: 基线结果
+        head: 新结果
+
+    Returns:
+        每个指标一行：名称、基线值、新值、变化百分比（变差的指标标记 !）
+    """
+    base_values = dict(_flatten(base))
+    lines = [f"基线 {base.get('meta', {}).get('commit', '?')} → 当前 {head.get('meta', {}).get('commit', '?')}"]
+    for name, value in _flatten(head):
+        if name not in base_values or name.rsplit(".", 1)[-1] in _PARAMETER_KEYS:
+            continue
+        old = base_values[name]
+        change = (value - old) / old * 100 if old else 0.0
+        worse = change > 0 if name.endswith(_LOWER_IS_BETTER) else change < 0
+        flag = "!" if worse and abs(change) >= 10 else " "
+        lines.append(f"{flag} {name:<60} {old:>14.3f} {value:>14.3f} {change:>+8.1f}%")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("用法: python -m benchmarks.compare base.json head.json")
+        sys.exit(2)
+    with open(argv[0], encoding="utf-8") as f:
+        base = json.load(f)
+    with open(argv[1], encoding="utf-8") as f:
+        head = json.load(f)
+    print(compare(base, head))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import re
+import json
+import time
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[一-鿿]", re.IGNORECASE)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    确定性的离线嵌入模型：把文本中的词（中文按单字）哈希到固定维度后求和并单位化
+
+    相同文本总是得到相同向量，共享词越多的文本余弦相似度越高，检索结果有意义且可复现。
+    """
+
+    def __init__(self, dimensions: int = 256, latency: float = 0.0, per_text_latency: float = 0.0):
+        """
+        初始化离线嵌入模型
+
+        Args:
+            dimensions: 向量维度
+            latency: 每次调用的固定延迟（秒），模拟网络往返
+            per_text_latency: 每条文本额外的延迟（秒），模拟服务端计算
+        """
+        self.dimensions = dimensions
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in _TOKEN_PATTERN.findall(text.lower()) or [text]:
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).tolist()
+
+    def _delay(self, count: int) -> float:
+        self.calls += 1
+        self.texts += count
+        return self.latency + self.per_text_latency * count
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        delay = self._delay(len(texts))
+        if delay:
+            time.sleep(delay)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        delay = self._delay(len(texts))
+        if delay:
+            await asyncio.sleep(delay)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    按脚本回复的离线聊天模型
+
+    script 的第 i 项是当前问题的第 i 轮回复：{"content": 文本, "tool_calls": [{"name", "args"}]}，
+    轮次按最后一条用户消息之后的 AI 消息数确定，超出脚本时重复最后一项。
+    流式输出按 token_size 个字符切分，首个 token 前等待 first_token_latency，之后每个 token 等待 token_latency。
+    """
+
+    script: List[Dict[str, Any]]
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    token_size: int = 2
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs):
+        return self
+
+    def _reply(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        turn = sum(1 for m in messages[last_human + 1:] if isinstance(m, AIMessage))
+        return self.script[min(turn, len(self.script) - 1)]
+
+    @staticmethod
+    def _tool_calls(reply: Dict[str, Any], turn_id: int) -> List[Dict[str, Any]]:
+        return [
+            {"name": call["name"], "args": call.get("args", {}), "id": f"call_{turn_id}_{i}"}
+            for i, call in enumerate(reply.get("tool_calls", []))
+        ]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        reply = self._reply(messages)
+        message = AIMessage(content=reply.get("content", ""), tool_calls=self._tool_calls(reply, len(messages)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        reply = self._reply(messages)
+        content = reply.get("content", "")
+        if self.first_token_latency:
+            await asyncio.sleep(self.first_token_latency)
+        for start in range(0, len(content), self.token_size):
+            if start and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            token = content[start:start + self.token_size]
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+        tool_calls = self._tool_calls(reply, len(messages))
+        if tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"], ensure_ascii=False), "id": call["id"], "index": i}
+                for i, call in enumerate(tool_calls)
+            ]))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        if self.first_token_latency:
+            await asyncio.sleep(self.first_token_latency)
+        return self._generate(messages, stop, run_manager, **kwargs)
@@ -0,0 +1,291 @@
+"""
+/api/chat/stream 端到端 SSE 压测：逐级增加并发客户端数，统计首个事件耗时、最终回答耗时、事件速率和错误率
+
+未指定 --url 时自动启动本地模拟 OpenAI 服务和单 worker 的聊天服务（数据写入临时目录）。
+在 backend 目录下运行:
+    python -m benchmarks.loadtest --concurrency 1,8,32,64 --output loadtest.json
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --concurrency 16
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import httpx
+from benchmarks.run import latency_stats
+
+
+@dataclass
+class RequestResult:
+    """单个聊天流的测量结果（秒）"""
+
+    status: int = 0
+    first_event: Optional[float] = None
+    first_token: Optional[float] = None
+    final_answer: Optional[float] = None
+    total: float = 0.0
+    events: int = 0
+    queued: bool = False
+    error: Optional[str] = None
+
+
+@dataclass
+class LevelReport:
+    concurrency: int
+    wall_seconds: float
+    results: List[RequestResult] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        results = self.results
+        failed = [r for r in results if r.error]
+        events = sum(r.events for r in results)
+        errors: Dict[str, int] = {}
+        for r in failed:
+            errors[r.error] = errors.get(r.error, 0) + 1
+        return {
+            "concurrency": self.concurrency,
+            "requests": len(results),
+            "wall_seconds": round(self.wall_seconds, 3),
+            "requests_per_second": round(len(results) / self.wall_seconds, 2) if self.wall_seconds else 0.0,
+            "events_per_second": round(events / self.wall_seconds, 2) if self.wall_seconds else 0.0,
+            "error_rate": round(len(failed) / len(results), 4) if results else 0.0,
+            "queued_rate": round(sum(r.queued for r in results) / len(results), 4) if results else 0.0,
+            "errors": errors,
+            "time_to_first_event": latency_stats([r.first_event for r in results if r.first_event is not None]),
+            "time_to_first_token": latency_stats([r.first_token for r in results if r.first_token is not None]),
+            "time_to_final_answer": latency_stats([r.final_answer for r in results if r.final_answer is not None]),
+        }
+
+
+async def run_request(client: httpx.AsyncClient, url: str, message: str, client_id: str, timeout: float) -> RequestResult:
+    """发送一个聊天请求并读取完整的 SSE 流"""
+    result = RequestResult()
+    start = time.perf_counter()
+    try:
+        async with client.stream(
+            "POST", f"{url}/api/chat/stream",
+            json={"message": message, "history": []},
+            headers={"X-Client-Id": client_id},
+            timeout=timeout
+        ) as response:
+            result.status = response.status_code
+            if response.status_code != 200:
+                result.error = f"http_{response.status_code}"
+                await response.aread()
+                return result
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                now = time.perf_counter() - start
+                event = json.loads(line[6:])
+                result.events += 1
+                if result.first_event is None:
+                    result.first_event = now
+                event_type = event.get("type")
+                if event_type == "queued":
+                    result.queued = True
+                elif event_type == "token" and result.first_token is None:
+                    result.first_token = now
+                elif event_type == "final_answer":
+                    result.final_answer = now
+                elif event_type == "error":
+                    result.error = "error_event"
+        if result.final_answer is None and result.error is None:
+            result.error = "no_final_answer"
+    except httpx.TimeoutException:
+        result.error = "timeout"
+    except httpx.HTTPError as e:
+        result.error = type(e).__name__
+    finally:
+        result.total = time.perf_counter() - start
+    return result
+
+
+async def run_level(url: str, concurrency: int, requests_per_client: int, timeout: float) -> LevelReport:
+    """并发 concurrency 个客户端，每个客户端顺序发送 requests_per_client 个请求"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits) as client:
+        results: List[RequestResult] = []
+
+        async def one_client(index: int):
+            for i in range(requests_per_client):
+                message = f"公司年假制度是怎样规定的？（客户端 {index} 第 {i} 次）"
+                results.append(await run_request(client, url, message, f"loadtest-{index}", timeout))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_client(i) for i in range(concurrency)))
+        return LevelReport(concurrency, time.perf_counter() - start, results)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_http(url: str, timeout: float, log_path: str = None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = httpx.get(url, timeout=1.0)
+            if response.status_code < 500:
+                return
+            # /ready 返回预热失败时不会再恢复，直接报错，不必等到超时
+            if response.headers.get("content-type", "").startswith("application/json"):
+                status = response.json()
+                if status.get("state") == "failed":
+                    hint = f"，日志: {log_path}" if log_path else ""
+                    raise RuntimeError(f"服务预热失败: {status.get('error')}{hint}")
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"服务未在 {timeout} 秒内就绪: {url}")
+
+
+class LocalStack:
+    """启动模拟 OpenAI 服务和聊天服务两个子进程，退出时终止"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="rag-loadtest-")
+        self.processes: List[subprocess.Popen] = []
+        self.url = ""
+
+    def _log_path(self, module: str) -> str:
+        return os.path.join(self.workdir, f"{module.rsplit('.', 1)[-1]}.log")
+
+    def _spawn(self, module: str, extra_args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+        log = open(self._log_path(module), "w")
+        process = subprocess.Popen(
+            [sys.executable, "-m", module, *extra_args],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+        self.processes.append(process)
+        return process
+
+    def __enter__(self) -> "LocalStack":
+        args = self.args
+        mock_port, app_port = _free_port(), _free_port()
+        env = dict(os.environ)
+        self._spawn("benchmarks.mock_openai", [
+            "--port", str(mock_port),
+            "--first-token-latency", str(args.first_token_latency),
+            "--tokens-per-second", str(args.tokens_per_second),
+            "--answer-tokens", str(args.answer_tokens),
+            "--tools", args.tools,
+            "--embed-latency", str(args.embed_latency),
+        ], env)
+        _wait_http(f"http://127.0.0.1:{mock_port}/docs", 30)
+
+        env.update({
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+            "OPENAI_API_KEY": "loadtest",
+            "OPENAI_MODEL_NAME": "mock",
+            "EMBEDDING_MODEL_NAME": "mock-embedding",
+        })
+        self._spawn("benchmarks.serve_app", [
+            "--port", str(app_port),
+            "--workdir", os.path.join(self.workdir, "app"),
+            "--vector-store", args.vector_store,
+        ] + (["--keep-caches"] if args.keep_caches else []), env)
+        self.url = f"http://127.0.0.1:{app_port}"
+        _wait_http(f"{self.url}/ready", args.startup_timeout, self._log_path("benchmarks.serve_app"))
+        return self
+
+    def __exit__(self, *exc_info):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if exc_info[0] is not None:
+            print(f"服务日志保留在 {self.workdir}")
+        else:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def _print_header():
+    print(f"{'并发':>6} {'请求':>6} {'错误率':>8} {'事件/秒':>10} "
+          f"{'首事件 p50/p95/p99 (ms)':>28} {'最终回答 p50/p95/p99 (ms)':>30}")
+
+
+def _print_level(level: Dict[str, Any]):
+    first = level["time_to_first_event"]
+    final = level["time_to_final_answer"]
+    print(
+        f"{level['concurrency']:>6} {level['requests']:>6} {level['error_rate']:>8.2%} {level['events_per_second']:>10.1f} "
+        f"{first.get('p50_ms', 0):>10.0f}/{first.get('p95_ms', 0):.0f}/{first.get('p99_ms', 0):.0f}"
+        f"{final.get('p50_ms', 0):>14.0f}/{final.get('p95_ms', 0):.0f}/{final.get('p99_ms', 0):.0f}"
+    )
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="/api/chat/stream SSE 压测")
+    parser.add_argument("--url", default=None, help="聊天服务地址，未指定时自动启动模拟服务和聊天服务")
+    parser.add_argument("--concurrency", default="1,8,32,64", help="并发客户端数，逗号分隔，逐级执行")
+    parser.add_argument("--requests-per-client", type=int, default=3, help="每个客户端顺序发送的请求数")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单个请求超时（秒）")
+    parser.add_argument("--output", default="loadtest_results.json", help="结果 JSON 文件路径")
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="模拟服务首 token 延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0, help="模拟服务流式输出速率")
+    parser.add_argument("--answer-tokens", type=int, default=80, help="模拟服务最终回答的 token 数")
+    parser.add_argument("--tools", default="rag_search", help="模拟服务首轮调用的工具，逗号分隔")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="模拟服务嵌入接口延迟（秒）")
+    parser.add_argument("--vector-store", choices=["chroma", "local"], default="chroma", help="聊天服务使用的向量库后端")
+    parser.add_argument("--keep-caches", action="store_true", help="保留聊天服务的回答缓存和工具结果缓存")
+    parser.add_argument("--startup-timeout", type=float, default=120.0, help="等待聊天服务启动的秒数（含知识库入库）")
+    return parser.parse_args(argv)
+
+
+async def run_levels(url: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    levels = []
+    _print_header()
+    for concurrency in [int(value) for value in args.concurrency.split(",") if value.strip()]:
+        report = await run_level(url, concurrency, args.requests_per_client, args.timeout)
+        levels.append(report.to_dict())
+        _print_level(levels[-1])
+    return levels
+
+
+def main(argv: List[str] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "url": args.url or "local",
+            "requests_per_client": args.requests_per_client,
+        }
+    }
+    if args.url:
+        levels = asyncio.run(run_levels(args.url.rstrip("/"), args))
+    else:
+        report["meta"]["mock"] = {
+            "first_token_latency": args.first_token_latency,
+            "tokens_per_second": args.tokens_per_second,
+            "answer_tokens": args.answer_tokens,
+            "tools": args.tools,
+            "embed_latency": args.embed_latency,
+        }
+        with LocalStack(args) as stack:
+            levels = asyncio.run(run_levels(stack.url, args))
+    report["levels"] = levels
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"压测结果已写入 {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
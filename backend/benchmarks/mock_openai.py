@@ -0,0 +1,193 @@
+"""
+本地模拟的 OpenAI 兼容服务：/v1/chat/completions（含流式输出和工具调用）和 /v1/embeddings
+
+在 backend 目录下运行:
+    python -m benchmarks.mock_openai --port 9100 --first-token-latency 0.3 --tokens-per-second 40
+"""
+import json
+import time
+import uuid
+import base64
+import asyncio
+import argparse
+from dataclasses import dataclass
+from typing import Any, Dict, List
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from benchmarks.fakes import FakeEmbeddings
+
+
+_ANSWER_TEXT = "根据公司制度，员工入职满一年后每年可享受带薪年假，具体天数按累计工龄计算。"
+
+
+@dataclass
+class MockConfig:
+    """模拟服务的延迟和回复设置"""
+
+    first_token_latency: float = 0.3
+    tokens_per_second: float = 40.0
+    answer_tokens: int = 80
+    # 首轮回复中调用的工具，为空时直接回答
+    tools: tuple = ("rag_search",)
+    embed_latency: float = 0.02
+
+
+def _tool_arguments(name: str, question: str) -> Dict[str, Any]:
+    if name == "rag_search":
+        return {"query": question}
+    if name == "search_order":
+        return {"order_id": "123456"}
+    if name == "calculator":
+        return {"expression": "15 * 0.8"}
+    return {}
+
+
+def _plan_reply(body: Dict[str, Any], config: MockConfig) -> Dict[str, Any]:
+    """最后一条用户消息之后还没有工具结果且请求携带了工具时先调用工具，否则给出回答"""
+    messages = body.get("messages", [])
+    last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+    question = messages[last_user].get("content") if last_user >= 0 else ""
+    if not isinstance(question, str):
+        question = json.dumps(question, ensure_ascii=False)
+
+    available = {tool["function"]["name"] for tool in body.get("tools") or []}
+    called = any(m.get("role") == "tool" for m in messages[last_user + 1:])
+    tool_names = [name for name in config.tools if name in available]
+    if tool_names and not called:
+        return {
+            "tool_calls": [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {
+                        "name": name,
+                        "arguments": json.dumps(_tool_arguments(name, question), ensure_ascii=False)
+                    }
+                }
+                for name in tool_names
+            ]
+        }
+
+    text = (_ANSWER_TEXT * (config.answer_tokens // len(_ANSWER_TEXT) + 1))[:config.answer_tokens]
+    return {"tokens": list(text)}
+
+
+def _chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason: str = None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def create_mock_app(config: MockConfig = None) -> FastAPI:
+    """
+    创建模拟服务
+
+    Args:
+        config: 延迟和回复设置
+
+    Returns:
+        FastAPI 应用
+    """
+    config = config or MockConfig()
+    app = FastAPI(title="Mock OpenAI")
+    token_interval = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        reply = _plan_reply(body, config)
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.first_token_latency + token_interval * len(reply.get("tokens", [])))
+            message = {"role": "assistant", "content": "".join(reply.get("tokens", [])) or None}
+            if "tool_calls" in reply:
+                message["tool_calls"] = reply["tool_calls"]
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if "tool_calls" in reply else "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(reply.get("tokens", [])), "total_tokens": 0}
+            }
+
+        async def stream():
+            await asyncio.sleep(config.first_token_latency)
+            yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+            if "tool_calls" in reply:
+                for index, call in enumerate(reply["tool_calls"]):
+                    yield _chunk(completion_id, model, {"tool_calls": [dict(call, index=index)]})
+                yield _chunk(completion_id, model, {}, "tool_calls")
+            else:
+                for i, token in enumerate(reply["tokens"]):
+                    if i and token_interval:
+                        await asyncio.sleep(token_interval)
+                    yield _chunk(completion_id, model, {"content": token})
+                yield _chunk(completion_id, model, {}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        # 输入可能是字符串、字符串列表、token 列表或 token 列表的列表
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        texts: List[str] = [item if isinstance(item, str) else " ".join(map(str, item)) for item in inputs]
+
+        if config.embed_latency:
+            await asyncio.sleep(config.embed_latency)
+        vectors = FakeEmbeddings(int(body.get("dimensions") or 1536)).embed_documents(texts)
+        if body.get("encoding_format") == "base64":
+            encoded = [base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii") for vector in vectors]
+        else:
+            encoded = vectors
+        return {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": vector} for i, vector in enumerate(encoded)],
+            "model": body.get("model", "mock"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}
+        }
+
+    return app
+
+
+def main(argv: List[str] = None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="模拟 OpenAI 兼容服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="首 token 延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0, help="流式输出速率")
+    parser.add_argument("--answer-tokens", type=int, default=80, help="最终回答的 token 数")
+    parser.add_argument("--tools", default="rag_search", help="首轮调用的工具，逗号分隔，为空时直接回答")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="嵌入接口延迟（秒）")
+    args = parser.parse_args(argv)
+
+    config = MockConfig(
+        first_token_latency=args.first_token_latency,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        tools=tuple(name.strip() for name in args.tools.split(",") if name.strip()),
+        embed_latency=args.embed_latency
+    )
+    uvicorn.run(create_mock_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
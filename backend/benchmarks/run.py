@@ -0,0 +1,371 @@
+"""
+离线基准测试：使用确定性的假聊天模型和假嵌入模型，不访问任何外部服务
+
+在 backend 目录下运行:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.compare base.json bench.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from contextlib import redirect_stdout, nullcontext
+from typing import Any, Dict, List
+
+
+_VOCABULARY = (
+    "年假 病假 事假 婚假 产假 加班 调休 考勤 打卡 迟到 早退 旷工 工资 奖金 绩效 考核 晋升 调岗 "
+    "试用期 转正 合同 续签 离职 辞退 补偿 社保 公积金 福利 体检 培训 报销 差旅 住宿 交通 餐补 "
+    "审批 流程 部门 经理 员工 人事 财务 行政 制度 规定 标准 申请 材料 期限 天数 比例 金额 "
+    "order refund invoice payment delivery warehouse inventory discount customer contract"
+).split()
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="离线基准测试")
+    parser.add_argument("--output", default="bench_results.json", help="结果 JSON 文件路径")
+    parser.add_argument("--vector-store", choices=["chroma", "local"], default="chroma", help="向量库后端")
+    parser.add_argument("--resources", default=None, help="PDF 目录，默认 backend/resources")
+    parser.add_argument("--corpus-sizes", default="500,2000,8000", help="检索基准的分块数量，逗号分隔")
+    parser.add_argument("--queries", type=int, default=50, help="每个规模、每种检索模式的查询次数")
+    parser.add_argument("--ingest-chunks", type=int, default=2000, help="嵌入与写入基准的分块数量")
+    parser.add_argument("--batch-size", type=int, default=64, help="嵌入与写入的批大小")
+    parser.add_argument("--dimensions", type=int, default=256, help="假嵌入模型的向量维度")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="假嵌入模型每次调用的延迟（秒）")
+    parser.add_argument("--chat-requests", type=int, default=20, help="stream_chat 请求数")
+    parser.add_argument("--chat-concurrency", type=int, default=4, help="stream_chat 并发数")
+    parser.add_argument("--answer-chars", type=int, default=400, help="最终回答的字符数")
+    parser.add_argument("--first-token-latency", type=float, default=0.05, help="假聊天模型首 token 延迟（秒）")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="假聊天模型每个 token 的间隔（秒）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--only", default="ingestion,search,stream_chat", help="只运行指定的基准，逗号分隔")
+    parser.add_argument("--verbose", action="store_true", help="保留被测代码的日志输出")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace, workdir: str):
+    """在导入 app 模块前设置环境变量：关闭所有缓存，持久化文件写入临时目录"""
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    os.environ.setdefault("OPENAI_MODEL_NAME", "scripted")
+    os.environ.setdefault("EMBEDDING_MODEL_NAME", "fake-embedding")
+    os.environ.update({
+        "VECTOR_STORE_TYPE": args.vector_store,
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "RAG_QUERY_CACHE_SIZE": "0",
+        "TOOL_CACHE_SIZE": "0",
+        "ANSWER_CACHE_SIZE": "0",
+        "SESSION_STORE": "memory",
+        "TRACE_SAMPLE_RATE": "0",
+        "TRACE_SLOW_THRESHOLD_MS": "0",
+        "TRACE_EXPORT_PATH": os.path.join(workdir, "traces.jsonl"),
+    })
+
+
+def latency_stats(samples: List[float]) -> Dict[str, float]:
+    """把以秒为单位的耗时样本汇总为毫秒统计"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(percentile(0.50) * 1000, 3),
+        "p95_ms": round(percentile(0.95) * 1000, 3),
+        "p99_ms": round(percentile(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def synthetic_documents(count: int, chars: int, seed: int) -> List[tuple]:
+    """生成 (文件名, 内容) 形式的合成文档，内容由固定词表随机组成"""
+    rng = random.Random(seed)
+    documents = []
+    for i in range(count):
+        words, size = [], 0
+        while size < chars:
+            word = rng.choice(_VOCABULARY)
+            words.append(word)
+            size += len(word) + 1
+            if rng.random() < 0.08:
+                words.append("。\n")
+        documents.append((f"synthetic_{i}.pdf", " ".join(words)))
+    return documents
+
+
+def synthetic_chunks(count: int, seed: int, offset: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed + offset)
+    return [
+        {
+            "content": " ".join(rng.choice(_VOCABULARY) for _ in range(rng.randint(60, 160))),
+            "source": f"synthetic_{(offset + i) // 20}.pdf",
+            "chunk_id": f"synthetic_{offset + i}",
+        }
+        for i in range(count)
+    ]
+
+
+def _throughput(count: float, seconds: float) -> float:
+    return round(count / seconds, 2) if seconds > 0 else 0.0
+
+
+def _install_fake_embeddings(embedding_service, args: argparse.Namespace):
+    from benchmarks.fakes import FakeEmbeddings
+    embedding_service.embeddings = FakeEmbeddings(args.dimensions, latency=args.embed_latency)
+    embedding_service.dimensions = args.dimensions
+    return embedding_service
+
+
+def bench_ingestion(args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    """入库各阶段的吞吐：PDF 解析、分块、嵌入、写入向量库，以及完整的入库流程"""
+    from app.rag.document_loader import DocumentLoader
+    from app.rag.text_splitter import TextSplitter
+    from app.rag.embedding_service import EmbeddingService
+    from app.rag.vector_store import VectorStore
+    from app.rag.rag_manager import RAGManager
+
+    results: Dict[str, Any] = {}
+
+    loader = DocumentLoader(args.resources)
+    start = time.perf_counter()
+    documents = loader.load_all_pdfs()
+    elapsed = time.perf_counter() - start
+    chars = sum(len(content) for _, content in documents)
+    results["document_loader"] = {
+        "files": len(documents),
+        "chars": chars,
+        "seconds": round(elapsed, 4),
+        "chars_per_second": _throughput(chars, elapsed),
+    }
+
+    splitter = TextSplitter(800, 150)
+    synthetic = synthetic_documents(50, 20000, args.seed)
+    start = time.perf_counter()
+    chunks = splitter.split_documents(synthetic)
+    elapsed = time.perf_counter() - start
+    chars = sum(len(content) for _, content in synthetic)
+    results["text_splitter"] = {
+        "chars": chars,
+        "chunks": len(chunks),
+        "seconds": round(elapsed, 4),
+        "chars_per_second": _throughput(chars, elapsed),
+    }
+
+    chunks = synthetic_chunks(args.ingest_chunks, args.seed)
+    batches = [chunks[i:i + args.batch_size] for i in range(0, len(chunks), args.batch_size)]
+
+    embedding_service = _install_fake_embeddings(EmbeddingService(), args)
+    start = time.perf_counter()
+    embeddings = []
+    for batch in batches:
+        embeddings.extend(embedding_service.embed_documents([chunk["content"] for chunk in batch]))
+    elapsed = time.perf_counter() - start
+    results["embedding_service"] = {
+        "texts": len(chunks),
+        "batch_size": args.batch_size,
+        "seconds": round(elapsed, 4),
+        "texts_per_second": _throughput(len(chunks), elapsed),
+    }
+
+    vector_store = VectorStore(os.path.join(workdir, "ingest_store"), collection_name="bench_ingest")
+    start = time.perf_counter()
+    for i, batch in enumerate(batches):
+        vector_store.add_documents(batch, embeddings[i * args.batch_size:(i + 1) * args.batch_size])
+    elapsed = time.perf_counter() - start
+    results["vector_store_add"] = {
+        "chunks": len(chunks),
+        "batch_size": args.batch_size,
+        "seconds": round(elapsed, 4),
+        "chunks_per_second": _throughput(len(chunks), elapsed),
+    }
+
+    if documents:
+        manager = RAGManager(
+            resources_dir=loader.resources_dir,
+            persist_directory=os.path.join(workdir, "ingest_pipeline"),
+            manifest_path=os.path.join(workdir, "ingest_pipeline_manifest.json"),
+            embed_batch_size=args.batch_size,
+        )
+        _install_fake_embeddings(manager.embedding_service, args)
+        start = time.perf_counter()
+        manager.initialize_knowledge_base(force_rebuild=True)
+        elapsed = time.perf_counter() - start
+        count = manager.vector_store.get_collection_count()
+        results["pipeline"] = {
+            "files": len(documents),
+            "chunks": count,
+            "seconds": round(elapsed, 4),
+            "chunks_per_second": _throughput(count, elapsed),
+        }
+    return results
+
+
+def build_search_corpus(args: argparse.Namespace, workdir: str, size: int, name: str = "search"):
+    """构建指定分块数量的 RAGManager（合成分块 + 假嵌入）"""
+    from app.rag.rag_manager import RAGManager
+
+    manager = RAGManager(
+        persist_directory=os.path.join(workdir, f"{name}_{size}"),
+        manifest_path=os.path.join(workdir, f"{name}_{size}_manifest.json"),
+    )
+    _install_fake_embeddings(manager.embedding_service, args)
+    for offset in range(0, size, args.batch_size):
+        batch = synthetic_chunks(min(args.batch_size, size - offset), args.seed, offset)
+        embeddings = manager.embedding_service.embed_documents([chunk["content"] for chunk in batch])
+        ids = manager.vector_store.add_documents(batch, embeddings)
+        manager.lexical_index.add(ids, batch)
+    return manager
+
+
+def bench_search(args: argparse.Namespace, workdir: str) -> List[Dict[str, Any]]:
+    """不同语料规模下 RAGManager.search 各检索模式的延迟（查询缓存已关闭）"""
+    from app.rag.rag_manager import SEARCH_MODES
+
+    rng = random.Random(args.seed)
+    queries = [" ".join(rng.sample(_VOCABULARY, 3)) for _ in range(args.queries)]
+    results = []
+    for size in [int(value) for value in args.corpus_sizes.split(",") if value.strip()]:
+        start = time.perf_counter()
+        manager = build_search_corpus(args, workdir, size)
+        build_seconds = time.perf_counter() - start
+
+        for mode in SEARCH_MODES:
+            # 预热一次，排除首次加载索引的开销
+            manager.search(queries[0], n_results=5, mode=mode)
+            samples = []
+            for query in queries:
+                start = time.perf_counter()
+                manager.search(query, n_results=5, mode=mode)
+                samples.append(time.perf_counter() - start)
+            results.append({
+                "corpus_size": size,
+                "mode": mode,
+                "build_seconds": round(build_seconds, 4),
+                **latency_stats(samples),
+            })
+    return results
+
+
+async def bench_stream_chat(args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    """stream_chat 端到端事件吞吐：一轮并发工具调用（rag_search、calculator）+ 流式最终回答"""
+    from benchmarks.fakes import ScriptedChatModel
+    from app.agent.engine import AgentEngine
+    import app.tools.tools as tools
+
+    sizes = [int(value) for value in args.corpus_sizes.split(",") if value.strip()]
+    tools._rag_manager = build_search_corpus(args, workdir, min(sizes) if sizes else 500, name="chat")
+
+    answer = ("根据制度规定，年假天数按工龄计算。" * (args.answer_chars // 16 + 1))[:args.answer_chars]
+    llm = ScriptedChatModel(
+        script=[
+            {
+                "content": "我先检索相关制度并计算。",
+                "tool_calls": [
+                    {"name": "rag_search", "args": {"query": "年假 天数 规定"}},
+                    {"name": "calculator", "args": {"expression": "15 * 0.8"}},
+                ],
+            },
+            {"content": answer},
+        ],
+        first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency,
+    )
+    engine = AgentEngine(llm=llm)
+
+    semaphore = asyncio.Semaphore(max(1, args.chat_concurrency))
+    records = []
+
+    async def one_request(index: int):
+        async with semaphore:
+            start = time.perf_counter()
+            first_token = None
+            events = 0
+            async for event in engine.stream_chat(f"年假有几天？#{index}", []):
+                events += 1
+                if first_token is None and event["type"] == "token":
+                    first_token = time.perf_counter() - start
+            records.append((time.perf_counter() - start, first_token, events))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_request(i) for i in range(args.chat_requests)))
+    wall = time.perf_counter() - start
+
+    total_events = sum(events for _, _, events in records)
+    return {
+        "requests": len(records),
+        "concurrency": args.chat_concurrency,
+        "wall_seconds": round(wall, 4),
+        "requests_per_second": _throughput(len(records), wall),
+        "events_per_second": _throughput(total_events, wall),
+        "events_per_request": round(total_events / len(records), 2) if records else 0,
+        "latency": latency_stats([total for total, _, _ in records]),
+        "time_to_first_token": latency_stats([ttft for _, ttft, _ in records if ttft is not None]),
+        "model": {
+            "first_token_latency": args.first_token_latency,
+            "token_latency": args.token_latency,
+            "answer_chars": args.answer_chars,
+        },
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def main(argv: List[str] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    selected = {name.strip() for name in args.only.split(",") if name.strip()}
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    configure_environment(args, workdir)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "vector_store": args.vector_store,
+            "dimensions": args.dimensions,
+            "embed_latency": args.embed_latency,
+        },
+    }
+    quiet = nullcontext() if args.verbose else redirect_stdout(io.StringIO())
+    try:
+        with quiet:
+            if "ingestion" in selected:
+                report["ingestion"] = bench_ingestion(args, workdir)
+            if "search" in selected:
+                report["search"] = bench_search(args, workdir)
+            if "stream_chat" in selected:
+                report["stream_chat"] = asyncio.run(bench_stream_chat(args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"基准测试结果已写入 {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
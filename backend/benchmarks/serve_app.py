@@ -0,0 +1,49 @@
+"""
+以单个 uvicorn worker 启动聊天服务，知识库、清单和追踪文件写入独立的工作目录，不影响 backend/data
+
+在 backend 目录下运行（OPENAI_BASE_URL 指向模拟服务）:
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 python -m benchmarks.serve_app --port 8100 --workdir /tmp/loadtest
+"""
+import os
+import argparse
+from typing import List
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="以隔离的数据目录启动聊天服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--workdir", required=True, help="知识库和临时文件目录")
+    parser.add_argument("--vector-store", choices=["chroma", "local"], default="chroma", help="向量库后端")
+    parser.add_argument("--keep-caches", action="store_true", help="保留回答缓存和工具结果缓存（默认关闭，避免重复问题直接命中）")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    os.environ.setdefault("OPENAI_API_KEY", "loadtest")
+    os.environ.setdefault("OPENAI_MODEL_NAME", "mock")
+    os.environ.setdefault("EMBEDDING_MODEL_NAME", "mock-embedding")
+    os.environ["VECTOR_STORE_TYPE"] = args.vector_store
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(args.workdir, "embedding_cache.sqlite3")
+    os.environ["TRACE_EXPORT_PATH"] = os.path.join(args.workdir, "traces.jsonl")
+    os.environ["SESSION_DB_PATH"] = os.path.join(args.workdir, "sessions.sqlite3")
+    if not args.keep_caches:
+        os.environ.update({"ANSWER_CACHE_SIZE": "0", "TOOL_CACHE_SIZE": "0", "RAG_QUERY_CACHE_SIZE": "0"})
+
+    import uvicorn
+    import app.tools.tools as tools
+    from app.rag.rag_manager import RAGManager
+
+    # 在应用启动前替换知识库单例，使启动时的入库写入工作目录
+    tools._rag_manager = RAGManager(
+        persist_directory=os.path.join(args.workdir, "vector_store"),
+        manifest_path=os.path.join(args.workdir, "manifest.json")
+    )
+    # 模拟服务的模型名不在 tiktoken 的映射中，按长度切分会去下载 cl100k_base 编码表；压测文档都很短，直接关闭以便离线运行
+    tools._rag_manager.embedding_service.embeddings.check_embedding_ctx_length = False
+
+    from app.main import app
+    uvicorn.run(app, host=args.host, port=args.port, workers=1, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
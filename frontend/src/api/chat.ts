@@ -11,25 +11,57 @@ const api = axios.create({
 export interface ChatRequest {
   message: string
   history: Array<{ role: string; content: string }>
+  session_id?: string
+  trace?: boolean
+}
+
+export interface TraceSpan {
+  id: string
+  parent_id: string | null
+  name: string
+  kind: 'model' | 'tool' | 'step'
+  start_ms: number
+  end_ms: number
+  duration_ms: number
 }
 
 export interface ChatStreamChunk {
-  type: 'thought' | 'tool_call' | 'tool_result' | 'final_answer' | 'done'
+  type: 'session' | 'session_expired' | 'queued' | 'answer_cache_hit' | 'token' | 'thought' | 'tool_call' | 'tool_result' | 'compaction' | 'trace' | 'trace_summary' | 'final_answer' | 'done' | 'error'
   content?: string
+  session_id?: string
+  resumed?: boolean
+  position?: number
+  similarity?: number
+  retry_after?: number
+  tool_call_id?: string
   tool_name?: string
   tool_input?: any
   tool_output?: any
+  cached?: boolean
+  span?: TraceSpan
+  attributes?: Record<string, any>
+  total_ms?: number
+  by_kind?: Record<string, { count: number; total_ms: number }>
 }
 
-export async function* streamChat(message: string, history: Array<{ role: string; content: string }>) {
+export async function* streamChat(
+  message: string,
+  history: Array<{ role: string; content: string }>,
+  sessionId?: string
+) {
   const response = await fetch('/api/chat/stream', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
     },
-    body: JSON.stringify({ message, history })
+    body: JSON.stringify({ message, history, session_id: sessionId })
   })
 
+  if (response.status === 429) {
+    const retryAfter = response.headers.get('Retry-After') || '1'
+    throw new Error(`服务繁忙，请 ${retryAfter} 秒后重试`)
+  }
+
   if (!response.ok) {
     throw new Error(`HTTP error! status: ${response.status}`)
   }
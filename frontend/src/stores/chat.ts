@@ -51,6 +51,41 @@ export const useChatStore = defineStore('chat', () => {
     }
   }
 
+  function appendToken(delta: string) {
+    if (!currentAssistantMessageId.value) return
+
+    const message = currentSession.value.messages.find(m => m.id === currentAssistantMessageId.value)
+    if (message && message.agentSteps) {
+      const last = message.agentSteps[message.agentSteps.length - 1]
+      if (last && last.type === 'thought' && last.streaming) {
+        last.content += delta
+      } else {
+        message.agentSteps.push({
+          type: 'thought',
+          content: delta,
+          streaming: true,
+          timestamp: Date.now()
+        })
+      }
+    }
+  }
+
+  function completeThought(content: string) {
+    if (!currentAssistantMessageId.value) return
+
+    const message = currentSession.value.messages.find(m => m.id === currentAssistantMessageId.value)
+    if (message && message.agentSteps) {
+      const last = message.agentSteps[message.agentSteps.length - 1]
+      if (last && last.type === 'thought' && last.streaming) {
+        // 用完整内容替换逐 token 拼接的内容
+        last.content = content
+        last.streaming = false
+      } else {
+        message.agentSteps.push({ type: 'thought', content, timestamp: Date.now() })
+      }
+    }
+  }
+
   function updateFinalAnswer(content: string) {
     if (!currentAssistantMessageId.value) return
     
@@ -82,6 +117,8 @@ export const useChatStore = defineStore('chat', () => {
     addUserMessage,
     createAssistantMessage,
     addAgentStep,
+    appendToken,
+    completeThought,
     updateFinalAnswer,
     clearSession
   }
@@ -1,9 +1,12 @@
 export interface AgentStep {
   type: 'thought' | 'tool_call' | 'tool_result'
   content: string
+  toolCallId?: string
   toolName?: string
   toolInput?: any
   toolOutput?: any
+  cached?: boolean
+  streaming?: boolean
   timestamp: number
 }
 
@@ -17,6 +20,7 @@ export interface Message {
 
 export interface ChatSession {
   id: string
+  serverSessionId?: string
   messages: Message[]
   createdAt: number
 }